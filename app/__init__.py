@@ -5,19 +5,26 @@ from .extensions import (
     migrate, 
     jwt, 
     cors, 
-    init_s3_client
+    init_s3_client,
+    init_redis_client
 )
+from .metrics import init_metrics
+from .analysis.cache import UploadRequest
 
 def create_app(config_name='default'):
     
     app = Flask(__name__)
     app.config.from_object(config[config_name])
+    # File upload di-hash SHA-256 saat body diterima (cache hasil, lihat analysis/cache.py)
+    app.request_class = UploadRequest
 
     db.init_app(app)
     migrate.init_app(app, db)
     jwt.init_app(app)
     cors.init_app(app)
     init_s3_client(app)
+    init_redis_client(app)
+    init_metrics(app)
 
     with app.app_context():
         from . import models 
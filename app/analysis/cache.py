@@ -0,0 +1,277 @@
+# FILE: app/analysis/cache.py
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from tempfile import SpooledTemporaryFile
+from flask import Request, current_app
+
+from app import extensions
+from app.metrics import event_counters
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Ukuran maksimum upload yang disimpan di memori sebelum pindah ke disk (sama dengan werkzeug)
+UPLOAD_SPOOL_MAX_SIZE = 1024 * 500
+
+# file_location untuk job yang diselesaikan dari cache (tidak ada objek di S3)
+CACHE_LOCATION_PREFIX = 'cache://'
+
+
+class HashingSpooledFile(SpooledTemporaryFile):
+    """
+    Penampung file upload yang menghitung SHA-256 selama body request ditulis,
+    jadi hash tersedia tanpa membaca ulang file.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._digest = hashlib.sha256()
+
+    def write(self, data):
+        self._digest.update(data)
+        return super().write(data)
+
+    def content_sha256(self):
+        return self._digest.hexdigest()
+
+
+class UploadRequest(Request):
+    """Request Flask dengan file upload di HashingSpooledFile (app.request_class)."""
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingSpooledFile(max_size=UPLOAD_SPOOL_MAX_SIZE, mode='rb+')
+
+
+def hash_file(file):
+    """
+    SHA-256 dari isi file upload, posisi dikembalikan ke awal.
+
+    Upload lewat UploadRequest sudah di-hash saat body diterima; selain itu
+    file dibaca per chunk.
+    """
+    stream = getattr(file, 'stream', file)
+    if isinstance(stream, HashingSpooledFile):
+        file.seek(0)
+        return stream.content_sha256()
+
+    file.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Cache hasil analisis berbasis konten:
+    (hash audio, versi ekstraktor fitur, versi model) -> result_summary.
+
+    Tier 1: LRU in-process (ukuran terbatas + TTL).
+    Tier 2: Redis bersama (SETEX, TTL), diisi oleh worker setiap job selesai.
+
+    Versi pipeline yang aktif dipublikasikan worker ke Redis, sehingga API
+    tidak pernah menyajikan hasil dari model/ekstraktor versi lama.
+    invalidate() menaikkan epoch di Redis; setiap proses mengosongkan LRU-nya
+    saat melihat epoch baru (bersamaan dengan refresh versi).
+    """
+    KEY_PREFIX = 'detectify:result'
+    VERSION_KEY = 'detectify:result:active_version'
+    EPOCH_KEY = 'detectify:result:epoch'
+    VERSION_REFRESH_SECONDS = 10
+
+    def __init__(self):
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked_at = 0.0
+        self._epoch = None
+        self._fallback_logged = False
+        self.stats = {'lru_hits': 0, 'redis_hits': 0, 'misses': 0, 'stores': 0, 'errors': 0}
+
+    @staticmethod
+    def pipeline_version(extractor_version, model_version):
+        return f"{extractor_version}:{model_version}"
+
+    def _key(self, audio_hash, version):
+        return f"{self.KEY_PREFIX}:{version}:{audio_hash}"
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+        event_counters.incr('result_cache', name)
+
+    def _enabled(self):
+        return current_app.config.get('RESULT_CACHE_ENABLED', True)
+
+    # --- Tier 1: LRU in-process ---
+
+    def _lru_get(self, key):
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._lru[key]
+                return None
+            self._lru.move_to_end(key)
+            return value
+
+    def _lru_put(self, key, value):
+        max_entries = current_app.config.get('RESULT_CACHE_LRU_SIZE', 1024)
+        ttl = current_app.config.get('RESULT_CACHE_TTL_SECONDS', 7 * 24 * 3600)
+        with self._lock:
+            self._lru[key] = (time.monotonic() + ttl, value)
+            self._lru.move_to_end(key)
+            while len(self._lru) > max_entries:
+                self._lru.popitem(last=False)
+
+    # --- Versi pipeline aktif ---
+
+    def active_version(self):
+        """
+        Versi pipeline yang sedang dipakai worker (di-refresh berkala dari Redis).
+
+        Tanpa Redis, atau sebelum worker mempublikasikan versinya, versi diambil
+        dari versi aktif di manifest model.
+        """
+        now = time.monotonic()
+        if now - self._version_checked_at < self.VERSION_REFRESH_SECONDS:
+            return self._version
+
+        redis_client = extensions.redis_client
+        raw = None
+        if redis_client is not None:
+            try:
+                raw, epoch = redis_client.mget(self.VERSION_KEY, self.EPOCH_KEY)
+                if epoch != self._epoch:
+                    with self._lock:
+                        self._lru.clear()
+                    self._epoch = epoch
+            except Exception as e:
+                self._count('errors')
+                current_app.logger.warning(f"Result cache version lookup failed: {e}")
+        self._version = raw.decode() if raw else self._manifest_version()
+        self._version_checked_at = now
+        return self._version
+
+    def _manifest_version(self):
+        # Import lokal: modul worker (fitur & manifest) hanya dibutuhkan di fallback ini
+        from celery_worker.features import FEATURE_EXTRACTOR_VERSION
+        from celery_worker.manifest import DEFAULT_MANIFEST_FILE, LEGACY_MODEL_VERSION, read_manifest
+
+        path = current_app.config.get('MODEL_MANIFEST_PATH') or DEFAULT_MANIFEST_FILE
+        try:
+            manifest = read_manifest(path)
+        except Exception as e:
+            current_app.logger.warning(f"Result cache: model manifest {path} unreadable, cache disabled: {e}")
+            return None
+
+        model_version = manifest['active'] if manifest else LEGACY_MODEL_VERSION
+        if not self._fallback_logged:
+            self._fallback_logged = True
+            current_app.logger.warning(
+                f"Result cache: no pipeline version published in Redis, "
+                f"using model manifest version {model_version}"
+            )
+        return self.pipeline_version(FEATURE_EXTRACTOR_VERSION, model_version)
+
+    def publish_version(self, version):
+        """Umumkan versi pipeline aktif (worker setelah memuat / menukar versi model)."""
+        self._version = version
+        self._version_checked_at = time.monotonic()
+        redis_client = extensions.redis_client
+        if redis_client is None:
+            return
+        try:
+            redis_client.set(self.VERSION_KEY, version)
+        except Exception as e:
+            self._count('errors')
+            current_app.logger.warning(f"Result cache version publish failed: {e}")
+
+    # --- API publik ---
+
+    def get(self, audio_hash):
+        """Ambil result_summary untuk audio ini, atau None jika belum ada."""
+        if not audio_hash or not self._enabled():
+            return None
+
+        version = self.active_version()
+        if version is None:
+            self._count('misses')
+            return None
+
+        key = self._key(audio_hash, version)
+        value = self._lru_get(key)
+        if value is not None:
+            self._count('lru_hits')
+            return value
+
+        redis_client = extensions.redis_client
+        if redis_client is not None:
+            try:
+                raw = redis_client.get(key)
+            except Exception as e:
+                raw = None
+                self._count('errors')
+                current_app.logger.warning(f"Result cache lookup failed: {e}")
+            if raw:
+                value = json.loads(raw)
+                self._lru_put(key, value)
+                self._count('redis_hits')
+                return value
+
+        self._count('misses')
+        return None
+
+    def set(self, audio_hash, version, result):
+        """
+        Simpan hasil (dipanggil worker setelah job COMPLETED) di bawah versi
+        pipeline yang menghitungnya. Versi aktif hanya diubah publish_version:
+        worker yang masih memakai model lama saat rollout tidak boleh
+        mengembalikan versi aktif ke versi lama.
+        """
+        if not audio_hash or not self._enabled():
+            return
+
+        key = self._key(audio_hash, version)
+        self._lru_put(key, result)
+        self._count('stores')
+
+        redis_client = extensions.redis_client
+        if redis_client is None:
+            return
+        ttl = current_app.config.get('RESULT_CACHE_TTL_SECONDS', 7 * 24 * 3600)
+        try:
+            redis_client.setex(key, ttl, json.dumps(result))
+        except Exception as e:
+            self._count('errors')
+            current_app.logger.warning(f"Result cache store failed: {e}")
+
+    def invalidate(self, audio_hashes, version):
+        """Hapus hasil cache audio ini untuk `version` (misal setelah riwayat dinilai ulang)."""
+        keys = [self._key(audio_hash, version) for audio_hash in audio_hashes if audio_hash]
+        if not keys:
+            return
+        with self._lock:
+            for key in keys:
+                self._lru.pop(key, None)
+
+        redis_client = extensions.redis_client
+        if redis_client is None:
+            return
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.delete(*keys)
+            # LRU proses lain (API) dikosongkan di refresh versi berikutnya
+            pipe.incr(self.EPOCH_KEY)
+            pipe.execute()
+        except Exception as e:
+            self._count('errors')
+            current_app.logger.warning(f"Result cache invalidate failed: {e}")
+
+
+# Instance global (satu per proses)
+result_cache = ResultCache()
@@ -0,0 +1,193 @@
+# FILE: app/analysis/cleanup.py
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import update
+
+from app import extensions
+from app.extensions import db
+from app.models import AnalysisHistory
+from .cache import CACHE_LOCATION_PREFIX
+
+# Batas DeleteObjects S3 per request
+DELETE_BATCH_LIMIT = 1000
+
+# Job dengan status ini masih membutuhkan file-nya di S3
+ACTIVE_STATUSES = ('UPLOADING', 'PENDING', 'PROCESSING')
+
+
+class S3Cleanup:
+    """
+    Penghapusan file audio S3 yang ditunda & di-batch.
+
+    - enqueue(): worker / API hanya mencatat key (SADD ke set Redis), tanpa
+      round-trip S3 di jalur job. Tanpa Redis key langsung dihapus (perilaku lama).
+    - drain(): task periodik mengambil maks 1000 key (SPOP) dan menghapusnya
+      dengan satu DeleteObjects. Key yang gagal dikembalikan ke set sampai
+      S3_CLEANUP_MAX_ATTEMPTS kali.
+    - sweep(): rekonsiliasi berkala untuk file yang tidak pernah masuk antrean
+      (worker crash, rollback process_upload, upload presigned yang ditinggal).
+    """
+    QUEUE_KEY = 'detectify:s3_cleanup:pending'
+    ATTEMPTS_KEY = 'detectify:s3_cleanup:attempts'
+
+    @staticmethod
+    def _bucket():
+        return current_app.config['AWS_S3_BUCKET_NAME']
+
+    @staticmethod
+    def _deletable(keys):
+        # Job yang selesai dari cache tidak punya objek di S3
+        return [key for key in dict.fromkeys(keys) if key and not key.startswith(CACHE_LOCATION_PREFIX)]
+
+    def _delete_batch(self, keys):
+        """Satu DeleteObjects. Mengembalikan key yang gagal dihapus."""
+        response = extensions.s3_client.delete_objects(
+            Bucket=self._bucket(),
+            Delete={'Objects': [{'Key': key} for key in keys], 'Quiet': True}
+        )
+        return [error['Key'] for error in response.get('Errors', [])]
+
+    def _delete_now(self, keys):
+        for start in range(0, len(keys), DELETE_BATCH_LIMIT):
+            batch = keys[start:start + DELETE_BATCH_LIMIT]
+            try:
+                failed = self._delete_batch(batch)
+            except Exception as e:
+                failed = batch
+                current_app.logger.warning(f"S3 Cleanup Error: {e}")
+            if failed:
+                current_app.logger.warning(f"S3 Cleanup: {len(failed)} key gagal dihapus, menunggu sweep")
+
+    # --- API publik ---
+
+    def enqueue(self, keys):
+        """Jadwalkan penghapusan file_location (satu key atau list)."""
+        if isinstance(keys, str):
+            keys = [keys]
+        keys = self._deletable(keys)
+        if not keys:
+            return
+
+        redis_client = extensions.redis_client
+        if redis_client is not None and current_app.config.get('S3_CLEANUP_DEFERRED', True):
+            try:
+                redis_client.sadd(self.QUEUE_KEY, *keys)
+                return
+            except Exception as e:
+                current_app.logger.warning(f"S3 cleanup enqueue failed, deleting now: {e}")
+        self._delete_now(keys)
+
+    def drain(self, max_batches=100):
+        """Hapus key yang mengantre, per DeleteObjects berisi maks S3_CLEANUP_BATCH_SIZE key."""
+        summary = {"deleted": 0, "retried": 0, "dropped": 0, "requests": 0}
+        redis_client = extensions.redis_client
+        if redis_client is None:
+            return summary
+
+        batch_size = min(current_app.config.get('S3_CLEANUP_BATCH_SIZE', DELETE_BATCH_LIMIT), DELETE_BATCH_LIMIT)
+        max_attempts = current_app.config.get('S3_CLEANUP_MAX_ATTEMPTS', 5)
+
+        for _ in range(max_batches):
+            keys = [key.decode() if isinstance(key, bytes) else key
+                    for key in redis_client.spop(self.QUEUE_KEY, batch_size) or []]
+            if not keys:
+                break
+
+            try:
+                failed = self._delete_batch(keys)
+            except Exception as e:
+                current_app.logger.warning(f"S3 Cleanup Error: {e}")
+                failed = keys
+            summary["requests"] += 1
+            summary["deleted"] += len(keys) - len(failed)
+
+            pipe = redis_client.pipeline(transaction=False)
+            for key in failed:
+                pipe.hincrby(self.ATTEMPTS_KEY, key, 1)
+            attempts = pipe.execute() if failed else []
+
+            pipe = redis_client.pipeline(transaction=False)
+            for key, attempt in zip(failed, attempts):
+                if attempt < max_attempts:
+                    pipe.sadd(self.QUEUE_KEY, key)
+                    summary["retried"] += 1
+                else:
+                    # Menyerah di sini; sweep() akan mencobanya lagi nanti
+                    pipe.hdel(self.ATTEMPTS_KEY, key)
+                    summary["dropped"] += 1
+            failed_set = set(failed)
+            succeeded = [key for key in keys if key not in failed_set]
+            if succeeded:
+                pipe.hdel(self.ATTEMPTS_KEY, *succeeded)
+            pipe.execute()
+
+            if failed:
+                # Jangan mengulang batch yang sama di run ini
+                break
+
+        return summary
+
+    def sweep(self, min_age_hours=None):
+        """
+        Rekonsiliasi: tandai upload presigned yang ditinggal sebagai FAILED,
+        batalkan multipart upload basi, lalu hapus objek di bawah S3_UPLOAD_PREFIX
+        yang lebih tua dari `min_age_hours` dan tidak dimiliki job aktif.
+        """
+        if min_age_hours is None:
+            min_age_hours = current_app.config.get('S3_ORPHAN_MIN_AGE_HOURS', 6)
+        prefix = current_app.config.get('S3_UPLOAD_PREFIX', 'audio/')
+        bucket_name = self._bucket()
+        s3_client = extensions.s3_client
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=min_age_hours)
+        summary = {"stale_uploads": 0, "aborted_multipart": 0, "orphans_deleted": 0, "requests": 0}
+
+        # 1. Job UPLOADING yang tidak pernah di-complete
+        result = db.session.execute(
+            update(AnalysisHistory)
+            .where(AnalysisHistory.status == 'UPLOADING',
+                   AnalysisHistory.created_at < cutoff.replace(tzinfo=None))
+            .values(status='FAILED', error_message="Upload tidak diselesaikan")
+        )
+        db.session.commit()
+        summary["stale_uploads"] = result.rowcount
+
+        # 2. Multipart upload basi (part-nya tetap ditagih sampai di-abort)
+        for page in s3_client.get_paginator('list_multipart_uploads').paginate(Bucket=bucket_name, Prefix=prefix):
+            for upload in page.get('Uploads', []):
+                if upload['Initiated'] < cutoff:
+                    try:
+                        s3_client.abort_multipart_upload(
+                            Bucket=bucket_name, Key=upload['Key'], UploadId=upload['UploadId']
+                        )
+                        summary["aborted_multipart"] += 1
+                    except Exception as e:
+                        current_app.logger.warning(f"Abort multipart failed for {upload['Key']}: {e}")
+
+        # 3. Objek yatim: per halaman listing (maks 1000 key) satu query IN + satu DeleteObjects
+        for page in s3_client.get_paginator('list_objects_v2').paginate(Bucket=bucket_name, Prefix=prefix):
+            candidates = [obj['Key'] for obj in page.get('Contents', []) if obj['LastModified'] < cutoff]
+            if not candidates:
+                continue
+            active = {
+                key for (key,) in AnalysisHistory.query
+                .with_entities(AnalysisHistory.file_location)
+                .filter(AnalysisHistory.file_location.in_(candidates),
+                        AnalysisHistory.status.in_(ACTIVE_STATUSES))
+                .all()
+            }
+            orphans = [key for key in candidates if key not in active]
+            if not orphans:
+                continue
+            try:
+                failed = self._delete_batch(orphans)
+            except Exception as e:
+                current_app.logger.warning(f"S3 Cleanup Error: {e}")
+                failed = orphans
+            summary["requests"] += 1
+            summary["orphans_deleted"] += len(orphans) - len(failed)
+
+        return summary
+
+
+# Instance global (satu per proses)
+s3_cleanup = S3Cleanup()
@@ -0,0 +1,85 @@
+# FILE: app/analysis/events.py
+import json
+from flask import current_app
+
+from app import extensions
+
+CHANNEL_PREFIX = 'detectify:job'
+TERMINAL_STATUSES = ('COMPLETED', 'FAILED')
+
+
+def channel_name(analysis_id):
+    return f"{CHANNEL_PREFIX}:{analysis_id}:status"
+
+
+def status_event(job):
+    """
+    Payload status satu job: dipakai GET /analysis/<id>, status awal SSE /
+    long-poll, dan event yang dipublikasikan worker (bentuknya selalu sama).
+    """
+    event = {
+        "analysis_id": job.analysis_id,
+        "status": job.status,
+        "created_at": job.created_at.isoformat(),
+    }
+    if job.status == 'COMPLETED':
+        event["result"] = job.result_summary
+    elif job.status == 'FAILED':
+        event["error"] = job.error_message
+    return event
+
+
+def publish_status(jobs):
+    """
+    Publikasikan status terbaru job (satu atau list) ke Redis pub/sub.
+    Dipanggil worker setelah commit. Tanpa Redis tidak melakukan apa-apa.
+    """
+    redis_client = extensions.redis_client
+    if redis_client is None:
+        return
+    if not isinstance(jobs, (list, tuple)):
+        jobs = [jobs]
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for job in jobs:
+            pipe.publish(channel_name(job.analysis_id), json.dumps(status_event(job)))
+        pipe.execute()
+    except Exception as e:
+        current_app.logger.warning(f"Job status publish failed: {e}")
+
+
+class StatusSubscription:
+    """
+    Langganan status satu job. Harus dibuat SEBELUM status awal dibaca dari DB,
+    supaya transisi yang terjadi di antaranya tidak terlewat.
+    """
+    def __init__(self, pubsub):
+        self._pubsub = pubsub
+
+    def next_event(self, timeout):
+        """Event berikutnya (dict) atau None jika tidak ada dalam `timeout` detik."""
+        message = self._pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        if message is None or message.get('type') != 'message':
+            return None
+        return json.loads(message['data'])
+
+    def close(self):
+        try:
+            self._pubsub.close()
+        except Exception:
+            pass
+
+
+def subscribe(analysis_id):
+    """StatusSubscription untuk job ini, atau None jika Redis tidak tersedia."""
+    redis_client = extensions.redis_client
+    if redis_client is None:
+        return None
+    try:
+        pubsub = redis_client.pubsub()
+        pubsub.subscribe(channel_name(analysis_id))
+        return StatusSubscription(pubsub)
+    except Exception as e:
+        current_app.logger.warning(f"Job status subscribe failed: {e}")
+        return None
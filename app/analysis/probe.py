@@ -0,0 +1,151 @@
+# FILE: app/analysis/probe.py
+import struct
+
+import soundfile as sf
+
+# Frame terakhir yang dibaca untuk memastikan file tidak terpotong
+PROBE_TAIL_FRAMES = 2048
+
+# Ekstensi upload -> format libsndfile
+_SOUNDFILE_FORMATS = {'wav': 'WAV', 'flac': 'FLAC', 'ogg': 'OGG', 'mp3': 'MP3'}
+_MP4_EXTENSIONS = {'m4a', 'mp4'}
+
+INVALID_AUDIO_MESSAGE = "File audio rusak, terpotong, atau formatnya tidak dikenali"
+
+
+def empty_metadata():
+    return {"duration_seconds": None, "audio_codec": None, "sample_rate": None, "channels": None}
+
+
+def probe_audio(file, extension):
+    """
+    Baca metadata audio dari header tanpa decode penuh:
+    {duration_seconds, audio_codec, sample_rate, channels}.
+
+    - wav/flac/ogg/mp3: header via libsndfile + seek & baca PROBE_TAIL_FRAMES
+      terakhir (file terpotong gagal di sini).
+    - m4a: struktur box MP4 (mvhd & stsd), tanpa decoder AAC.
+
+    Raise ValueError jika file tidak bisa dibaca. Format yang tidak didukung
+    libsndfile di server ini (misal mp3 pada libsndfile < 1.1) dilewati:
+    metadata kosong, worker yang memutuskan.
+    """
+    file.seek(0)
+    try:
+        if extension in _MP4_EXTENSIONS:
+            return _probe_mp4(file)
+
+        sf_format = _SOUNDFILE_FORMATS.get(extension)
+        if sf_format is None or sf_format not in sf.available_formats():
+            return empty_metadata()
+        return _probe_soundfile(file)
+    finally:
+        file.seek(0)
+
+
+def _probe_soundfile(file):
+    try:
+        with sf.SoundFile(file) as f:
+            frames, sample_rate, channels = f.frames, f.samplerate, f.channels
+            codec = f"{f.format}:{f.subtype}".lower()
+            if frames <= 0 or sample_rate <= 0:
+                raise ValueError(INVALID_AUDIO_MESSAGE)
+            f.seek(max(frames - PROBE_TAIL_FRAMES, 0))
+            if f.read(PROBE_TAIL_FRAMES, dtype='int16').shape[0] == 0:
+                raise ValueError(INVALID_AUDIO_MESSAGE)
+    except (RuntimeError, sf.LibsndfileError):
+        raise ValueError(INVALID_AUDIO_MESSAGE)
+
+    return {
+        "duration_seconds": frames / sample_rate,
+        "audio_codec": codec,
+        "sample_rate": sample_rate,
+        "channels": channels,
+    }
+
+
+# --- MP4 / M4A (ISO BMFF) ---
+
+def _iter_boxes(file, start, end):
+    """(tipe, awal payload, akhir box) untuk setiap box di [start, end)."""
+    position = start
+    while position + 8 <= end:
+        file.seek(position)
+        size, box_type = struct.unpack('>I4s', file.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack('>Q', file.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = end - position
+        if size < header or position + size > end:
+            # Box melewati akhir file: upload terpotong
+            raise ValueError(INVALID_AUDIO_MESSAGE)
+        yield box_type, position + header, position + size
+        position += size
+
+
+def _find_box(file, start, end, *path):
+    for box_type, payload_start, box_end in _iter_boxes(file, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return payload_start, box_end
+            found = _find_box(file, payload_start, box_end, *path[1:])
+            if found:
+                return found
+    return None
+
+
+def _probe_mp4(file):
+    file.seek(0, 2)
+    file_end = file.tell()
+
+    top_level = {box_type: (start, end) for box_type, start, end in _iter_boxes(file, 0, file_end)}
+    if b'moov' not in top_level or b'mdat' not in top_level:
+        raise ValueError(INVALID_AUDIO_MESSAGE)
+    moov_start, moov_end = top_level[b'moov']
+
+    # Durasi dari mvhd (timescale & duration, versi 0 = 32-bit, versi 1 = 64-bit)
+    mvhd = _find_box(file, moov_start, moov_end, b'mvhd')
+    if not mvhd:
+        raise ValueError(INVALID_AUDIO_MESSAGE)
+    file.seek(mvhd[0])
+    version = file.read(4)[0]
+    if version == 1:
+        _, _, timescale, duration = struct.unpack('>QQIQ', file.read(28))
+    else:
+        _, _, timescale, duration = struct.unpack('>IIII', file.read(16))
+    if not timescale or not duration:
+        raise ValueError(INVALID_AUDIO_MESSAGE)
+
+    # Track audio pertama: hdlr 'soun' -> stsd (codec, channel, sample rate)
+    for box_type, trak_start, trak_end in _iter_boxes(file, moov_start, moov_end):
+        if box_type != b'trak':
+            continue
+        hdlr = _find_box(file, trak_start, trak_end, b'mdia', b'hdlr')
+        if not hdlr:
+            continue
+        file.seek(hdlr[0] + 8)
+        if file.read(4) != b'soun':
+            continue
+        stsd = _find_box(file, trak_start, trak_end, b'mdia', b'minf', b'stbl', b'stsd')
+        if not stsd:
+            break
+        # stsd: version/flags(4) entry_count(4) | entry: size(4) format(4) reserved(6) dref(2)
+        #       AudioSampleEntry: reserved(8) channelcount(2) samplesize(2) reserved(4) samplerate(16.16)
+        file.seek(stsd[0] + 8)
+        entry = file.read(36)
+        if len(entry) < 36:
+            raise ValueError(INVALID_AUDIO_MESSAGE)
+        codec = entry[4:8].decode('latin-1').strip()
+        channels, = struct.unpack('>H', entry[24:26])
+        sample_rate = struct.unpack('>I', entry[32:36])[0] >> 16
+        return {
+            "duration_seconds": duration / timescale,
+            "audio_codec": f"mp4:{codec}".lower(),
+            "sample_rate": sample_rate or None,
+            "channels": channels or None,
+        }
+
+    # Tidak ada track audio
+    raise ValueError(INVALID_AUDIO_MESSAGE)
@@ -0,0 +1,154 @@
+# FILE: app/analysis/quota.py
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from app import extensions
+from app.extensions import db
+from app.models import DailyUsage
+
+
+class DailyQuota:
+    """
+    Kuota analisis harian per user dengan counter atomik (O(1) per upload).
+
+    - Redis (jika REDIS_URL di-set): INCR pada key per user per hari (UTC) + EXPIRE.
+    - Tanpa Redis: tabel DailyUsage, naik lewat UPDATE bersyarat
+      (used < limit) sehingga upload paralel tidak bisa melewati batas.
+
+    Counter yang baru dibuat hari itu di-seed dari riwayat (COUNT memakai index
+    (user_id, created_at)), jadi data lama / Redis yang di-flush tetap terhitung.
+    Slot yang sudah dipesan dikembalikan dengan release() jika upload gagal.
+    """
+    KEY_PREFIX = 'detectify:quota'
+    KEY_TTL_SECONDS = 2 * 24 * 3600
+
+    @staticmethod
+    def today():
+        return datetime.utcnow().date()
+
+    def _key(self, user_id, day):
+        return f"{self.KEY_PREFIX}:{user_id}:{day:%Y%m%d}"
+
+    @staticmethod
+    def _count_history(user, day):
+        return user.get_daily_usage_count(datetime.combine(day, datetime.min.time()))
+
+    # --- API publik ---
+
+    def usage(self, user):
+        """Jumlah analisis user hari ini (tanpa memesan slot)."""
+        day = self.today()
+        redis_client = extensions.redis_client
+        if redis_client is not None:
+            try:
+                raw = redis_client.get(self._key(user.user_id, day))
+                if raw is not None:
+                    return int(raw)
+            except Exception as e:
+                current_app.logger.warning(f"Quota lookup failed: {e}")
+            return self._count_history(user, day)
+
+        row = db.session.get(DailyUsage, (user.user_id, day))
+        return row.used if row is not None else self._count_history(user, day)
+
+    def reserve(self, user):
+        """
+        Pesan satu slot analisis hari ini.
+        Raise PermissionError jika kuota habis. User tanpa batas (Premium) selalu lolos.
+        """
+        limit = user.daily_limit()
+        if limit is None:
+            return
+
+        day = self.today()
+        redis_client = extensions.redis_client
+        if redis_client is not None:
+            try:
+                self._reserve_redis(redis_client, user, day, limit)
+            except PermissionError:
+                raise
+            except Exception as e:
+                # Redis bermasalah: fallback ke hitungan riwayat (lambat tapi aman)
+                current_app.logger.warning(f"Quota reserve failed, falling back to history count: {e}")
+                used = self._count_history(user, day)
+                if used >= limit:
+                    raise PermissionError(f"Kuota habis. Terpakai: {used}")
+            return
+
+        self._reserve_db(user, day, limit)
+
+    def release(self, user):
+        """Kembalikan slot yang dipesan reserve() (upload gagal sebelum job tersimpan)."""
+        if user.daily_limit() is None:
+            return
+
+        day = self.today()
+        redis_client = extensions.redis_client
+        if redis_client is not None:
+            try:
+                redis_client.decr(self._key(user.user_id, day))
+            except Exception as e:
+                current_app.logger.warning(f"Quota release failed: {e}")
+            return
+
+        db.session.execute(
+            update(DailyUsage)
+            .where(DailyUsage.user_id == user.user_id, DailyUsage.usage_date == day, DailyUsage.used > 0)
+            .values(used=DailyUsage.used - 1)
+        )
+        db.session.commit()
+
+    # --- Backend ---
+
+    def _reserve_redis(self, redis_client, user, day, limit):
+        key = self._key(user.user_id, day)
+        pipe = redis_client.pipeline()
+        pipe.incr(key)
+        pipe.expire(key, self.KEY_TTL_SECONDS)
+        used, _ = pipe.execute()
+
+        if used == 1:
+            # Counter baru: tambahkan analisis yang sudah tercatat hari ini
+            seeded = self._count_history(user, day)
+            if seeded:
+                used = redis_client.incrby(key, seeded)
+
+        if used > limit:
+            redis_client.decr(key)
+            raise PermissionError(f"Kuota habis. Terpakai: {used - 1}")
+        return used
+
+    def _reserve_db(self, user, day, limit):
+        result = db.session.execute(
+            update(DailyUsage)
+            .where(DailyUsage.user_id == user.user_id, DailyUsage.usage_date == day, DailyUsage.used < limit)
+            .values(used=DailyUsage.used + 1)
+        )
+        if result.rowcount:
+            db.session.commit()
+            return
+
+        row = db.session.get(DailyUsage, (user.user_id, day))
+        if row is not None:
+            used = row.used
+            db.session.rollback()
+            raise PermissionError(f"Kuota habis. Terpakai: {used}")
+
+        # Upload pertama hari ini: buat counter, seed dari riwayat
+        used = self._count_history(user, day)
+        allowed = used < limit
+        db.session.add(DailyUsage(user_id=user.user_id, usage_date=day, used=used + 1 if allowed else used))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Upload paralel sudah membuat barisnya lebih dulu: ulangi lewat UPDATE
+            db.session.rollback()
+            return self._reserve_db(user, day, limit)
+        if not allowed:
+            raise PermissionError(f"Kuota habis. Terpakai: {used}")
+
+
+# Instance global (satu per proses)
+daily_quota = DailyQuota()
@@ -1,8 +1,11 @@
 # app/analysis/routes.py
-from flask import request, jsonify
+import json
+import time
+from flask import Response, current_app, request, jsonify, make_response, url_for
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from . import analysis_bp
 from .services import AnalysisService 
+from . import events
 
 # --- 1. ENDPOINT UPLOAD ---
 @analysis_bp.route('/analysis/audio', methods=['POST'])
@@ -26,17 +29,87 @@ def upload_audio():
     except Exception as e:
         return jsonify({"error": "Internal Error", "details": str(e)}), 500
 
+# --- 1b. ENDPOINT UPLOAD LANGSUNG KE S3 (presigned URL) ---
+# Body: {"file_name": "a.mp3", "file_size": 123456, "content_type": "audio/mpeg", "sha256": "<hex, opsional>"}
+@analysis_bp.route('/analysis/audio/presign', methods=['POST'])
+@jwt_required()
+def presign_audio_upload():
+    data = request.get_json(silent=True) or {}
+    user_id = get_jwt_identity()
+
+    try:
+        result = AnalysisService.create_presigned_upload(
+            user_id,
+            data.get('file_name'),
+            data.get('file_size'),
+            content_type=data.get('content_type'),
+            sha256=data.get('sha256')
+        )
+        # Cache hit: job langsung selesai, tidak perlu upload
+        return jsonify(result), 200 if result["status"] == 'COMPLETED' else 201
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except PermissionError as e:
+        return jsonify({"error": str(e)}), 403
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 500
+    except Exception as e:
+        return jsonify({"error": "Internal Error", "details": str(e)}), 500
+
+
+# Body (multipart saja): {"upload_id": "...", "parts": [{"part_number": 1, "etag": "..."}]}
+@analysis_bp.route('/analysis/<string:analysis_id>/complete', methods=['POST'])
+@jwt_required()
+def complete_audio_upload(analysis_id):
+    data = request.get_json(silent=True) or {}
+    user_id = get_jwt_identity()
+
+    try:
+        result = AnalysisService.complete_presigned_upload(
+            user_id, analysis_id, upload_id=data.get('upload_id'), parts=data.get('parts')
+        )
+        if not result:
+            return jsonify({"error": "Tidak ditemukan"}), 404
+        return jsonify(result), 202
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": "Internal Error", "details": str(e)}), 500
+
 # --- 2. ENDPOINT HISTORY (Pastikan ini ada!) ---
+# Query: ?limit=50&cursor=<X-Next-Cursor>&fields=analysis_id,status,created_at
+# Body tetap list; halaman berikutnya lewat header X-Next-Cursor / Link.
 @analysis_bp.route('/history', methods=['GET'])
 @jwt_required()
 def get_history():
     user_id = get_jwt_identity()
     try:
-        results = AnalysisService.get_user_history(user_id)
-        return jsonify(results), 200
+        page = AnalysisService.get_user_history(
+            user_id,
+            limit=request.args.get('limit', type=int),
+            cursor=request.args.get('cursor'),
+            fields=request.args.get('fields'),
+            if_none_match=request.if_none_match
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": "Gagal mengambil riwayat", "details": str(e)}), 500
 
+    if page["not_modified"]:
+        response = make_response('', 304)
+    else:
+        response = make_response(jsonify(page["items"]), 200)
+
+    response.set_etag(page["etag"])
+    response.headers['Cache-Control'] = 'private, no-cache'
+    if page["next_cursor"]:
+        response.headers['X-Next-Cursor'] = page["next_cursor"]
+        next_args = request.args.to_dict()
+        next_args['cursor'] = page["next_cursor"]
+        response.headers['Link'] = f'<{url_for(request.endpoint, **next_args)}>; rel="next"'
+    return response
+
 # --- 3. ENDPOINT STATUS (Pastikan ini ada!) ---
 @analysis_bp.route('/analysis/<string:analysis_id>', methods=['GET'])
 @jwt_required()
@@ -48,4 +121,102 @@ def get_analysis_status(analysis_id):
             return jsonify({"error": "Tidak ditemukan"}), 404
         return jsonify(result), 200
     except Exception as e:
-        return jsonify({"error": "Gagal cek status", "details": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": "Gagal cek status", "details": str(e)}), 500
+
+
+# --- 4. ENDPOINT STATUS PUSH (SSE & long-poll, pengganti polling) ---
+# DB hanya dibaca sekali saat connect; perubahan berikutnya datang dari Redis pub/sub.
+def _open_status_subscription(user_id, analysis_id):
+    """Subscribe dulu, baru baca status awal, agar transisi di antaranya tidak hilang."""
+    subscription = events.subscribe(analysis_id)
+    initial = AnalysisService.get_job_status(user_id, analysis_id)
+    if not initial and subscription is not None:
+        subscription.close()
+    return subscription, initial
+
+
+def _holds_sync_worker():
+    """Worker sync: request yang menunggu lama memblokir satu worker (dan kena timeout gunicorn)."""
+    return current_app.config.get('SERVING_MODE', 'sync') != 'async'
+
+
+@analysis_bp.route('/analysis/<string:analysis_id>/events', methods=['GET'])
+@jwt_required()
+def stream_analysis_status(analysis_id):
+    user_id = get_jwt_identity()
+    try:
+        subscription, initial = _open_status_subscription(user_id, analysis_id)
+    except Exception as e:
+        return jsonify({"error": "Gagal cek status", "details": str(e)}), 500
+    if not initial:
+        return jsonify({"error": "Tidak ditemukan"}), 404
+
+    max_seconds = current_app.config.get('JOB_EVENTS_MAX_SECONDS', 300)
+    heartbeat = current_app.config.get('JOB_EVENTS_HEARTBEAT_SECONDS', 15)
+    # Dibaca di sini: generator berjalan setelah app context request dilepas
+    sync_mode = _holds_sync_worker()
+
+    def generate():
+        try:
+            yield f"event: status\ndata: {json.dumps(initial)}\n\n"
+            if initial["status"] in events.TERMINAL_STATUSES:
+                return
+            if subscription is None or sync_mode:
+                # Tanpa Redis / worker sync: minta EventSource reconnect (setara polling 3 detik),
+                # stream panjang hanya di SERVING_MODE=async
+                yield "retry: 3000\n\n"
+                return
+
+            deadline = time.monotonic() + max_seconds
+            while time.monotonic() < deadline:
+                event = subscription.next_event(timeout=heartbeat)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: status\ndata: {json.dumps(event)}\n\n"
+                if event["status"] in events.TERMINAL_STATUSES:
+                    return
+            yield "retry: 1000\n\n"
+        finally:
+            if subscription is not None:
+                subscription.close()
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+
+# Long-poll: ?since=<status yang sudah diketahui client>&timeout=<detik>
+@analysis_bp.route('/analysis/<string:analysis_id>/wait', methods=['GET'])
+@jwt_required()
+def wait_analysis_status(analysis_id):
+    user_id = get_jwt_identity()
+    try:
+        subscription, initial = _open_status_subscription(user_id, analysis_id)
+    except Exception as e:
+        return jsonify({"error": "Gagal cek status", "details": str(e)}), 500
+    if not initial:
+        return jsonify({"error": "Tidak ditemukan"}), 404
+
+    if subscription is None:
+        return jsonify(initial), 200
+
+    try:
+        since = request.args.get('since')
+        if initial["status"] != since or initial["status"] in events.TERMINAL_STATUSES:
+            return jsonify(initial), 200
+
+        max_wait = current_app.config.get('JOB_LONGPOLL_MAX_SECONDS', 30)
+        if _holds_sync_worker():
+            # Selesai jauh sebelum gunicorn membunuh worker sync
+            max_wait = min(max_wait, current_app.config.get('GUNICORN_TIMEOUT', 60) / 2)
+        timeout = min(request.args.get('timeout', default=max_wait, type=float), max_wait)
+        deadline = time.monotonic() + timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            event = subscription.next_event(timeout=remaining)
+            if event is not None:
+                return jsonify(event), 200
+        return jsonify(initial), 200
+    finally:
+        subscription.close()
@@ -0,0 +1,311 @@
+# FILE: app/analysis/scheduler.py
+import time
+from flask import current_app
+
+from app import extensions
+from app.models import UserPlan
+
+LONG_QUEUE_SUFFIX = '_long'
+# Penanda job panjang pada entri antrean per user ('<analysis_id>|long')
+_LONG_MARK = '|long'
+
+# Job baru masuk antrean per user; ring berisi user yang masih punya job menunggu.
+# ARGV[3] = 'front' untuk mengembalikan job yang gagal dikirim ke depan antrean.
+_SUBMIT_SCRIPT = """
+local length
+if ARGV[3] == 'front' then
+    length = redis.call('LPUSH', KEYS[1], ARGV[1])
+else
+    length = redis.call('RPUSH', KEYS[1], ARGV[1])
+end
+if length == 1 then
+    redis.call('RPUSH', KEYS[2], ARGV[2])
+end
+return length
+"""
+
+# Ambil satu job berikutnya (atomik untuk semua proses API & worker):
+# 1. Total in-flight semua lane harus < capacity.
+# 2. Lane dengan job menunggu dan in-flight/bobot terkecil dipilih (weighted fair sharing;
+#    lane lain boleh memakai slot yang tidak dipakai).
+# 3. Di dalam lane, user bergiliran (round-robin): satu job per giliran.
+_PUMP_SCRIPT = """
+local prefix = ARGV[1]
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local lane_count = (#ARGV - 3) / 2
+
+local total = 0
+for i = 1, lane_count do
+    total = total + redis.call('ZCARD', prefix .. ':' .. ARGV[3 + i * 2 - 1] .. ':inflight')
+end
+if total >= capacity then
+    return nil
+end
+
+local best, best_score
+for i = 1, lane_count do
+    local lane = ARGV[3 + i * 2 - 1]
+    local weight = tonumber(ARGV[3 + i * 2])
+    if weight > 0 and redis.call('LLEN', prefix .. ':' .. lane .. ':users') > 0 then
+        local score = redis.call('ZCARD', prefix .. ':' .. lane .. ':inflight') / weight
+        if best == nil or score < best_score then
+            best, best_score = lane, score
+        end
+    end
+end
+if best == nil then
+    return nil
+end
+
+local ring = prefix .. ':' .. best .. ':users'
+while redis.call('LLEN', ring) > 0 do
+    local user_id = redis.call('LPOP', ring)
+    local user_queue = prefix .. ':' .. best .. ':user:' .. user_id
+    local job_id = redis.call('LPOP', user_queue)
+    if job_id then
+        if redis.call('LLEN', user_queue) > 0 then
+            redis.call('RPUSH', ring, user_id)
+        end
+        redis.call('ZADD', prefix .. ':' .. best .. ':inflight', now, job_id)
+        return {best, job_id, user_id}
+    end
+end
+return nil
+"""
+
+
+def lane_for_plan(plan):
+    """Nama lane dari UserPlan ('premium' / 'free')."""
+    return getattr(plan, 'value', plan or UserPlan.FREE.value).lower()
+
+
+def lane_queue(lane):
+    """Queue Celery untuk lane (worker: -Q audio_premium,audio_free)."""
+    return f"audio_{lane}"
+
+
+def long_queue(queue):
+    """Queue untuk job panjang (worker: -Q audio_queue_long / audio_premium_long,...)."""
+    return f"{queue}{LONG_QUEUE_SUFFIX}"
+
+
+def estimate_cost_seconds(config, duration_seconds=None, file_size=None, plan=None):
+    """
+    Estimasi waktu worker (detik) untuk satu job dari durasi header audio.
+    Tanpa durasi (upload presigned / format tanpa probe) durasi ditebak dari ukuran file.
+    File yang dinilai tersampel (SAMPLED_ANALYSIS_*) dibatasi anggaran waktu paketnya.
+    """
+    if duration_seconds is None:
+        duration_seconds = (file_size or 0) / max(config.get('AUDIO_ASSUMED_BYTES_PER_SECOND', 16000), 1)
+
+    base = config.get('AUDIO_COST_BASE_SECONDS', 1.5)
+    cost = base + duration_seconds * config.get('AUDIO_COST_PER_AUDIO_SECOND', 0.05)
+
+    if config.get('SAMPLED_ANALYSIS_ENABLED') and duration_seconds >= config.get('SAMPLED_ANALYSIS_MIN_SECONDS', 300):
+        plan_name = getattr(plan, 'value', plan) or UserPlan.FREE.value
+        budget = config.get(f'ANALYSIS_TIME_BUDGET_{plan_name}')
+        if budget is not None:
+            cost = min(cost, base + budget)
+    return round(cost, 1)
+
+
+def _parse_plan_map(raw, cast):
+    """'PREMIUM:3,FREE:1' -> {'premium': 3, 'free': 1}"""
+    result = {}
+    for item in (raw or '').split(','):
+        if ':' in item:
+            name, value = item.split(':', 1)
+            result[name.strip().lower()] = cast(value)
+    return result
+
+
+class JobScheduler:
+    """
+    Lane prioritas per paket + giliran adil antar user untuk job audio.
+
+    Job tidak langsung dikirim ke broker. Job masuk antrean per user di Redis
+    dan dipompa ke queue Celery lane-nya hanya selama job in-flight
+    (dikirim tapi belum selesai) < AUDIO_LANE_CAPACITY, kira-kira total
+    concurrency worker. Dengan begitu antrean sebenarnya ada di sini:
+    - antar lane dibagi sesuai bobot AUDIO_LANE_WEIGHTS (PREMIUM:3,FREE:1 =
+      premium dapat ~3x slot selama kedua lane punya backlog);
+    - di dalam lane, user bergiliran satu job per giliran, jadi burst satu akun
+      tidak menahan job user lain.
+
+    Worker memanggil release() setelah job selesai (slot kosong -> pompa lagi).
+    Slot yang tidak pernah dilepas (worker mati) kedaluwarsa setelah
+    AUDIO_LANE_INFLIGHT_TTL_SECONDS lewat reconcile() periodik.
+    Tanpa Redis, job langsung dikirim ke queue lane-nya.
+
+    Dengan AUDIO_DURATION_ROUTING, job yang estimasi biayanya
+    >= AUDIO_LONG_JOB_COST_SECONDS dikirim ke queue '<queue>_long' yang dilayani
+    worker terpisah, jadi klip pendek tidak menunggu di belakang rekaman berjam-jam.
+    """
+    PREFIX = 'detectify:lane'
+
+    def __init__(self):
+        self._scripts = {}
+
+    def _script(self, redis_client, name, source):
+        key = (id(redis_client), name)
+        if key not in self._scripts:
+            self._scripts[key] = redis_client.register_script(source)
+        return self._scripts[key]
+
+    @staticmethod
+    def weights():
+        return _parse_plan_map(current_app.config.get('AUDIO_LANE_WEIGHTS', 'PREMIUM:3,FREE:1'), float)
+
+    def slo_seconds(self, lane):
+        slos = _parse_plan_map(current_app.config.get('AUDIO_LANE_SLO_SECONDS', 'PREMIUM:60,FREE:600'), float)
+        return slos.get(lane)
+
+    # --- API publik ---
+
+    def dispatch(self, job):
+        """
+        Kirim job baru ke worker (lane prioritas atau audio_queue, pendek / panjang).
+        Mengembalikan estimasi waktu proses worker dalam detik.
+        """
+        config = current_app.config
+        plan = job.user.plan if job.user else None
+        cost = estimate_cost_seconds(config, job.duration_seconds, job.file_size, plan)
+        long_job = bool(config.get('AUDIO_DURATION_ROUTING')) and cost >= config.get('AUDIO_LONG_JOB_COST_SECONDS', 30)
+
+        if config.get('AUDIO_PRIORITY_LANES'):
+            # Lane per paket + giliran adil antar user
+            self.submit(job, plan, long_job=long_job)
+        else:
+            self._send_task(job.analysis_id, 'audio_queue', long_job)
+        return cost
+
+    def submit(self, job, plan, long_job=False):
+        """Antrekan job milik user dengan paket `plan`, lalu pompa jika ada slot."""
+        lane = lane_for_plan(plan)
+        entry = f"{job.analysis_id}{_LONG_MARK}" if long_job else job.analysis_id
+        redis_client = extensions.redis_client
+        if redis_client is None or lane not in self.weights():
+            self._send(entry, lane)
+            return lane
+
+        try:
+            self._enqueue(redis_client, lane, job.user_id, entry)
+        except Exception as e:
+            current_app.logger.warning(f"Lane submit failed, dispatching directly: {e}")
+            self._send(entry, lane)
+            return lane
+
+        self.pump()
+        return lane
+
+    def release(self, lane, analysis_id):
+        """Dipanggil worker setelah job selesai (berhasil / gagal): bebaskan slot & pompa."""
+        redis_client = extensions.redis_client
+        if redis_client is None or not lane:
+            return
+        try:
+            redis_client.zrem(f"{self.PREFIX}:{lane}:inflight", analysis_id, f"{analysis_id}{_LONG_MARK}")
+        except Exception as e:
+            current_app.logger.warning(f"Lane release failed: {e}")
+            return
+        self.pump()
+
+    def pump(self, max_jobs=None):
+        """Kirim job menunggu ke broker selama masih ada slot. Mengembalikan jumlah job terkirim."""
+        redis_client = extensions.redis_client
+        if redis_client is None:
+            return 0
+
+        capacity = current_app.config.get('AUDIO_LANE_CAPACITY', 8)
+        max_jobs = capacity if max_jobs is None else max_jobs
+        weights = self.weights()
+        args = [self.PREFIX, capacity, 0]
+        for lane, weight in weights.items():
+            args += [lane, weight]
+
+        script = self._script(redis_client, 'pump', _PUMP_SCRIPT)
+        sent = 0
+        while sent < max_jobs:
+            args[2] = time.time()
+            try:
+                picked = script(args=args)
+            except Exception as e:
+                current_app.logger.warning(f"Lane pump failed: {e}")
+                break
+            if not picked:
+                break
+
+            lane, entry, user_id = (value.decode() if isinstance(value, bytes) else value for value in picked)
+            try:
+                self._send(entry, lane)
+            except Exception as e:
+                # Broker bermasalah: lepas slot & kembalikan job ke depan antrean user,
+                # pump berikutnya (atau reconcile periodik) mencobanya lagi
+                current_app.logger.error(f"Lane dispatch failed for {entry}: {e}")
+                redis_client.zrem(f"{self.PREFIX}:{lane}:inflight", entry)
+                self._enqueue(redis_client, lane, user_id, entry, front=True)
+                break
+            sent += 1
+        return sent
+
+    def reconcile(self):
+        """Buang slot in-flight yang kedaluwarsa (worker mati sebelum release), lalu pompa."""
+        redis_client = extensions.redis_client
+        if redis_client is None:
+            return {"expired": 0, "dispatched": 0}
+
+        ttl = current_app.config.get('AUDIO_LANE_INFLIGHT_TTL_SECONDS', 1800)
+        expired = 0
+        for lane in self.weights():
+            expired += redis_client.zremrangebyscore(f"{self.PREFIX}:{lane}:inflight", '-inf', time.time() - ttl)
+        return {"expired": expired, "dispatched": self.pump()}
+
+    def backlog(self):
+        """Ringkasan per lane: user yang menunggu & job in-flight (untuk monitoring)."""
+        redis_client = extensions.redis_client
+        if redis_client is None:
+            return {}
+        pipe = redis_client.pipeline(transaction=False)
+        lanes = list(self.weights())
+        for lane in lanes:
+            pipe.llen(f"{self.PREFIX}:{lane}:users")
+            pipe.zcard(f"{self.PREFIX}:{lane}:inflight")
+        values = pipe.execute()
+        return {
+            lane: {"waiting_users": values[i * 2], "inflight": values[i * 2 + 1]}
+            for i, lane in enumerate(lanes)
+        }
+
+    # --- Internal ---
+
+    def _enqueue(self, redis_client, lane, user_id, analysis_id, front=False):
+        self._script(redis_client, 'submit', _SUBMIT_SCRIPT)(
+            keys=[f"{self.PREFIX}:{lane}:user:{user_id}", f"{self.PREFIX}:{lane}:users"],
+            args=[analysis_id, user_id, 'front' if front else 'back'],
+        )
+
+    @classmethod
+    def _send(cls, entry, lane):
+        """Kirim entri antrean lane ('<analysis_id>' atau '<analysis_id>|long') ke queue lane-nya."""
+        long_job = entry.endswith(_LONG_MARK)
+        analysis_id = entry[:-len(_LONG_MARK)] if long_job else entry
+        cls._send_task(analysis_id, lane_queue(lane), long_job, lane=lane)
+
+    @staticmethod
+    def _send_task(analysis_id, queue, long_job, lane=None):
+        kwargs = {'lane': lane} if lane else {}
+        if long_job:
+            # Job panjang tidak di-batch: satu job per task di worker pool panjang
+            from celery_worker.tasks import process_audio_task
+            process_audio_task.apply_async(args=[analysis_id], kwargs=kwargs, queue=long_queue(queue))
+            return
+        if current_app.config.get('AUDIO_BATCH_MODE'):
+            from celery_worker.tasks import process_audio_batch_task as audio_task
+        else:
+            from celery_worker.tasks import process_audio_task as audio_task
+        audio_task.apply_async(args=[analysis_id], kwargs=kwargs, queue=queue)
+
+
+# Instance global (satu per proses)
+job_scheduler = JobScheduler()
@@ -1,12 +1,27 @@
 # FILE: app/analysis/services.py
+import os
+import re
 import uuid
+import base64
+import hashlib
 import logging
 from werkzeug.utils import secure_filename
 from datetime import datetime
 from flask import current_app
+from sqlalchemy import and_, or_
 
 from app.extensions import db, s3_client
 from app.models import AnalysisHistory, User
+from app.metrics import StageTimer
+from .cache import result_cache, hash_file, CACHE_LOCATION_PREFIX
+from .quota import daily_quota
+from .cleanup import s3_cleanup
+from .scheduler import job_scheduler
+from .probe import probe_audio, empty_metadata
+from .events import status_event
+
+# Digest SHA-256 dari client (presigned upload): tepat 32 byte dalam hex
+SHA256_HEX_PATTERN = re.compile(r'[0-9a-fA-F]{64}')
 
 class AnalysisService:
     ALLOWED_EXTENSIONS = {'mp3', 'wav', 'm4a', 'flac', 'ogg'}
@@ -15,8 +30,11 @@ class AnalysisService:
     def _validate_file(file):
         if not file or file.filename == '':
             raise ValueError("File tidak valid atau nama file kosong")
-        
-        filename = secure_filename(file.filename)
+        return AnalysisService._validate_filename(file.filename)
+
+    @staticmethod
+    def _validate_filename(raw_filename):
+        filename = secure_filename(raw_filename or '')
         if '.' not in filename:
             raise ValueError("File tidak memiliki ekstensi")
             
@@ -27,78 +45,468 @@ class AnalysisService:
 
     @staticmethod
     def process_upload(user_id, file):
-        # 1. Cek User & Kuota
-        user = User.query.filter_by(user_id=user_id).first()
-        if not user:
-            raise ValueError("User tidak ditemukan")
+        timer = StageTimer('api_upload')
+        try:
+            return AnalysisService._process_upload(user_id, file, timer)
+        finally:
+            timer.flush()
+
+    @staticmethod
+    def _process_upload(user_id, file, timer):
+        # 1. Cek User & Pesan Kuota (satu operasi counter atomik)
+        with timer.span('quota_check'):
+            user = User.query.filter_by(user_id=user_id).first()
+            if not user:
+                raise ValueError("User tidak ditemukan")
+
+            daily_quota.reserve(user)
 
-        if not user.can_analyze():
-            raise PermissionError(f"Kuota habis. Terpakai: {user.get_daily_usage_count()}")
+        try:
+            return AnalysisService._submit_job(user_id, file, timer)
+        except Exception:
+            # Job tidak tercatat: slot kuota dikembalikan
+            daily_quota.release(user)
+            raise
 
-        # 2. Validasi & Upload S3
+    @staticmethod
+    def _submit_job(user_id, file, timer):
+        # 2. Validasi & Probe header audio (durasi, codec) tanpa decode; file
+        #    rusak / terpotong ditolak sebelum menyentuh S3 & antrean
         original_filename, file_extension = AnalysisService._validate_file(file)
+        with timer.span('probe'):
+            audio_info = probe_audio(file, file_extension)
+
+        # 3. Cek Cache (audio identik tidak perlu dianalisis ulang)
+        with timer.span('cache_lookup'):
+            audio_hash = hash_file(file)
+            cached_result = result_cache.get(audio_hash)
+        if cached_result is not None:
+            with timer.span('db_insert'):
+                return AnalysisService._complete_from_cache(
+                    user_id, original_filename, audio_hash, cached_result, audio_info
+                )
+
+        # 4. Upload S3
+        file.seek(0, os.SEEK_END)
+        file_size = file.tell()
         bucket_name = current_app.config['AWS_S3_BUCKET_NAME']
         unique_id = str(uuid.uuid4())
         s3_file_key = f"audio/{user_id}/{unique_id}.{file_extension}"
 
         try:
-            file.seek(0)
-            s3_client.upload_fileobj(file, bucket_name, s3_file_key)
+            with timer.span('s3_upload'):
+                file.seek(0)
+                s3_client.upload_fileobj(file, bucket_name, s3_file_key)
         except Exception as e:
             current_app.logger.error(f"S3 Upload Error: {e}")
             raise RuntimeError("Gagal upload ke storage cloud")
 
-        # 3. DB Transaction
+        # 5. DB Transaction
         job = AnalysisHistory(
             user_id=user_id,
             status='PENDING',
             analysis_type='AUDIO',
             file_name_original=original_filename,
-            file_location=s3_file_key
+            file_location=s3_file_key,
+            file_size=file_size,
+            audio_hash=audio_hash,
+            **audio_info
         )
         
         try:
-            db.session.add(job)
-            db.session.commit()
-            db.session.refresh(job)
+            with timer.span('db_insert'):
+                db.session.add(job)
+                db.session.commit()
+                db.session.refresh(job)
         except Exception as e:
             db.session.rollback()
-            s3_client.delete_object(Bucket=bucket_name, Key=s3_file_key)
+            s3_cleanup.enqueue(s3_file_key)
             raise RuntimeError("Gagal menyimpan data transaksi")
 
-        # 4. Dispatch Task
+        # 6. Dispatch Task
+        with timer.span('dispatch'):
+            estimated_seconds = AnalysisService._dispatch(job)
+        
+        return {
+            "message": "File diterima",
+            "analysis_id": job.analysis_id,
+            "status": "PENDING",
+            "file_name": original_filename,
+            "duration_seconds": job.duration_seconds,
+            "estimated_seconds": estimated_seconds,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
+    @staticmethod
+    def _dispatch(job):
+        """Kirim job ke worker (lane / queue pendek-panjang, lihat scheduler.py). Mengembalikan estimasi detik."""
         try:
-            from celery_worker.tasks import process_audio_task
-            process_audio_task.apply_async(args=[job.analysis_id], queue='audio_queue')
+            return job_scheduler.dispatch(job)
         except ImportError:
              current_app.logger.warning("Celery task import failed")
-        
+
+    # --- Upload langsung ke S3 (presigned URL) ---
+    # 1) create_presigned_upload: cek kuota & ekstensi, buat job UPLOADING, kembalikan URL.
+    # 2) Client PUT file langsung ke S3 (atau per part untuk multipart).
+    # 3) complete_presigned_upload: HEAD object (ada & ukuran valid), lalu dispatch worker.
+    # Worker API tidak pernah menerima byte audio, jadi biayanya konstan per upload.
+
+    @staticmethod
+    def create_presigned_upload(user_id, file_name, file_size, content_type=None, sha256=None):
+        timer = StageTimer('api_presign')
+        try:
+            with timer.span('quota_check'):
+                user = User.query.filter_by(user_id=user_id).first()
+                if not user:
+                    raise ValueError("User tidak ditemukan")
+                daily_quota.reserve(user)
+
+            try:
+                return AnalysisService._create_presigned_upload(
+                    user_id, file_name, file_size, content_type, sha256, timer
+                )
+            except Exception:
+                daily_quota.release(user)
+                raise
+        finally:
+            timer.flush()
+
+    @staticmethod
+    def _create_presigned_upload(user_id, file_name, file_size, content_type, sha256, timer):
+        original_filename, file_extension = AnalysisService._validate_filename(file_name)
+
+        max_bytes = current_app.config.get('MAX_UPLOAD_MB', 200) * 1024 * 1024
+        if not isinstance(file_size, int) or file_size <= 0:
+            raise ValueError("file_size (byte) wajib diisi")
+        if file_size > max_bytes:
+            raise ValueError(f"File terlalu besar. Maksimal {current_app.config.get('MAX_UPLOAD_MB', 200)} MB")
+
+        # Jika client mengirim SHA-256, S3 memverifikasinya saat PUT, sehingga
+        # hash bisa dipakai untuk cache: audio identik tidak perlu di-upload sama sekali.
+        audio_hash = None
+        if sha256:
+            if not isinstance(sha256, str) or not SHA256_HEX_PATTERN.fullmatch(sha256):
+                raise ValueError("sha256 harus berupa 64 karakter hex")
+            audio_hash = sha256.lower()
+            with timer.span('cache_lookup'):
+                cached_result = result_cache.get(audio_hash)
+            if cached_result is not None:
+                with timer.span('db_insert'):
+                    return AnalysisService._complete_from_cache(user_id, original_filename, audio_hash, cached_result)
+
+        bucket_name = current_app.config['AWS_S3_BUCKET_NAME']
+        s3_file_key = f"audio/{user_id}/{uuid.uuid4()}.{file_extension}"
+        expires_in = current_app.config.get('PRESIGNED_URL_EXPIRES', 900)
+        multipart_threshold = current_app.config.get('MULTIPART_THRESHOLD_MB', 64) * 1024 * 1024
+
+        try:
+            with timer.span('s3_presign'):
+                if file_size >= multipart_threshold:
+                    # Multipart: hash per part tidak bisa diverifikasi sebagai SHA-256 file utuh,
+                    # jadi audio_hash diisi worker setelah download.
+                    audio_hash = None
+                    upload = AnalysisService._presign_multipart(bucket_name, s3_file_key, file_size, content_type, expires_in)
+                else:
+                    upload = AnalysisService._presign_put(bucket_name, s3_file_key, file_size, content_type, audio_hash, expires_in)
+        except Exception as e:
+            current_app.logger.error(f"S3 Presign Error: {e}")
+            raise RuntimeError("Gagal menyiapkan upload ke storage cloud")
+
+        job = AnalysisHistory(
+            user_id=user_id,
+            status='UPLOADING',
+            analysis_type='AUDIO',
+            file_name_original=original_filename,
+            file_location=s3_file_key,
+            file_size=file_size,
+            audio_hash=audio_hash
+        )
+        try:
+            with timer.span('db_insert'):
+                db.session.add(job)
+                db.session.commit()
+                db.session.refresh(job)
+        except Exception as e:
+            db.session.rollback()
+            raise RuntimeError("Gagal menyimpan data transaksi")
+
+        return {
+            "message": "Silakan upload file ke URL berikut",
+            "analysis_id": job.analysis_id,
+            "status": "UPLOADING",
+            "file_name": original_filename,
+            "upload": upload,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
+    @staticmethod
+    def _presign_put(bucket_name, key, file_size, content_type, audio_hash, expires_in):
+        params = {'Bucket': bucket_name, 'Key': key, 'ContentLength': file_size}
+        headers = {'Content-Length': str(file_size)}
+        if content_type:
+            params['ContentType'] = content_type
+            headers['Content-Type'] = content_type
+        if audio_hash:
+            checksum = base64.b64encode(bytes.fromhex(audio_hash)).decode()
+            params['ChecksumSHA256'] = checksum
+            headers['x-amz-checksum-sha256'] = checksum
+
+        url = s3_client.generate_presigned_url('put_object', Params=params, ExpiresIn=expires_in)
+        return {"method": "PUT", "url": url, "headers": headers, "expires_in": expires_in}
+
+    @staticmethod
+    def _presign_multipart(bucket_name, key, file_size, content_type, expires_in):
+        part_size = current_app.config.get('MULTIPART_PART_SIZE_MB', 16) * 1024 * 1024
+        create_params = {'Bucket': bucket_name, 'Key': key}
+        if content_type:
+            create_params['ContentType'] = content_type
+        upload_id = s3_client.create_multipart_upload(**create_params)['UploadId']
+
+        part_count = -(-file_size // part_size)
+        parts = [
+            {
+                "part_number": number,
+                "url": s3_client.generate_presigned_url('upload_part', Params={
+                    'Bucket': bucket_name, 'Key': key, 'UploadId': upload_id, 'PartNumber': number
+                }, ExpiresIn=expires_in)
+            }
+            for number in range(1, part_count + 1)
+        ]
+        return {
+            "method": "MULTIPART",
+            "upload_id": upload_id,
+            "part_size": part_size,
+            "parts": parts,
+            "expires_in": expires_in
+        }
+
+    @staticmethod
+    def complete_presigned_upload(user_id, analysis_id, upload_id=None, parts=None):
+        """Verifikasi object di S3 (HEAD) lalu antrekan job ke worker."""
+        timer = StageTimer('api_complete')
+        try:
+            return AnalysisService._complete_presigned_upload(user_id, analysis_id, upload_id, parts, timer)
+        finally:
+            timer.flush()
+
+    @staticmethod
+    def _complete_presigned_upload(user_id, analysis_id, upload_id, parts, timer):
+        with timer.span('db_fetch'):
+            job = AnalysisHistory.query.filter_by(analysis_id=analysis_id, user_id=user_id).first()
+        if not job:
+            return None
+        if job.status != 'UPLOADING':
+            raise ValueError(f"Job tidak menunggu upload (status: {job.status})")
+
+        bucket_name = current_app.config['AWS_S3_BUCKET_NAME']
+        max_bytes = current_app.config.get('MAX_UPLOAD_MB', 200) * 1024 * 1024
+
+        try:
+            with timer.span('s3_head'):
+                if upload_id:
+                    if not parts:
+                        raise ValueError("Daftar parts wajib diisi untuk multipart upload")
+                    s3_client.complete_multipart_upload(
+                        Bucket=bucket_name, Key=job.file_location, UploadId=upload_id,
+                        MultipartUpload={'Parts': sorted(
+                            ({'PartNumber': int(p['part_number']), 'ETag': p['etag']} for p in parts),
+                            key=lambda p: p['PartNumber']
+                        )}
+                    )
+                head = s3_client.head_object(Bucket=bucket_name, Key=job.file_location)
+        except ValueError:
+            raise
+        except Exception as e:
+            current_app.logger.warning(f"S3 upload verification failed for {analysis_id}: {e}")
+            raise ValueError("File belum ter-upload ke storage")
+
+        size = head.get('ContentLength', 0)
+        if size <= 0 or size > max_bytes or (job.file_size and size != job.file_size):
+            with timer.span('db_commit'):
+                job.status = 'FAILED'
+                job.error_message = f"Ukuran file tidak valid ({size} byte)"
+                db.session.commit()
+            s3_cleanup.enqueue(job.file_location)
+            raise ValueError(job.error_message)
+
+        with timer.span('db_commit'):
+            job.file_size = size
+            job.status = 'PENDING'
+            db.session.commit()
+
+        with timer.span('dispatch'):
+            estimated_seconds = AnalysisService._dispatch(job)
+
         return {
             "message": "File diterima",
             "analysis_id": job.analysis_id,
             "status": "PENDING",
+            "file_name": job.file_name_original,
+            "estimated_seconds": estimated_seconds,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
+    @staticmethod
+    def _complete_from_cache(user_id, original_filename, audio_hash, cached_result, audio_info=None):
+        """
+        Cache hit: job langsung COMPLETED tanpa upload S3 dan tanpa worker.
+        Metadata audio dari probe upload, atau (presigned upload, file belum
+        ada) disalin dari job sebelumnya dengan audio_hash yang sama.
+        """
+        if audio_info is None:
+            audio_info = AnalysisService._audio_info_for_hash(audio_hash)
+        job = AnalysisHistory(
+            user_id=user_id,
+            status='COMPLETED',
+            analysis_type='AUDIO',
+            file_name_original=original_filename,
+            file_location=f"{CACHE_LOCATION_PREFIX}{audio_hash}",
+            audio_hash=audio_hash,
+            result_summary=cached_result,
+            **audio_info
+        )
+
+        try:
+            db.session.add(job)
+            db.session.commit()
+            db.session.refresh(job)
+        except Exception as e:
+            db.session.rollback()
+            raise RuntimeError("Gagal menyimpan data transaksi")
+
+        return {
+            "message": "File diterima (hasil dari cache)",
+            "analysis_id": job.analysis_id,
+            "status": "COMPLETED",
             "file_name": original_filename,
+            "result": cached_result,
             "timestamp": datetime.utcnow().isoformat()
         }
 
     @staticmethod
-    def get_user_history(user_id):
-        """Mengambil semua riwayat user (Logic dipindah dari routes)"""
-        history_list = AnalysisHistory.query.filter_by(user_id=user_id)\
-            .order_by(AnalysisHistory.created_at.desc())\
+    def _audio_info_for_hash(audio_hash):
+        source = db.session.query(
+            AnalysisHistory.duration_seconds,
+            AnalysisHistory.audio_codec,
+            AnalysisHistory.sample_rate,
+            AnalysisHistory.channels
+        ).filter(AnalysisHistory.audio_hash == audio_hash)\
+            .filter(AnalysisHistory.duration_seconds.isnot(None))\
+            .first()
+        return dict(source._mapping) if source else empty_metadata()
+
+    # Kolom yang boleh diminta lewat ?fields= (nama di response -> kolom DB)
+    HISTORY_FIELDS = {
+        "analysis_id": AnalysisHistory.analysis_id,
+        "status": AnalysisHistory.status,
+        "analysis_type": AnalysisHistory.analysis_type,
+        "file_name": AnalysisHistory.file_name_original,
+        "created_at": AnalysisHistory.created_at,
+        "result_summary": AnalysisHistory.result_summary,
+        "duration_seconds": AnalysisHistory.duration_seconds,
+        "audio_codec": AnalysisHistory.audio_codec,
+    }
+    # Tanpa ?fields=: bentuk response lama (field metadata audio hanya jika diminta)
+    DEFAULT_HISTORY_FIELDS = ["analysis_id", "status", "analysis_type", "file_name", "created_at", "result_summary"]
+
+    @staticmethod
+    def _encode_cursor(created_at, analysis_id):
+        raw = f"{created_at.isoformat()}|{analysis_id}".encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    @staticmethod
+    def _decode_cursor(cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+            created_at, analysis_id = raw.split('|', 1)
+            return datetime.fromisoformat(created_at), analysis_id
+        except Exception:
+            raise ValueError("Cursor tidak valid")
+
+    @staticmethod
+    def _parse_fields(fields):
+        if not fields:
+            return list(AnalysisService.DEFAULT_HISTORY_FIELDS)
+        selected = [name.strip() for name in fields.split(',') if name.strip()]
+        unknown = [name for name in selected if name not in AnalysisService.HISTORY_FIELDS]
+        if unknown:
+            raise ValueError(f"Field tidak dikenal: {', '.join(unknown)}")
+        return selected
+
+    @staticmethod
+    def get_user_history(user_id, limit=None, cursor=None, fields=None, if_none_match=None):
+        """
+        Riwayat user per halaman (keyset pada (created_at, analysis_id), terbaru dulu).
+
+        1. Query sempit (id, status, timestamp; keyset via index (user_id, created_at))
+           menentukan isi halaman & ETag. Jika cocok dengan If-None-Match,
+           berhenti di sini (not_modified).
+        2. Jika berubah, hanya kolom di `fields` yang dibaca untuk baris halaman itu.
+        """
+        page_size = current_app.config.get('HISTORY_PAGE_SIZE', 50)
+        max_page_size = current_app.config.get('HISTORY_MAX_PAGE_SIZE', 200)
+        limit = min(max(limit or page_size, 1), max_page_size)
+        selected = AnalysisService._parse_fields(fields)
+
+        query = db.session.query(
+            AnalysisHistory.analysis_id, AnalysisHistory.created_at,
+            AnalysisHistory.updated_at, AnalysisHistory.status
+        ).filter(AnalysisHistory.user_id == user_id)
+        if cursor:
+            cursor_created_at, cursor_id = AnalysisService._decode_cursor(cursor)
+            query = query.filter(or_(
+                AnalysisHistory.created_at < cursor_created_at,
+                and_(AnalysisHistory.created_at == cursor_created_at, AnalysisHistory.analysis_id < cursor_id)
+            ))
+        rows = query.order_by(AnalysisHistory.created_at.desc(), AnalysisHistory.analysis_id.desc())\
+            .limit(limit + 1)\
             .all()
 
-        results = []
-        for item in history_list:
-            results.append({
-                "analysis_id": item.analysis_id,
-                "status": item.status,
-                "analysis_type": item.analysis_type,
-                "file_name": item.file_name_original,
-                "created_at": item.created_at.isoformat(),
-                "result_summary": item.result_summary if item.status == 'COMPLETED' else None
-            })
-        return results
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = AnalysisService._encode_cursor(rows[-1].created_at, rows[-1].analysis_id) if has_more else None
+
+        fingerprint = hashlib.sha256(",".join(selected).encode())
+        for row in rows:
+            fingerprint.update(f"|{row.analysis_id}:{row.status}:{row.updated_at}".encode())
+        fingerprint.update(f"|{next_cursor}".encode())
+        etag = fingerprint.hexdigest()[:32]
+
+        page = {"etag": etag, "next_cursor": next_cursor, "not_modified": False, "items": None}
+        if if_none_match is not None and if_none_match.contains(etag):
+            page["not_modified"] = True
+            return page
+
+        items = []
+        ids = [row.analysis_id for row in rows]
+        if ids:
+            # Hanya kolom yang diminta (+ id & status untuk result_summary)
+            columns = [AnalysisHistory.analysis_id, AnalysisHistory.status]
+            columns += [
+                AnalysisService.HISTORY_FIELDS[name] for name in selected
+                if name not in ("analysis_id", "status")
+            ]
+            records = db.session.query(*columns)\
+                .filter(AnalysisHistory.analysis_id.in_(ids))\
+                .all()
+            by_id = {record.analysis_id: record._mapping for record in records}
+
+            for analysis_id in ids:
+                record = by_id.get(analysis_id)
+                if record is None:
+                    continue  # Terhapus di antara dua query
+                item = {}
+                for name in selected:
+                    value = record[AnalysisService.HISTORY_FIELDS[name]]
+                    if name == "created_at":
+                        value = value.isoformat()
+                    elif name == "result_summary" and record[AnalysisHistory.status] != 'COMPLETED':
+                        value = None
+                    item[name] = value
+                items.append(item)
+
+        page["items"] = items
+        return page
 
     @staticmethod
     def get_job_status(user_id, analysis_id):
@@ -107,15 +515,5 @@ class AnalysisService:
         if not job:
             return None
 
-        response = {
-            "analysis_id": job.analysis_id,
-            "status": job.status,
-            "created_at": job.created_at.isoformat()
-        }
-        
-        if job.status == 'COMPLETED':
-            response["result"] = job.result_summary
-        elif job.status == 'FAILED':
-            response["error"] = job.error_message
-            
-        return response
\ No newline at end of file
+        # Format sama dengan event SSE / long-poll yang dipublikasikan worker
+        return status_event(job)
\ No newline at end of file
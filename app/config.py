@@ -32,14 +32,170 @@ class Config:
     # Nonaktifkan event tracking yang berisik dari SQLAlchemy
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Pool koneksi per proses. Pada SERVING_MODE=async (gunicorn gevent, lihat
+    # gunicorn.conf.py) pool ini dibagi oleh semua request yang sedang terbuka.
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 280)),   # < wait_timeout MySQL
+        'pool_pre_ping': True,
+    }
+
     # --- Celery (Async Tasks) ---
     CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL')
     CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND')
 
+    # --- Redis (Cache & State bersama) ---
+    # Default: pakai broker Celery jika broker-nya Redis
+    REDIS_URL = os.getenv('REDIS_URL') or (
+        CELERY_BROKER_URL if (CELERY_BROKER_URL or '').startswith('redis') else None
+    )
+
+    # --- Worker: Micro-batching (butuh paket celery-batches) ---
+    # Jika aktif, job dikirim ke 'process_audio_batch_task' dan worker memprosesnya
+    # per kelompok: maksimal AUDIO_BATCH_SIZE job atau setiap AUDIO_BATCH_INTERVAL_MS.
+    AUDIO_BATCH_MODE = os.getenv('AUDIO_BATCH_MODE', 'false').lower() == 'true'
+    AUDIO_BATCH_SIZE = int(os.getenv('AUDIO_BATCH_SIZE', 32))
+    AUDIO_BATCH_INTERVAL_MS = int(os.getenv('AUDIO_BATCH_INTERVAL_MS', 500))
+    AUDIO_BATCH_WORKERS = int(os.getenv('AUDIO_BATCH_WORKERS', 4))
+
+    # --- Lane prioritas per paket + giliran adil antar user (lihat app/analysis/scheduler.py, butuh Redis) ---
+    # Job dikirim ke queue audio_premium / audio_free; worker: -Q audio_queue,audio_premium,audio_free
+    AUDIO_PRIORITY_LANES = os.getenv('AUDIO_PRIORITY_LANES', 'false').lower() == 'true'
+    # Job in-flight maksimum di broker/worker (sekitar total concurrency semua worker)
+    AUDIO_LANE_CAPACITY = int(os.getenv('AUDIO_LANE_CAPACITY', 8))
+    # Bagian slot per lane saat semua lane punya backlog
+    AUDIO_LANE_WEIGHTS = os.getenv('AUDIO_LANE_WEIGHTS', 'PREMIUM:3,FREE:1')
+    # Target latensi upload -> selesai per paket (histogram 'lane_<plan>' di /metrics)
+    AUDIO_LANE_SLO_SECONDS = os.getenv('AUDIO_LANE_SLO_SECONDS', 'PREMIUM:60,FREE:600')
+    AUDIO_LANE_INFLIGHT_TTL_SECONDS = int(os.getenv('AUDIO_LANE_INFLIGHT_TTL_SECONDS', 1800))
+    AUDIO_LANE_RECONCILE_SECONDS = int(os.getenv('AUDIO_LANE_RECONCILE_SECONDS', 60))
+
+    # --- Routing job pendek / panjang dari durasi header (app/analysis/probe.py) ---
+    # Job dengan estimasi biaya >= AUDIO_LONG_JOB_COST_SECONDS dikirim ke queue '<queue>_long'
+    # (audio_queue_long / audio_premium_long / audio_free_long), worker terpisah.
+    AUDIO_DURATION_ROUTING = os.getenv('AUDIO_DURATION_ROUTING', 'false').lower() == 'true'
+    AUDIO_LONG_JOB_COST_SECONDS = float(os.getenv('AUDIO_LONG_JOB_COST_SECONDS', 30))
+    # Estimasi biaya worker = base + durasi audio x per_audio_second
+    AUDIO_COST_BASE_SECONDS = float(os.getenv('AUDIO_COST_BASE_SECONDS', 1.5))
+    AUDIO_COST_PER_AUDIO_SECOND = float(os.getenv('AUDIO_COST_PER_AUDIO_SECOND', 0.05))
+    # Durasi tidak diketahui (upload presigned, format tanpa probe): tebak dari ukuran file (~128 kbps)
+    AUDIO_ASSUMED_BYTES_PER_SECOND = int(os.getenv('AUDIO_ASSUMED_BYTES_PER_SECOND', 16000))
+
+    # --- Worker: Warm-up model & pipeline fitur sebelum fork (prefork pool) ---
+    WORKER_WARMUP_ENABLED = os.getenv('WORKER_WARMUP_ENABLED', 'true').lower() == 'true'
+
+    # --- Worker: Cascade model (LogReg dulu, SVM hanya jika belum yakin) ---
+    MODEL_CASCADE_ENABLED = os.getenv('MODEL_CASCADE_ENABLED', 'false').lower() == 'true'
+    MODEL_CASCADE_THRESHOLD = float(os.getenv('MODEL_CASCADE_THRESHOLD', 0.9))
+
+    # --- Worker: Format artefak model ---
+    # auto = pakai artefak .npy (mmap, tanpa pickle) jika ada, fallback ke .pkl
+    MODEL_ARTIFACT_FORMAT = os.getenv('MODEL_ARTIFACT_FORMAT', 'auto').lower()
+
+    # --- Worker: Versi model & hot-swap (lihat celery_worker/manifest.py) ---
+    # Kosong = celery_worker/assets/models/manifest.json
+    MODEL_MANIFEST_PATH = os.getenv('MODEL_MANIFEST_PATH', '')
+    # Interval cek manifest oleh thread watcher (0 = nonaktif, versi hanya dibaca saat start)
+    MODEL_MANIFEST_POLL_SECONDS = float(os.getenv('MODEL_MANIFEST_POLL_SECONDS', 10))
+    # Versi yang tetap di memori per proses (aktif + sebelumnya, untuk rollback instan)
+    MODEL_RETAINED_VERSIONS = int(os.getenv('MODEL_RETAINED_VERSIONS', 2))
+    # Selisih prob_fake maksimum terhadap reference .npz saat validasi versi baru
+    MODEL_VALIDATION_TOLERANCE = float(os.getenv('MODEL_VALIDATION_TOLERANCE', 1e-3))
+
+    # --- Worker: Decoder audio (lihat celery_worker/decoders.py) ---
+    # Dicoba berurutan; ffmpeg dilewati jika binary tidak ada di PATH
+    AUDIO_DECODERS = os.getenv('AUDIO_DECODERS', 'soundfile,ffmpeg,librosa')
+    # res_type librosa: soxr_vhq / soxr_hq (default, identik librosa.load) / soxr_mq / soxr_lq ...
+    AUDIO_RESAMPLE_TYPE = os.getenv('AUDIO_RESAMPLE_TYPE', 'soxr_hq')
+    FFMPEG_BINARY = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+
+    # --- Worker: Ekstraksi streaming untuk rekaman panjang ---
+    # File >= nilai ini (MB) di-decode per blok dengan memori konstan. -1 = nonaktif.
+    AUDIO_STREAMING_MIN_MB = float(os.getenv('AUDIO_STREAMING_MIN_MB', 20))
+
+    # --- Worker: Ekstraksi paralel intra-job (satu file panjang dibagi ke banyak core) ---
+    # Berlaku untuk paket di AUDIO_PARALLEL_PLANS dan audio >= AUDIO_PARALLEL_MIN_SECONDS.
+    AUDIO_PARALLEL_PLANS = os.getenv('AUDIO_PARALLEL_PLANS', 'PREMIUM')
+    AUDIO_PARALLEL_WORKERS = int(os.getenv('AUDIO_PARALLEL_WORKERS', 0))   # 0 = jumlah CPU
+    AUDIO_PARALLEL_MIN_SECONDS = float(os.getenv('AUDIO_PARALLEL_MIN_SECONDS', 120))
+    AUDIO_PARALLEL_CHUNK_SECONDS = float(os.getenv('AUDIO_PARALLEL_CHUNK_SECONDS', 30))
+
+    # --- Worker: Analisis tersampel untuk rekaman panjang (lihat celery_worker/sampling.py) ---
+    # File >= SAMPLED_ANALYSIS_MIN_SECONDS dinilai per segmen dan berhenti lebih awal
+    # jika confidence agregat >= ANALYSIS_EARLY_EXIT_CONFIDENCE atau anggaran waktu habis.
+    SAMPLED_ANALYSIS_ENABLED = os.getenv('SAMPLED_ANALYSIS_ENABLED', 'false').lower() == 'true'
+    SAMPLED_ANALYSIS_MIN_SECONDS = float(os.getenv('SAMPLED_ANALYSIS_MIN_SECONDS', 300))
+    ANALYSIS_SEGMENT_SECONDS = float(os.getenv('ANALYSIS_SEGMENT_SECONDS', 10))
+    ANALYSIS_MIN_SEGMENTS = int(os.getenv('ANALYSIS_MIN_SEGMENTS', 3))
+    ANALYSIS_EARLY_EXIT_CONFIDENCE = float(os.getenv('ANALYSIS_EARLY_EXIT_CONFIDENCE', 0.95))
+    # Anggaran per paket: jumlah segmen maksimum & batas waktu analisis (detik)
+    ANALYSIS_MAX_SEGMENTS_FREE = int(os.getenv('ANALYSIS_MAX_SEGMENTS_FREE', 12))
+    ANALYSIS_TIME_BUDGET_FREE = float(os.getenv('ANALYSIS_TIME_BUDGET_FREE', 20))
+    ANALYSIS_MAX_SEGMENTS_PREMIUM = int(os.getenv('ANALYSIS_MAX_SEGMENTS_PREMIUM', 60))
+    ANALYSIS_TIME_BUDGET_PREMIUM = float(os.getenv('ANALYSIS_TIME_BUDGET_PREMIUM', 120))
+
+    # --- Cache Hasil Analisis (berbasis hash konten audio) ---
+    RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE_ENABLED', 'true').lower() == 'true'
+    RESULT_CACHE_LRU_SIZE = int(os.getenv('RESULT_CACHE_LRU_SIZE', 1024))
+    RESULT_CACHE_TTL_SECONDS = int(os.getenv('RESULT_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+
+    # --- Feature Store (vektor fitur untuk re-scoring tanpa decode ulang) ---
+    FEATURE_STORE_ENABLED = os.getenv('FEATURE_STORE_ENABLED', 'true').lower() == 'true'
+
+    # --- Kuota harian (counter atomik: Redis INCR, atau tabel DailyUsage) ---
+    FREE_DAILY_LIMIT = int(os.getenv('FREE_DAILY_LIMIT', 3))
+
+    # --- Upload langsung ke S3 (presigned URL) ---
+    MAX_UPLOAD_MB = int(os.getenv('MAX_UPLOAD_MB', 200))
+    PRESIGNED_URL_EXPIRES = int(os.getenv('PRESIGNED_URL_EXPIRES', 900))
+    # File >= nilai ini memakai multipart upload (part minimal 5 MB di S3)
+    MULTIPART_THRESHOLD_MB = int(os.getenv('MULTIPART_THRESHOLD_MB', 64))
+    MULTIPART_PART_SIZE_MB = int(os.getenv('MULTIPART_PART_SIZE_MB', 16))
+
+    # --- Riwayat (GET /api/history, keyset pagination) ---
+    HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', 50))
+    HISTORY_MAX_PAGE_SIZE = int(os.getenv('HISTORY_MAX_PAGE_SIZE', 200))
+
+    # --- Notifikasi status job (Redis pub/sub -> SSE / long-poll) ---
+    JOB_EVENTS_MAX_SECONDS = int(os.getenv('JOB_EVENTS_MAX_SECONDS', 300))
+    JOB_EVENTS_HEARTBEAT_SECONDS = int(os.getenv('JOB_EVENTS_HEARTBEAT_SECONDS', 15))
+    JOB_LONGPOLL_MAX_SECONDS = int(os.getenv('JOB_LONGPOLL_MAX_SECONDS', 30))
+    # Mode worker gunicorn (gunicorn.conf.py). Pada 'sync' satu request memegang satu
+    # worker dan dibunuh setelah GUNICORN_TIMEOUT detik: SSE hanya mengirim status
+    # awal + retry (setara polling) dan long-poll dibatasi di bawah timeout tersebut.
+    SERVING_MODE = os.getenv('SERVING_MODE', 'sync').lower()
+    GUNICORN_TIMEOUT = int(os.getenv('GUNICORN_TIMEOUT', 60))
+
+    # --- Observability (histogram durasi per tahap, GET /metrics) ---
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    # Lampirkan rincian waktu per tahap worker ke result_summary['timing_ms']
+    RESULT_TIMING_BREAKDOWN = os.getenv('RESULT_TIMING_BREAKDOWN', 'false').lower() == 'true'
+
     # --- AWS S3 (Object Storage) ---
     AWS_S3_BUCKET_NAME = os.getenv('AWS_S3_BUCKET_NAME')
     AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID')
     AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
+    S3_MAX_POOL_CONNECTIONS = int(os.getenv('S3_MAX_POOL_CONNECTIONS', 32))   # naikkan untuk SERVING_MODE=async
+    S3_MAX_ATTEMPTS = int(os.getenv('S3_MAX_ATTEMPTS', 5))
+
+    # --- Pembersihan file S3 (antrean Redis + DeleteObjects periodik, lihat app/analysis/cleanup.py) ---
+    # false = hapus langsung saat job selesai (juga perilaku jika Redis tidak tersedia)
+    S3_CLEANUP_DEFERRED = os.getenv('S3_CLEANUP_DEFERRED', 'true').lower() == 'true'
+    S3_CLEANUP_INTERVAL_SECONDS = int(os.getenv('S3_CLEANUP_INTERVAL_SECONDS', 60))
+    S3_CLEANUP_BATCH_SIZE = int(os.getenv('S3_CLEANUP_BATCH_SIZE', 1000))     # maks 1000 (batas S3)
+    S3_CLEANUP_MAX_ATTEMPTS = int(os.getenv('S3_CLEANUP_MAX_ATTEMPTS', 5))
+    # Sweep file yatim: objek di S3_UPLOAD_PREFIX yang lebih tua dari S3_ORPHAN_MIN_AGE_HOURS
+    # dan tidak dimiliki job aktif dihapus; upload presigned yang ditinggal ditandai FAILED.
+    S3_UPLOAD_PREFIX = os.getenv('S3_UPLOAD_PREFIX', 'audio/')
+    S3_ORPHAN_SWEEP_INTERVAL_SECONDS = int(os.getenv('S3_ORPHAN_SWEEP_INTERVAL_SECONDS', 3600))
+    S3_ORPHAN_MIN_AGE_HOURS = float(os.getenv('S3_ORPHAN_MIN_AGE_HOURS', 6))
+
+    # --- Worker: Prefetch audio S3 untuk job yang sudah di-reserve (hanya --pool=threads) ---
+    AUDIO_PREFETCH_DEPTH = int(os.getenv('AUDIO_PREFETCH_DEPTH', 2))      # 0 = nonaktif
+    AUDIO_PREFETCH_WORKERS = int(os.getenv('AUDIO_PREFETCH_WORKERS', 2))
+    AUDIO_PREFETCH_MAX_MB = int(os.getenv('AUDIO_PREFETCH_MAX_MB', 64))
 
 
 class DevelopmentConfig(Config):
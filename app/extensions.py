@@ -32,17 +32,44 @@ def init_s3_client(app):
     
     # Konfigurasi untuk S3, misal region
     # Anda mungkin perlu menambahkan AWS_REGION ke file .env dan config.py Anda
-    # s3_config = Config(
-    #     region_name=app.config.get('AWS_S3_REGION', 'ap-southeast-1') 
-    # )
+    # Client boto3 thread-safe; pool koneksi diperbesar agar download paralel
+    # (prefetch & micro-batching) tidak antre menunggu koneksi (default botocore: 10).
+    s3_config = Config(
+        # region_name=app.config.get('AWS_S3_REGION', 'ap-southeast-1'),
+        max_pool_connections=app.config.get('S3_MAX_POOL_CONNECTIONS', 32),
+        retries={'max_attempts': app.config.get('S3_MAX_ATTEMPTS', 5), 'mode': 'adaptive'},
+        tcp_keepalive=True,
+    )
 
     session = Session(
         aws_access_key_id=app.config['AWS_ACCESS_KEY_ID'],
         aws_secret_access_key=app.config['AWS_SECRET_ACCESS_KEY']
-        # config=s3_config  # Aktifkan jika Anda butuh region
     )
     
-    s3_client = session.client('s3')
+    s3_client = session.client('s3', config=s3_config)
     
     # Untuk S3, kita mungkin juga butuh nama bucket di seluruh aplikasi
-    app.config['S3_CLIENT'] = s3_client
\ No newline at end of file
+    app.config['S3_CLIENT'] = s3_client
+
+# 5. Inisialisasi Redis (Cache hasil analisis, dll)
+# Opsional: jika REDIS_URL tidak di-set, fitur yang butuh Redis otomatis nonaktif
+redis_client = None
+
+def init_redis_client(app):
+    """
+    Fungsi helper untuk menginisialisasi Redis client setelah app dibuat.
+    Koneksi baru dibuka saat perintah pertama dijalankan.
+    """
+    global redis_client
+
+    redis_url = app.config.get('REDIS_URL')
+    if not redis_url:
+        return
+
+    import redis
+    redis_client = redis.Redis.from_url(
+        redis_url,
+        socket_timeout=app.config.get('REDIS_SOCKET_TIMEOUT', 0.5),
+        socket_connect_timeout=app.config.get('REDIS_SOCKET_TIMEOUT', 0.5),
+    )
+    app.config['REDIS_CLIENT'] = redis_client
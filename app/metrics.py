@@ -0,0 +1,218 @@
+# FILE: app/metrics.py
+import math
+import threading
+import time
+from contextlib import contextmanager
+from flask import Response, current_app, g, request
+
+from app import extensions
+
+# Batas bucket histogram (detik), dari query DB ringan sampai ekstraksi file panjang
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, math.inf)
+
+
+class StageTimer:
+    """
+    Span waktu per tahap untuk satu request / job.
+
+        timer = StageTimer('worker')
+        with timer.span('s3_get'):
+            ...
+        timer.flush()   # kirim ke histogram
+
+    Tahap yang sama dipanggil berulang dijumlahkan.
+    """
+    def __init__(self, component):
+        self.component = component
+        self.spans = {}
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans[stage] = self.spans.get(stage, 0.0) + (time.perf_counter() - start)
+
+    def breakdown_ms(self):
+        """Ringkasan {tahap: milidetik} untuk dilampirkan ke result_summary."""
+        return {stage: round(seconds * 1000.0, 2) for stage, seconds in self.spans.items()}
+
+    def flush(self):
+        if self.spans:
+            stage_metrics.observe(self.component, self.spans)
+            self.spans = {}
+
+
+class StageMetrics:
+    """
+    Histogram durasi per (component, stage).
+
+    Jika Redis tersedia, hitungan disimpan di satu hash Redis sehingga API dan
+    semua proses worker terlihat di satu endpoint /metrics. Tanpa Redis,
+    histogram hanya mencakup proses yang melayani /metrics.
+    """
+    KEY = 'detectify:metrics:stage_seconds'
+
+    def __init__(self):
+        self._local = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _bucket_index(seconds):
+        for i, bound in enumerate(STAGE_BUCKETS):
+            if seconds <= bound:
+                return i
+        return len(STAGE_BUCKETS) - 1
+
+    def _enabled(self):
+        return current_app.config.get('METRICS_ENABLED', True)
+
+    def observe(self, component, durations):
+        """Catat {stage: detik} untuk satu komponen (satu round-trip Redis)."""
+        if not durations or not self._enabled():
+            return
+
+        redis_client = extensions.redis_client
+        if redis_client is not None:
+            try:
+                pipe = redis_client.pipeline(transaction=False)
+                for stage, seconds in durations.items():
+                    field = f"{component}|{stage}"
+                    pipe.hincrby(self.KEY, f"{field}|b{self._bucket_index(seconds)}", 1)
+                    pipe.hincrbyfloat(self.KEY, f"{field}|sum", seconds)
+                pipe.execute()
+                return
+            except Exception as e:
+                current_app.logger.warning(f"Metrics store failed: {e}")
+
+        with self._lock:
+            for stage, seconds in durations.items():
+                entry = self._local.setdefault((component, stage), [0] * len(STAGE_BUCKETS) + [0.0])
+                entry[self._bucket_index(seconds)] += 1
+                entry[-1] += seconds
+
+    def snapshot(self):
+        """{(component, stage): [hitungan per bucket..., total detik]}"""
+        redis_client = extensions.redis_client
+        if redis_client is not None:
+            try:
+                raw = redis_client.hgetall(self.KEY)
+            except Exception as e:
+                current_app.logger.warning(f"Metrics lookup failed: {e}")
+                raw = None
+            if raw is not None:
+                data = {}
+                for field, value in raw.items():
+                    component, stage, slot = field.decode().rsplit('|', 2)
+                    entry = data.setdefault((component, stage), [0] * len(STAGE_BUCKETS) + [0.0])
+                    if slot == 'sum':
+                        entry[-1] = float(value)
+                    else:
+                        entry[int(slot[1:])] = int(value)
+                return data
+
+        with self._lock:
+            return {key: list(entry) for key, entry in self._local.items()}
+
+    def render_prometheus(self):
+        """Format eksposisi teks Prometheus (bucket kumulatif)."""
+        name = 'detectify_stage_duration_seconds'
+        lines = [
+            f'# HELP {name} Durasi per tahap pipeline analisis (API & worker).',
+            f'# TYPE {name} histogram',
+        ]
+        for (component, stage), entry in sorted(self.snapshot().items()):
+            labels = f'component="{component}",stage="{stage}"'
+            cumulative = 0
+            for bound, count in zip(STAGE_BUCKETS, entry[:-1]):
+                cumulative += count
+                le = '+Inf' if math.isinf(bound) else repr(bound)
+                lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{labels}}} {entry[-1]}')
+            lines.append(f'{name}_count{{{labels}}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+class EventCounters:
+    """
+    Counter monoton per (metric, event), misalnya ('result_cache', 'lru_hits').
+
+    Sama seperti StageMetrics: disimpan di hash Redis jika tersedia (API &
+    worker terlihat di satu /metrics), tanpa Redis hanya proses lokal.
+    """
+    KEY = 'detectify:metrics:events'
+    HELP = {
+        'result_cache': 'Hit, miss, store & error cache hasil analisis (lihat analysis/cache.py).',
+    }
+
+    def __init__(self):
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def incr(self, metric, event, amount=1):
+        if not current_app.config.get('METRICS_ENABLED', True):
+            return
+
+        redis_client = extensions.redis_client
+        if redis_client is not None:
+            try:
+                redis_client.hincrby(self.KEY, f"{metric}|{event}", amount)
+                return
+            except Exception as e:
+                current_app.logger.warning(f"Metrics store failed: {e}")
+
+        with self._lock:
+            self._local[(metric, event)] = self._local.get((metric, event), 0) + amount
+
+    def snapshot(self):
+        """{(metric, event): jumlah}"""
+        redis_client = extensions.redis_client
+        if redis_client is not None:
+            try:
+                raw = redis_client.hgetall(self.KEY)
+            except Exception as e:
+                current_app.logger.warning(f"Metrics lookup failed: {e}")
+                raw = None
+            if raw is not None:
+                return {tuple(field.decode().split('|', 1)): int(value) for field, value in raw.items()}
+
+        with self._lock:
+            return dict(self._local)
+
+    def render_prometheus(self):
+        lines = []
+        current = None
+        for (metric, event), value in sorted(self.snapshot().items()):
+            name = f'detectify_{metric}_events_total'
+            if metric != current:
+                current = metric
+                lines.append(f'# HELP {name} {self.HELP.get(metric, metric)}')
+                lines.append(f'# TYPE {name} counter')
+            lines.append(f'{name}{{event="{event}"}} {value}')
+        return '\n'.join(lines) + '\n' if lines else ''
+
+
+# Instance global (satu per proses)
+stage_metrics = StageMetrics()
+event_counters = EventCounters()
+
+
+def init_metrics(app):
+    """Latensi per endpoint (component 'http') + endpoint GET /metrics."""
+
+    @app.before_request
+    def _start_request_timer():
+        g.request_started_at = time.perf_counter()
+
+    @app.after_request
+    def _record_request_latency(response):
+        started_at = g.pop('request_started_at', None)
+        if started_at is not None and request.endpoint and request.endpoint != 'metrics':
+            stage_metrics.observe('http', {request.endpoint: time.perf_counter() - started_at})
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        body = stage_metrics.render_prometheus() + event_counters.render_prometheus()
+        return Response(body, mimetype='text/plain; version=0.0.4')
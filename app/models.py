@@ -1,4 +1,5 @@
 from .extensions import db
+from flask import current_app
 from sqlalchemy.dialects.mysql import ENUM, JSON
 from sqlalchemy import text
 import uuid
@@ -27,11 +28,14 @@ class User(db.Model):
     history = db.relationship('AnalysisHistory', backref='user', lazy=True, cascade="all, delete-orphan")
 
     # --- [BARU] Helper: Hitung Penggunaan Hari Ini ---
-    def get_daily_usage_count(self):
+    # Dipakai untuk seed/rekonsiliasi counter kuota (lihat app/analysis/quota.py),
+    # bukan lagi di setiap upload. Query ini memakai index (user_id, created_at).
+    def get_daily_usage_count(self, today_start=None):
         from .models import AnalysisHistory  # Import lokal untuk hindari circular import
         
         # Tentukan awal hari ini (jam 00:00:00)
-        today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        if today_start is None:
+            today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
         
         # Hitung jumlah analisis user ini sejak jam 00:00 tadi
         count = AnalysisHistory.query.filter_by(user_id=self.user_id)\
@@ -40,15 +44,21 @@ class User(db.Model):
             
         return count
 
-    # --- [BARU] Helper: Cek Izin ---
-    def can_analyze(self):
+    # --- [BARU] Helper: Batas Harian ---
+    def daily_limit(self):
         # Jika Premium, bebas tanpa batas
         if self.plan == UserPlan.PREMIUM:
-            return True
-            
-        # Jika Free, batasi (misal: 3 kali sehari)
-        LIMIT_HARIAN = 3 
-        return self.get_daily_usage_count() < LIMIT_HARIAN
+            return None
+
+        # Jika Free, batasi (default: 3 kali sehari)
+        return current_app.config.get('FREE_DAILY_LIMIT', 3)
+
+    # --- [BARU] Helper: Cek Izin ---
+    def can_analyze(self):
+        from .analysis.quota import daily_quota  # Import lokal untuk hindari circular import
+
+        limit = self.daily_limit()
+        return limit is None or daily_quota.usage(self) < limit
 
     def __repr__(self):
         return f'<User {self.email} [{self.plan}]>'
@@ -56,12 +66,17 @@ class User(db.Model):
 
 class AnalysisHistory(db.Model):
     __tablename__ = 'AnalysisHistory'
+    __table_args__ = (
+        # Riwayat per user (urut waktu) & rekonsiliasi kuota harian
+        db.Index('ix_analysis_history_user_created', 'user_id', 'created_at'),
+    )
 
     analysis_id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = db.Column(db.String(36), db.ForeignKey('Users.user_id', ondelete='CASCADE'), nullable=False)
     
     status = db.Column(
-        ENUM('PENDING', 'PROCESSING', 'COMPLETED', 'FAILED', name='analysis_status_enum'), 
+        # UPLOADING = menunggu client upload langsung ke S3 (presigned URL)
+        ENUM('UPLOADING', 'PENDING', 'PROCESSING', 'COMPLETED', 'FAILED', name='analysis_status_enum'), 
         nullable=False, 
         default='PENDING'
     )
@@ -73,6 +88,13 @@ class AnalysisHistory(db.Model):
     
     file_name_original = db.Column(db.String(255), nullable=True)
     file_location = db.Column(db.String(1024), nullable=False)
+    file_size = db.Column(db.BigInteger, nullable=True)  # Byte, diverifikasi via HEAD S3
+    audio_hash = db.Column(db.String(64), nullable=True, index=True)  # SHA-256 konten audio
+    # Metadata header audio saat upload (tanpa decode), NULL untuk upload presigned
+    duration_seconds = db.Column(db.Float, nullable=True)
+    audio_codec = db.Column(db.String(64), nullable=True)  # misal 'flac:pcm_16', 'mp4:mp4a'
+    sample_rate = db.Column(db.Integer, nullable=True)
+    channels = db.Column(db.SmallInteger, nullable=True)
     result_summary = db.Column(JSON, nullable=True)
     error_message = db.Column(db.Text, nullable=True)
     
@@ -80,4 +102,34 @@ class AnalysisHistory(db.Model):
     updated_at = db.Column(db.TIMESTAMP, nullable=False, server_default=text('CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'))
 
     def __repr__(self):
-        return f'<AnalysisHistory {self.analysis_id} [{self.status}]>'
\ No newline at end of file
+        return f'<AnalysisHistory {self.analysis_id} [{self.status}]>'
+
+
+class DailyUsage(db.Model):
+    """Counter kuota harian per user (backend kuota jika Redis tidak tersedia)."""
+    __tablename__ = 'DailyUsage'
+
+    user_id = db.Column(db.String(36), db.ForeignKey('Users.user_id', ondelete='CASCADE'), primary_key=True)
+    usage_date = db.Column(db.Date, primary_key=True)
+    used = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DailyUsage {self.user_id} {self.usage_date}: {self.used}>'
+
+
+class AnalysisFeatures(db.Model):
+    """
+    Vektor fitur hasil ekstraksi (disimpan biner float32, urutan FEATURE_NAMES),
+    supaya riwayat bisa dinilai ulang dengan model baru tanpa decode audio lagi.
+    """
+    __tablename__ = 'AnalysisFeatures'
+
+    analysis_id = db.Column(db.String(36), db.ForeignKey('AnalysisHistory.analysis_id', ondelete='CASCADE'), primary_key=True)
+    audio_hash = db.Column(db.String(64), nullable=True, index=True)
+    extractor_version = db.Column(db.String(16), nullable=False, index=True)
+    feature_vector = db.Column(db.LargeBinary, nullable=False)
+
+    created_at = db.Column(db.TIMESTAMP, nullable=False, server_default=text('CURRENT_TIMESTAMP'))
+
+    def __repr__(self):
+        return f'<AnalysisFeatures {self.analysis_id} [v{self.extractor_version}]>'
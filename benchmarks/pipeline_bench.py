@@ -0,0 +1,493 @@
+# FILE: benchmarks/pipeline_bench.py
+"""
+Benchmark offline pipeline analisis audio (tanpa jaringan, tanpa MySQL/Redis/S3).
+
+Mengukur tiap tahap secara terpisah:
+  - decode + resample (librosa.load ke SR worker)
+  - tiap keluarga fitur di extract_single_feature (STFT, MFCC, ZCR, centroid,
+    rolloff, contrast) dan extract_single_feature utuh
+  - tiap decoder (celery_worker/decoders.py) + paritas fitur terhadap librosa.load
+  - ModelRegistry.load_assets (artefak .npy dan pickle)
+  - ModelRegistry.predict (satu sampel) dan predict_batch
+  - process_audio_task end-to-end dengan SQLite + S3 lokal (folder sementara)
+
+Klip uji: assets/test.mp3 + klip sintetis (seed tetap) dengan beberapa durasi
+dan codec. Hasil ditulis ke JSON agar bisa dibandingkan antar commit:
+
+    python -m benchmarks.pipeline_bench --output bench_new.json
+    python -m benchmarks.pipeline_bench --compare bench_old.json bench_new.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+import warnings
+from datetime import datetime, timezone
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+DEFAULT_DURATIONS = [5, 30, 120]
+DEFAULT_CODECS = ['wav', 'flac', 'ogg', 'mp3']
+SYNTH_SAMPLE_RATE = 44100   # Sengaja != SR worker agar resampling ikut terukur
+SYNTH_SEED = 1234
+BENCH_BUCKET = 'detectify-benchmark'
+
+# Paritas decoder: fitur dianggap setara jika |a - ref| <= ATOL + RTOL * |ref|
+PARITY_ATOL = 1e-2
+PARITY_RTOL = 1e-2
+PARITY_RES_TYPES = ['soxr_hq', 'soxr_mq', 'soxr_lq']
+
+# Format soundfile per codec sintetis
+_CODEC_FORMATS = {
+    'wav': ('WAV', 'PCM_16'),
+    'flac': ('FLAC', 'PCM_16'),
+    'ogg': ('OGG', 'VORBIS'),
+    'mp3': ('MP3', 'MPEG_LAYER_III'),
+}
+
+
+# =====================================================================
+# 1. LINGKUNGAN OFFLINE (SQLite + S3 lokal)
+# =====================================================================
+
+class LocalS3:
+    """
+    Pengganti S3 berbasis folder lokal, hanya method yang dipakai pipeline.
+    Key S3 dipetakan ke path file di bawah `root`.
+    """
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, Bucket, Key):
+        path = os.path.join(self.root, Bucket, *Key.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def put_object(self, Bucket, Key, Body):
+        with open(self._path(Bucket, Key), 'wb') as f:
+            f.write(Body if isinstance(Body, bytes) else Body.read())
+        return {}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, **kwargs):
+        self.put_object(Bucket=Bucket, Key=Key, Body=Fileobj)
+
+    def get_object(self, Bucket, Key):
+        with open(self._path(Bucket, Key), 'rb') as f:
+            return {'Body': io.BytesIO(f.read())}
+
+    def head_object(self, Bucket, Key):
+        return {'ContentLength': os.path.getsize(self._path(Bucket, Key))}
+
+    def delete_object(self, Bucket, Key):
+        path = self._path(Bucket, Key)
+        if os.path.exists(path):
+            os.remove(path)
+        return {}
+
+    def delete_objects(self, Bucket, Delete):
+        for obj in Delete.get('Objects', []):
+            self.delete_object(Bucket=Bucket, Key=obj['Key'])
+        return {'Deleted': Delete.get('Objects', [])}
+
+
+def _make_benchmark_config(workdir):
+    from app.config import Config
+
+    class BenchmarkConfig(Config):
+        """Konfigurasi benchmark: SQLite di folder sementara, tanpa Redis."""
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(workdir, 'benchmark.db')
+        REDIS_URL = None
+        CELERY_BROKER_URL = 'memory://'
+        CELERY_RESULT_BACKEND = None
+        AWS_S3_BUCKET_NAME = BENCH_BUCKET
+        WORKER_WARMUP_ENABLED = False
+        # Setiap run harus benar-benar memproses audio, bukan hit cache
+        RESULT_CACHE_ENABLED = False
+        AUDIO_BATCH_MODE = False
+
+    return BenchmarkConfig
+
+
+def _prepare_sqlite_schema(db):
+    """Tipe khusus MySQL (ENUM, JSON, ON UPDATE) diterjemahkan agar bisa dibuat di SQLite."""
+    import sqlalchemy as sa
+    from sqlalchemy.dialects.mysql import ENUM, JSON
+    from sqlalchemy.ext.compiler import compiles
+
+    @compiles(ENUM, 'sqlite')
+    def _compile_enum(type_, compiler, **kw):
+        return 'VARCHAR(32)'
+
+    @compiles(JSON, 'sqlite')
+    def _compile_json(type_, compiler, **kw):
+        return 'JSON'
+
+    for table in db.metadata.tables.values():
+        for column in table.columns:
+            default = column.server_default
+            if default is not None and 'ON UPDATE' in str(getattr(default, 'arg', '')):
+                column.server_default = sa.schema.DefaultClause(sa.text('CURRENT_TIMESTAMP'))
+    db.create_all()
+
+
+def setup_environment(workdir):
+    """
+    Siapkan app Flask + worker dengan SQLite dan S3 lokal.
+    Harus dipanggil sebelum modul celery_worker di-import di tempat lain.
+    """
+    from app.config import config
+    config['benchmark'] = _make_benchmark_config(workdir)
+    os.environ['FLASK_ENV'] = 'benchmark'
+
+    from celery_worker.celery_app import celery
+    from celery_worker import tasks
+    from app import extensions
+    from app.analysis import services
+    from app.extensions import db
+
+    flask_app = celery.flask_app
+    s3 = LocalS3(os.path.join(workdir, 's3'))
+    # Semua pemakai S3 (worker, service API, s3_cleanup lewat app.extensions)
+    # memakai stub lokal, sehingga benchmark tidak pernah memanggil AWS
+    tasks.s3_client = s3
+    services.s3_client = s3
+    extensions.s3_client = s3
+
+    with flask_app.app_context():
+        _prepare_sqlite_schema(db)
+    return flask_app, tasks, s3
+
+
+# =====================================================================
+# 2. KLIP UJI
+# =====================================================================
+
+def synth_signal(duration, sr=SYNTH_SAMPLE_RATE, seed=SYNTH_SEED):
+    """Sinyal mirip suara (harmonik + glide + noise + jeda), deterministik."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * sr)) / sr
+    f0 = 140.0 + 40.0 * np.sin(2 * np.pi * 0.3 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    y = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = 0.5 * (1 + np.sign(np.sin(2 * np.pi * 1.7 * t)))
+    y = 0.3 * y * envelope + 0.02 * rng.standard_normal(t.size)
+    return (y / np.max(np.abs(y)) * 0.8).astype(np.float32)
+
+
+def encode_clip(y, sr, codec):
+    import soundfile as sf
+    fmt, subtype = _CODEC_FORMATS[codec]
+    buffer = io.BytesIO()
+    sf.write(buffer, y, sr, format=fmt, subtype=subtype)
+    return buffer.getvalue()
+
+
+def build_clips(durations, codecs, assets_dir):
+    """Daftar (nama, bytes) klip uji. Codec yang tidak didukung libsndfile dilewati."""
+    clips = []
+    test_mp3 = os.path.join(assets_dir, 'test.mp3')
+    if os.path.exists(test_mp3):
+        with open(test_mp3, 'rb') as f:
+            clips.append(('test.mp3', f.read()))
+
+    for duration in durations:
+        y = synth_signal(duration)
+        for codec in codecs:
+            try:
+                clips.append((f'synth_{duration:g}s.{codec}', encode_clip(y, SYNTH_SAMPLE_RATE, codec)))
+            except Exception as e:
+                print(f"[Bench] Skipping {codec} ({duration}s): {e}")
+    return clips
+
+
+# =====================================================================
+# 3. PENGUKURAN
+# =====================================================================
+
+def time_call(fn, repeat, warmup=1):
+    """Jalankan fn berulang, kembalikan statistik durasi (ms) dan hasil terakhir."""
+    result = None
+    for _ in range(warmup):
+        result = fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    stats = {
+        'min_ms': min(samples),
+        'median_ms': statistics.median(samples),
+        'mean_ms': statistics.fmean(samples),
+        'max_ms': max(samples),
+        'repeat': repeat,
+    }
+    return stats, result
+
+
+def bench_feature_stages(clip_bytes, repeat):
+    """Decode/resample dan tiap keluarga fitur, dengan input yang sama seperti worker."""
+    import librosa
+    from celery_worker import features as F
+    from celery_worker.tasks import extract_single_feature
+
+    stages = {}
+    stages['decode_resample'], (y, sr) = time_call(
+        lambda: librosa.load(io.BytesIO(clip_bytes), sr=F.SR), repeat)
+    stages['stft'], mag = time_call(lambda: F.compute_magnitude(y), repeat)
+    stages['mfcc'], _ = time_call(lambda: F.mfcc_stack(F.mfcc_from_magnitude(mag, sr)).mean(axis=1), repeat)
+    stages['zcr'], _ = time_call(
+        lambda: librosa.feature.zero_crossing_rate(y, frame_length=F.N_FFT, hop_length=F.HOP_LENGTH), repeat)
+    stages['spectral_centroid'], _ = time_call(lambda: librosa.feature.spectral_centroid(S=mag, sr=sr), repeat)
+    stages['spectral_rolloff'], _ = time_call(lambda: librosa.feature.spectral_rolloff(S=mag, sr=sr), repeat)
+    stages['spectral_contrast'], _ = time_call(lambda: librosa.feature.spectral_contrast(S=mag, sr=sr), repeat)
+    stages['compute_features'], _ = time_call(lambda: F.compute_features(y, sr), repeat)
+    stages['extract_single_feature'], features = time_call(
+        lambda: extract_single_feature(io.BytesIO(clip_bytes)), repeat)
+    stages['extract_single_feature_streaming'], _ = time_call(
+        lambda: extract_single_feature(io.BytesIO(clip_bytes), streaming=True), repeat)
+
+    info = {'audio_seconds': len(y) / sr, 'num_bytes': len(clip_bytes)}
+    return stages, info, features
+
+
+def feature_parity(features, reference):
+    """Selisih fitur terhadap referensi: max abs, dan lolos/tidak |a-b| <= atol + rtol*|ref|."""
+    names = sorted(reference)
+    a = np.array([features.get(name, 0.0) for name in names], dtype=np.float64)
+    b = np.array([reference[name] for name in names], dtype=np.float64)
+    diff = np.abs(a - b)
+    worst = int(np.argmax(diff - PARITY_RTOL * np.abs(b)))
+    return {
+        'max_abs_diff': float(diff.max()),
+        'worst_feature': names[worst],
+        'within_tolerance': bool(np.all(diff <= PARITY_ATOL + PARITY_RTOL * np.abs(b))),
+    }
+
+
+def bench_decoders(clip_bytes, repeat):
+    """
+    Waktu decode tiap decoder (celery_worker/decoders.py) + paritas fitur
+    terhadap jalur referensi librosa.load(sr=16000, soxr_hq).
+    """
+    from celery_worker import features as F
+    import librosa
+    from celery_worker.decoders import DECODERS
+
+    y_ref, _ = librosa.load(io.BytesIO(clip_bytes), sr=F.SR, res_type='soxr_hq')
+    reference_features = F.compute_features(y_ref, F.SR)
+
+    results = {}
+    for name, decoder in DECODERS.items():
+        if not decoder.available():
+            results[name] = {'error': 'tidak tersedia'}
+            continue
+        res_types = PARITY_RES_TYPES if name == 'soundfile' else ['soxr_hq']
+        for res_type in res_types:
+            key = f'{name}[{res_type}]'
+            try:
+                stats, y = time_call(lambda: decoder.decode(clip_bytes, F.SR, res_type), repeat)
+            except Exception as e:
+                results[key] = {'error': str(e)[:200]}
+                continue
+            stats.update(feature_parity(F.compute_features(y, F.SR), reference_features))
+            results[key] = stats
+    return results
+
+
+def bench_registry(flask_app, tasks, features, repeat, batch_size):
+    results = {}
+    with flask_app.app_context():
+        for artifact_format in ('npy', 'pickle'):
+            flask_app.config['MODEL_ARTIFACT_FORMAT'] = artifact_format
+
+            def load():
+                registry = tasks.ModelRegistry()
+                registry.load_assets()
+                return registry
+
+            try:
+                results[f'load_assets[{artifact_format}]'], registry = time_call(load, repeat, warmup=0)
+            except Exception as e:
+                results[f'load_assets[{artifact_format}]'] = {'error': str(e)}
+                continue
+
+            for model_name in registry.current().models:
+                key = f'{model_name}[{artifact_format}]'
+                results[f'predict:{key}'], _ = time_call(
+                    lambda: registry.predict(model_name, features), repeat)
+                results[f'predict_batch{batch_size}:{key}'], _ = time_call(
+                    lambda: registry.predict_batch(model_name, [features] * batch_size), repeat)
+
+        flask_app.config['MODEL_ARTIFACT_FORMAT'] = 'auto'
+    return results
+
+
+def bench_end_to_end(flask_app, tasks, s3, clip_name, clip_bytes, repeat):
+    """process_audio_task penuh: DB -> S3 -> fitur -> inferensi -> DB -> cleanup S3."""
+    from app.extensions import db
+    from app.models import AnalysisHistory, User
+
+    with flask_app.app_context():
+        user = User(email=f'bench-{uuid.uuid4().hex[:8]}@detectify.local', password_hash='-')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.user_id
+
+    statuses = []
+
+    def run_once():
+        with flask_app.app_context():
+            file_key = f"audio/{user_id}/{uuid.uuid4()}_{clip_name}"
+            s3.put_object(Bucket=BENCH_BUCKET, Key=file_key, Body=clip_bytes)
+            job = AnalysisHistory(
+                user_id=user_id, status='PENDING', analysis_type='AUDIO',
+                file_name_original=clip_name, file_location=file_key
+            )
+            db.session.add(job)
+            db.session.commit()
+            analysis_id = job.analysis_id
+
+        start = time.perf_counter()
+        tasks.process_audio_task(analysis_id)
+        elapsed = (time.perf_counter() - start) * 1000.0
+
+        with flask_app.app_context():
+            statuses.append(db.session.get(AnalysisHistory, analysis_id).status)
+        return elapsed
+
+    run_once()  # warm-up
+    samples = [run_once() for _ in range(repeat)]
+    return {
+        'min_ms': min(samples),
+        'median_ms': statistics.median(samples),
+        'mean_ms': statistics.fmean(samples),
+        'max_ms': max(samples),
+        'repeat': repeat,
+        'statuses': sorted(set(statuses)),
+    }
+
+
+# =====================================================================
+# 4. LAPORAN
+# =====================================================================
+
+def environment_info():
+    def version(module_name):
+        try:
+            return __import__(module_name).__version__
+        except Exception:
+            return None
+
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except Exception:
+        commit = None
+
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': version('numpy'),
+        'scipy': version('scipy'),
+        'librosa': version('librosa'),
+        'sklearn': version('sklearn'),
+    }
+
+
+def _flatten(report):
+    """{'clips.test.mp3.stft': median_ms, ...} untuk perbandingan dua laporan."""
+    flat = {}
+
+    def walk(prefix, node):
+        if isinstance(node, dict):
+            if 'median_ms' in node:
+                flat[prefix] = node['median_ms']
+                return
+            for key, value in node.items():
+                walk(f'{prefix}.{key}' if prefix else key, value)
+
+    walk('', {'clips': report.get('clips', {}), 'registry': report.get('registry', {})})
+    return flat
+
+
+def compare_reports(old_path, new_path, threshold=0.10):
+    """Cetak rasio median baru/lama. Kembalikan jumlah tahap yang melambat > threshold."""
+    with open(old_path) as f:
+        old = _flatten(json.load(f))
+    with open(new_path) as f:
+        new = _flatten(json.load(f))
+
+    regressions = 0
+    for key in sorted(set(old) & set(new)):
+        ratio = new[key] / old[key] if old[key] else float('inf')
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  <-- REGRESSION'
+            regressions += 1
+        print(f"{key:80s} {old[key]:10.2f} ms -> {new[key]:10.2f} ms  x{ratio:5.2f}{flag}")
+    return regressions
+
+
+def run(args):
+    warnings.simplefilter('ignore')
+    with tempfile.TemporaryDirectory(prefix='detectify-bench-') as workdir:
+        flask_app, tasks, s3 = setup_environment(workdir)
+        clips = build_clips(args.durations, args.codecs, tasks.ASSETS_DIR)
+
+        report = {'environment': environment_info(), 'settings': vars(args).copy(), 'clips': {}}
+        reference_features = None
+        for clip_name, clip_bytes in clips:
+            print(f"[Bench] {clip_name} ({len(clip_bytes) / 1024:.0f} KB)")
+            stages, info, features = bench_feature_stages(clip_bytes, args.repeat)
+            entry = {'info': info, 'stages': stages}
+            entry['decoders'] = bench_decoders(clip_bytes, args.repeat)
+            if not args.skip_e2e:
+                entry['stages']['process_audio_task'] = bench_end_to_end(
+                    flask_app, tasks, s3, clip_name, clip_bytes, args.repeat)
+            report['clips'][clip_name] = entry
+            if reference_features is None:
+                reference_features = features
+
+        print("[Bench] Model registry")
+        report['registry'] = bench_registry(flask_app, tasks, reference_features, args.repeat, args.batch_size)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, default=float)
+    print(f"[Bench] Results written to {args.output}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline pipeline analisis audio Detectify")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--durations', type=lambda s: [float(x) for x in s.split(',')], default=DEFAULT_DURATIONS)
+    parser.add_argument('--codecs', type=lambda s: s.split(','), default=DEFAULT_CODECS)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--skip-e2e', action='store_true', help="Lewati process_audio_task end-to-end")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="Bandingkan dua file hasil")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Batas regresi untuk --compare (rasio)")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        regressions = compare_reports(*args.compare, threshold=args.threshold)
+        sys.exit(1 if regressions else 0)
+    run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+# FILE: celery_worker/artifacts.py
+"""
+Format artefak model tanpa pickle: satu folder berisi array .npy datar
+(di-load dengan mmap, dibagi antar proses lewat page cache) + meta.json.
+
+Ekspor (butuh sklearn, cukup sekali di mesin build):
+    python -m celery_worker.artifacts <model.pkl> <scaler.pkl> <folder_output>
+
+Saat runtime hanya NumPy yang dipakai; sklearn tidak perlu di-import.
+"""
+import json
+import os
+import sys
+import numpy as np
+
+META_FILE = 'meta.json'
+FORMAT_VERSION = 1
+
+# Batas bawah/atas probabilitas Platt scaling di libsvm
+_LIBSVM_MIN_PROB = 1e-7
+
+
+# =====================================================================
+# 1. EKSPOR (sklearn pickle -> .npy)
+# =====================================================================
+
+def _model_arrays(model):
+    """Ambil parameter model sklearn yang didukung sebagai dict array + jenis model."""
+    kind = type(model).__name__
+
+    if kind == 'SVC':
+        if model.kernel != 'rbf' or not model.probability or len(model.classes_) != 2:
+            raise ValueError("Hanya SVC biner RBF dengan probability=True yang didukung")
+        return 'svc_rbf', {
+            'support_vectors': model.support_vectors_,
+            'dual_coef': model.dual_coef_[0],
+            'intercept': model.intercept_,
+            'gamma': np.array([model._gamma]),
+            'prob_a': model.probA_,
+            'prob_b': model.probB_,
+        }
+
+    if kind == 'LogisticRegression':
+        if len(model.classes_) != 2:
+            raise ValueError("Hanya LogisticRegression biner yang didukung")
+        return 'logreg', {
+            'coef': model.coef_[0],
+            'intercept': model.intercept_,
+        }
+
+    if kind == 'GaussianNB':
+        return 'gnb', {
+            'theta': model.theta_,
+            'var': model.var_,
+            'class_prior': model.class_prior_,
+        }
+
+    raise ValueError(f"Tipe model {kind} belum didukung untuk ekspor NumPy")
+
+
+def export_artifact(model, scaler, out_dir):
+    """Tulis model (+ scaler opsional) sklearn ke folder artefak .npy."""
+    os.makedirs(out_dir, exist_ok=True)
+    kind, arrays = _model_arrays(model)
+    arrays['classes'] = np.asarray(model.classes_)
+
+    meta = {'format_version': FORMAT_VERSION, 'kind': kind, 'feature_names': None}
+    if scaler is not None:
+        arrays['scaler_mean'] = scaler.mean_ if scaler.with_mean else np.zeros(scaler.n_features_in_)
+        arrays['scaler_scale'] = scaler.scale_ if scaler.with_std else np.ones(scaler.n_features_in_)
+        if hasattr(scaler, 'feature_names_in_'):
+            meta['feature_names'] = [str(name) for name in scaler.feature_names_in_]
+
+    for name, value in arrays.items():
+        np.save(os.path.join(out_dir, f'{name}.npy'), np.ascontiguousarray(value))
+    with open(os.path.join(out_dir, META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return out_dir
+
+
+def export_from_pickles(model_path, scaler_path, out_dir):
+    import joblib
+    model = joblib.load(model_path)
+    scaler = joblib.load(scaler_path) if scaler_path and os.path.exists(scaler_path) else None
+    return export_artifact(model, scaler, out_dir)
+
+
+# =====================================================================
+# 2. RUNTIME (Kernel inferensi NumPy)
+# =====================================================================
+
+def _libsvm_pairwise_to_proba(r):
+    """
+    multiclass_probability() libsvm untuk k=2, divektorisasi per baris.
+    libsvm versi sklearn memakai iterasi ini (dengan toleransi 0.005/k)
+    juga untuk kasus biner, jadi hasilnya tidak selalu sama dengan r.
+    """
+    k = 2
+    eps = 0.005 / k
+    q00 = (1.0 - r) ** 2
+    q11 = r ** 2
+    q01 = -(1.0 - r) * r
+    p0 = np.full_like(r, 1.0 / k)
+    p1 = np.full_like(r, 1.0 / k)
+    active = np.ones(r.shape, dtype=bool)
+
+    for _ in range(max(100, k)):
+        qp0 = q00 * p0 + q01 * p1
+        qp1 = q01 * p0 + q11 * p1
+        pqp = p0 * qp0 + p1 * qp1
+        max_error = np.maximum(np.abs(qp0 - pqp), np.abs(qp1 - pqp))
+        active &= ~(max_error < eps)
+        if not active.any():
+            break
+
+        # t = 0
+        diff = (-qp0 + pqp) / q00
+        new_p0 = p0 + diff
+        pqp_t = (pqp + diff * (diff * q00 + 2 * qp0)) / (1 + diff) / (1 + diff)
+        qp1_t = (qp1 + diff * q01) / (1 + diff)
+        new_p0 = new_p0 / (1 + diff)
+        new_p1 = p1 / (1 + diff)
+
+        # t = 1
+        diff = (-qp1_t + pqp_t) / q11
+        new_p1 = new_p1 + diff
+        new_p0 = new_p0 / (1 + diff)
+        new_p1 = new_p1 / (1 + diff)
+
+        p0 = np.where(active, new_p0, p0)
+        p1 = np.where(active, new_p1, p1)
+
+    return np.column_stack([p0, p1])
+
+
+class NumpyScaler:
+    """Pengganti StandardScaler: (X - mean_) / scale_."""
+    def __init__(self, mean, scale, feature_names=None):
+        self.mean_ = mean
+        self.scale_ = scale
+        if feature_names:
+            self.feature_names_in_ = np.array(feature_names, dtype=object)
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.mean_) / self.scale_
+
+
+class NumpyModel:
+    """
+    Model biner yang dievaluasi murni dengan NumPy. Output predict_proba
+    sama dengan sklearn (SVC RBF + Platt, LogisticRegression, GaussianNB).
+    """
+    def __init__(self, kind, arrays):
+        self.kind = kind
+        self.arrays = arrays
+        self.classes_ = np.asarray(arrays['classes'])
+        if kind == 'svc_rbf':
+            sv = arrays['support_vectors']
+            self._sv_sq = np.einsum('ij,ij->i', sv, sv)
+
+    def decision_function(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        a = self.arrays
+        if self.kind == 'svc_rbf':
+            sq_dist = np.einsum('ij,ij->i', X, X)[:, None] + self._sv_sq[None, :] - 2.0 * (X @ a['support_vectors'].T)
+            kernel = np.exp(-a['gamma'][0] * np.maximum(sq_dist, 0.0))
+            return kernel @ a['dual_coef'] + a['intercept'][0]
+        if self.kind == 'logreg':
+            return X @ a['coef'] + a['intercept'][0]
+        raise AttributeError(f"decision_function tidak tersedia untuk {self.kind}")
+
+    def predict_proba(self, X):
+        a = self.arrays
+        if self.kind == 'svc_rbf':
+            # Platt scaling libsvm: nilai keputusan libsvm = -decision_function sklearn
+            f_ab = -self.decision_function(X) * a['prob_a'][0] + a['prob_b'][0]
+            prob_first = np.where(
+                f_ab >= 0,
+                np.exp(-np.abs(f_ab)) / (1.0 + np.exp(-np.abs(f_ab))),
+                1.0 / (1.0 + np.exp(-np.abs(f_ab)))
+            )
+            prob_first = np.clip(prob_first, _LIBSVM_MIN_PROB, 1.0 - _LIBSVM_MIN_PROB)
+            return _libsvm_pairwise_to_proba(prob_first)
+
+        if self.kind == 'logreg':
+            prob = 1.0 / (1.0 + np.exp(-self.decision_function(X)))
+            return np.column_stack([1.0 - prob, prob])
+
+        if self.kind == 'gnb':
+            X = np.asarray(X, dtype=np.float64)
+            var = a['var']
+            jll = np.log(a['class_prior'])[None, :] \
+                - 0.5 * np.sum(np.log(2.0 * np.pi * var), axis=1)[None, :] \
+                - 0.5 * (((X[:, None, :] - a['theta'][None, :, :]) ** 2) / var[None, :, :]).sum(axis=2)
+            jll -= jll.max(axis=1, keepdims=True)
+            proba = np.exp(jll)
+            return proba / proba.sum(axis=1, keepdims=True)
+
+        raise ValueError(f"Jenis model tidak dikenal: {self.kind}")
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def has_artifact(artifact_dir):
+    return os.path.exists(os.path.join(artifact_dir, META_FILE))
+
+
+def load_artifact(artifact_dir):
+    """
+    Muat artefak dengan np.load(mmap_mode='r'): halaman array dibaca langsung
+    dari page cache dan dibagi oleh semua proses worker.
+    Mengembalikan (NumpyModel, NumpyScaler atau None).
+    """
+    with open(os.path.join(artifact_dir, META_FILE)) as f:
+        meta = json.load(f)
+    if meta.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Versi format artefak tidak didukung: {meta.get('format_version')}")
+
+    arrays = {}
+    for file_name in os.listdir(artifact_dir):
+        if file_name.endswith('.npy'):
+            arrays[file_name[:-4]] = np.load(os.path.join(artifact_dir, file_name), mmap_mode='r')
+
+    scaler = None
+    if 'scaler_mean' in arrays:
+        scaler = NumpyScaler(arrays.pop('scaler_mean'), arrays.pop('scaler_scale'), meta.get('feature_names'))
+    return NumpyModel(meta['kind'], arrays), scaler
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4:
+        print("Usage: python -m celery_worker.artifacts <model.pkl> <scaler.pkl> <folder_output>")
+        sys.exit(1)
+    print(f"Exported to {export_from_pickles(*sys.argv[1:])}")
@@ -0,0 +1,244 @@
+# FILE: celery_worker/bulk_score.py
+"""
+Scoring massal offline untuk file audio lokal (audit, evaluasi model), tanpa
+API, S3, MySQL maupun broker.
+
+    python -m celery_worker.bulk_score /data/arsip --output hasil/
+    python -m celery_worker.bulk_score manifest.csv --output hasil/ --workers 16
+    python -m celery_worker.bulk_score manifest.jsonl --output hasil/ --format csv
+
+Input: folder (rekursif, ekstensi yang diterima API) atau manifest CSV
+(kolom `path`) / JSONL ({"path": ...}); path relatif terhadap folder manifest.
+
+- Ekstraksi fitur (extract_single_feature) dibagi ke pool proses, satu file per
+  task dan maks 2 x workers file di pool sekaligus, jadi memori tetap.
+- Inferensi di proses utama per batch (--batch-size) dengan satu versi model
+  (ModelRegistry.predict_batch).
+- Setiap batch ditulis sebagai part-NNNNN.parquet / .csv (atomik) berisi path,
+  status, prediksi & semua fitur. Part yang sudah ada = checkpoint: menjalankan
+  ulang perintah yang sama melanjutkan dari file yang belum dinilai dan
+  mencoba lagi file berstatus error (I/O, worker mati). Baris error lama
+  tetap di part sebelumnya; baris di part terbaru per path yang berlaku.
+  --skip-errors: file yang pernah error tidak dicoba lagi.
+"""
+import os
+
+# Satu thread BLAS/OpenMP per proses: paralelisme dari pool proses, bukan
+# dari thread numpy yang saling berebut core (harus sebelum import numpy)
+for _name in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+    os.environ.setdefault(_name, '1')
+
+import argparse
+import glob
+import json
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+
+from app.analysis.services import AnalysisService
+from .celery_app import celery
+from .features import FEATURE_NAMES
+from .tasks import ACTIVE_MODEL, extract_single_feature, ml_registry, _use_streaming
+
+PART_PREFIX = 'part-'
+RESULT_COLUMNS = [
+    'path', 'status', 'error', 'model_version', 'model', 'prediction',
+    'probability_fake', 'confidence_score', 'seconds',
+]
+
+
+# =====================================================================
+# 1. INPUT (folder / manifest CSV / manifest JSONL)
+# =====================================================================
+
+def iter_inputs(source):
+    """Path absolut file audio dari folder atau manifest, urutan tetap."""
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.rsplit('.', 1)[-1].lower() in AnalysisService.ALLOWED_EXTENSIONS:
+                    yield os.path.abspath(os.path.join(root, name))
+        return
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    if source.endswith('.jsonl'):
+        with open(source) as f:
+            paths = (json.loads(line)['path'] for line in f if line.strip())
+            for path in paths:
+                yield os.path.abspath(os.path.join(base_dir, path))
+    elif source.endswith('.csv'):
+        for chunk in pd.read_csv(source, usecols=['path'], chunksize=10000):
+            for path in chunk['path']:
+                yield os.path.abspath(os.path.join(base_dir, path))
+    else:
+        raise ValueError("Input harus folder, manifest .csv atau .jsonl")
+
+
+# =====================================================================
+# 2. CHECKPOINT & OUTPUT (part file per batch)
+# =====================================================================
+
+def _part_files(output_dir, file_format):
+    return sorted(glob.glob(os.path.join(output_dir, f"{PART_PREFIX}*.{file_format}")))
+
+
+def load_checkpoint(output_dir, file_format, include_errors=False):
+    """
+    (path yang sudah selesai, nomor part berikutnya) dari part yang sudah ditulis.
+    Hanya status 'ok' yang dihitung selesai, kecuali include_errors.
+    """
+    parts = _part_files(output_dir, file_format)
+    done = set()
+    for part in parts:
+        if file_format == 'parquet':
+            frame = pd.read_parquet(part, columns=['path', 'status'])
+        else:
+            frame = pd.read_csv(part, usecols=['path', 'status'])
+        if not include_errors:
+            frame = frame[frame['status'] == 'ok']
+        done.update(frame['path'])
+    next_index = int(os.path.basename(parts[-1])[len(PART_PREFIX):].split('.')[0]) + 1 if parts else 0
+    return done, next_index
+
+
+def write_part(output_dir, index, rows, file_format):
+    """Tulis satu batch hasil (file sementara + rename, jadi part selalu utuh)."""
+    frame = pd.DataFrame(rows, columns=RESULT_COLUMNS + FEATURE_NAMES)
+    path = os.path.join(output_dir, f"{PART_PREFIX}{index:05d}.{file_format}")
+    tmp_path = f"{path}.tmp"
+    if file_format == 'parquet':
+        frame.to_parquet(tmp_path, index=False)
+    else:
+        frame.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+# =====================================================================
+# 3. EKSTRAKSI (dijalankan di proses pool)
+# =====================================================================
+
+def _init_pool_worker():
+    # Config Flask (decoder, streaming) tersedia untuk extract_single_feature
+    celery.flask_app.app_context().push()
+
+
+def _extract_file(path):
+    """Ekstrak fitur satu file lokal. Mengembalikan (path, fitur|None, error|None, detik)."""
+    started = time.perf_counter()
+    try:
+        with open(path, 'rb') as f:
+            features = extract_single_feature(f, streaming=_use_streaming(os.path.getsize(path)))
+        error = None if features is not None else "Gagal decode / ekstraksi fitur"
+    except Exception as e:
+        features, error = None, str(e)[:500]
+    return path, features, error, time.perf_counter() - started
+
+
+# =====================================================================
+# 4. SCORING (inferensi per batch di proses utama)
+# =====================================================================
+
+def score_batch(extracted, bundle, model_name):
+    """Baris output untuk satu batch hasil ekstraksi: satu predict_batch untuk semua yang berhasil."""
+    ok = [item for item in extracted if item[1] is not None]
+    predictions = ml_registry.predict_batch(model_name, [item[1] for item in ok], bundle=bundle) if ok else []
+    by_path = {item[0]: prediction for item, prediction in zip(ok, predictions)}
+
+    rows = []
+    for path, features, error, seconds in extracted:
+        row = {'path': path, 'seconds': round(seconds, 3), 'model_version': bundle.version}
+        prediction = by_path.get(path)
+        if prediction is None:
+            row.update(status='error', error=error)
+        else:
+            row.update(
+                status='ok', model=prediction['internal_algo'], prediction=prediction['prediction'],
+                probability_fake=prediction['probability_fake'], confidence_score=prediction['confidence_score'],
+            )
+            row.update((name, features.get(name)) for name in FEATURE_NAMES)
+        rows.append(row)
+    return rows
+
+
+def run(args):
+    if args.format == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            sys.exit("Output parquet butuh pyarrow (pip install pyarrow), atau pakai --format csv")
+
+    os.makedirs(args.output, exist_ok=True)
+    done, part_index = load_checkpoint(args.output, args.format, include_errors=args.skip_errors)
+    pending = [path for path in dict.fromkeys(iter_inputs(args.input)) if path not in done]
+    total = len(pending) + len(done)
+    print(f"[Bulk] {total} file, {len(done)} sudah dinilai (checkpoint), {len(pending)} tersisa")
+    if not pending:
+        return
+
+    with celery.flask_app.app_context():
+        # Satu versi model untuk seluruh run, model_version di output konsisten
+        bundle = ml_registry.current()
+    workers = args.workers or multiprocessing.cpu_count()
+    max_in_flight = workers * 2
+
+    started = time.perf_counter()
+    last_report = started
+    scored = errors = 0
+    buffer = []
+    inputs = iter(pending)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_pool_worker) as pool:
+        in_flight = set()
+        while True:
+            # Isi pool sampai batas in-flight (memori tetap berapa pun jumlah file)
+            for path in inputs:
+                in_flight.add(pool.submit(_extract_file, path))
+                if len(in_flight) >= max_in_flight:
+                    break
+            if not in_flight:
+                break
+
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            buffer.extend(future.result() for future in finished)
+
+            if len(buffer) >= args.batch_size or (not in_flight and buffer):
+                rows = score_batch(buffer, bundle, args.model)
+                write_part(args.output, part_index, rows, args.format)
+                part_index += 1
+                scored += len(rows)
+                errors += sum(1 for row in rows if row['status'] == 'error')
+                buffer = []
+
+            now = time.perf_counter()
+            if now - last_report >= args.progress_seconds or not in_flight:
+                last_report = now
+                rate = scored / max(now - started, 1e-9)
+                remaining = len(pending) - scored
+                eta = remaining / rate if rate > 0 else float('inf')
+                print(f"[Bulk] {len(done) + scored}/{total} ({(len(done) + scored) / total:.1%}) | "
+                      f"{rate:.1f} file/s | ETA {eta / 60:.1f} menit | error {errors}")
+
+    print(f"[Bulk] Selesai: {scored} file dalam {time.perf_counter() - started:.1f}s, "
+          f"{errors} error, output di {args.output}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scoring massal offline file audio lokal")
+    parser.add_argument('input', help="Folder audio atau manifest .csv / .jsonl (kolom path)")
+    parser.add_argument('--output', required=True, help="Folder output (part file + checkpoint)")
+    parser.add_argument('--format', choices=['parquet', 'csv'], default='parquet')
+    parser.add_argument('--workers', type=int, default=0, help="Proses ekstraksi (0 = jumlah core)")
+    parser.add_argument('--batch-size', type=int, default=256, help="File per batch inferensi & per part")
+    parser.add_argument('--model', default=ACTIVE_MODEL)
+    parser.add_argument('--progress-seconds', type=float, default=10)
+    parser.add_argument('--skip-errors', action='store_true',
+                        help="Jangan coba lagi file yang error di run sebelumnya")
+    run(parser.parse_args(argv))
+
+
+if __name__ == '__main__':
+    main()
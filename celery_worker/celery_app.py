@@ -1,4 +1,5 @@
 from celery import Celery
+from celery.signals import worker_init, worker_process_init
 from app import create_app, config
 import os
 
@@ -29,6 +30,30 @@ def create_celery_app(config_name=os.getenv('FLASK_ENV', 'default')):
                 return self.run(*args, **kwargs)
 
     celery_app.Task = ContextTask
+
+    # 5. Jadwal task periodik (jalankan `celery ... beat`, lihat notes.txt).
+    # Nama setting gaya lama, karena config Flask di atas juga memakai gaya lama (CELERY_*)
+    celery_app.conf.CELERYBEAT_SCHEDULE = {
+        's3-cleanup': {
+            'task': 's3_cleanup_task',
+            'schedule': flask_app.config.get('S3_CLEANUP_INTERVAL_SECONDS', 60),
+            'options': {'queue': 'audio_queue'},
+        },
+        'audio-lane-reconcile': {
+            'task': 'audio_lane_reconcile_task',
+            'schedule': flask_app.config.get('AUDIO_LANE_RECONCILE_SECONDS', 60),
+            'options': {'queue': 'audio_queue'},
+        },
+        's3-orphan-sweep': {
+            'task': 's3_orphan_sweep_task',
+            'schedule': flask_app.config.get('S3_ORPHAN_SWEEP_INTERVAL_SECONDS', 3600),
+            'options': {'queue': 'audio_queue'},
+        },
+    }
+
+    # Simpan referensi app Flask untuk task dengan base class khusus
+    # (misal Batches) yang tidak mewarisi ContextTask
+    celery_app.flask_app = flask_app
     
     return celery_app
 
@@ -37,4 +62,28 @@ def create_celery_app(config_name=os.getenv('FLASK_ENV', 'default')):
 celery = create_celery_app()
 
 # PENTING: Temukan dan daftarkan tasks.py
-celery.autodiscover_tasks(['celery_worker'])
\ No newline at end of file
+celery.autodiscover_tasks(['celery_worker'])
+
+# --- Warm-up Worker ---
+# worker_init berjalan di proses induk SEBELUM pool prefork di-fork, sehingga
+# model & cache librosa/numba yang dimuat di sini dibagi ke semua child
+# lewat copy-on-write (tidak ada cold-start di job pertama).
+@worker_init.connect
+def warm_up_on_worker_init(sender=None, **kwargs):
+    from .tasks import warm_up_worker, start_model_watcher, audio_prefetcher
+    audio_prefetcher.enable_for_pool(getattr(sender, 'pool_cls', 'prefork'))
+    with celery.flask_app.app_context():
+        if celery.conf.get('WORKER_WARMUP_ENABLED', True):
+            warm_up_worker()
+        # Hot-swap model: pool prefork memantau manifest di tiap child (thread tidak
+        # ikut ter-fork), pool lain (solo/threads/gevent) di proses ini
+        if 'prefork' not in str(getattr(sender, 'pool_cls', 'prefork')).lower():
+            start_model_watcher()
+
+
+@worker_process_init.connect
+def reset_on_worker_process_init(**kwargs):
+    from .tasks import reset_after_fork, start_model_watcher
+    with celery.flask_app.app_context():
+        reset_after_fork()
+        start_model_watcher()
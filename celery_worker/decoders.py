@@ -0,0 +1,170 @@
+# FILE: celery_worker/decoders.py
+"""
+Lapisan decoder audio: byte file -> sinyal mono float32 pada SR worker.
+
+Decoder dicoba berurutan sesuai AUDIO_DECODERS (default 'soundfile,ffmpeg,librosa');
+yang pertama berhasil dipakai.
+
+- soundfile : libsndfile langsung dari memori (wav/flac/ogg, mp3 untuk libsndfile >= 1.1),
+              lalu resample dengan librosa.resample. Dengan res_type default
+              (soxr_hq) hasilnya identik dengan librosa.load.
+- ffmpeg    : subprocess ffmpeg yang langsung mengeluarkan f32le mono 16 kHz
+              (m4a/aac dan format lain yang tidak dikenal libsndfile).
+              Downmix & resampling dilakukan ffmpeg (soxr jika res_type soxr_*),
+              jadi hasilnya mendekati (bukan identik) jalur librosa.
+- librosa   : librosa.load (soundfile lalu audioread), perilaku lama.
+
+Kualitas resampling diatur lewat AUDIO_RESAMPLE_TYPE (nama res_type librosa:
+soxr_vhq, soxr_hq, soxr_mq, soxr_lq, soxr_qq, polyphase, ...).
+Perbandingan fitur antar decoder: python -m benchmarks.pipeline_bench (bagian 'decoders').
+"""
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+
+import librosa
+import numpy as np
+import soundfile as sf
+from flask import current_app, has_app_context
+
+DEFAULT_DECODERS = 'soundfile,ffmpeg,librosa'
+DEFAULT_RESAMPLE_TYPE = 'soxr_hq'
+FFMPEG_TIMEOUT_SECONDS = 300
+
+# Presisi soxr (bit) di filter aresample ffmpeg untuk tiap res_type librosa
+_FFMPEG_SOXR_PRECISION = {
+    'soxr_vhq': 28,
+    'soxr_hq': 20,
+    'soxr_mq': 16,
+    'soxr_lq': 16,
+}
+
+
+def _setting(name, default):
+    """Config Flask jika ada app context; di proses pool ekstraksi baca dari env."""
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return os.getenv(name, default)
+
+
+def _to_bytes(audio):
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        return bytes(audio)
+    if isinstance(audio, io.BytesIO):
+        return audio.getvalue()
+    audio.seek(0)
+    return audio.read()
+
+
+class SoundfileDecoder:
+    name = 'soundfile'
+
+    def available(self):
+        return True
+
+    def decode(self, data, sr, res_type):
+        y, native_sr = sf.read(io.BytesIO(data), dtype='float32', always_2d=True)
+        # Sama dengan librosa.to_mono: rata-rata antar channel
+        y = librosa.to_mono(y.T) if y.shape[1] > 1 else y[:, 0]
+        if native_sr != sr:
+            y = librosa.resample(y, orig_sr=native_sr, target_sr=sr, res_type=res_type)
+        return y
+
+
+class FfmpegDecoder:
+    name = 'ffmpeg'
+
+    def __init__(self):
+        self._binary = None
+        self._checked = False
+
+    def available(self):
+        if not self._checked:
+            self._binary = shutil.which(_setting('FFMPEG_BINARY', 'ffmpeg'))
+            self._checked = True
+        return self._binary is not None
+
+    @staticmethod
+    def _needs_seekable_input(data):
+        # Container MP4/M4A sering menaruh index (moov) di akhir file: tidak bisa dari pipe
+        return data[4:8] == b'ftyp'
+
+    def _command(self, input_arg, sr, res_type):
+        command = [self._binary, '-nostdin', '-hide_banner', '-loglevel', 'error', '-i', input_arg, '-vn']
+        precision = _FFMPEG_SOXR_PRECISION.get(res_type)
+        if precision is not None:
+            command += ['-af', f'aresample=resampler=soxr:precision={precision}']
+        command += ['-ac', '1', '-ar', str(sr), '-f', 'f32le', 'pipe:1']
+        return command
+
+    def decode(self, data, sr, res_type):
+        if self._needs_seekable_input(data):
+            with tempfile.NamedTemporaryFile(suffix='.m4a') as tmp:
+                tmp.write(data)
+                tmp.flush()
+                result = subprocess.run(
+                    self._command(tmp.name, sr, res_type),
+                    capture_output=True, timeout=FFMPEG_TIMEOUT_SECONDS
+                )
+        else:
+            result = subprocess.run(
+                self._command('pipe:0', sr, res_type),
+                input=data, capture_output=True, timeout=FFMPEG_TIMEOUT_SECONDS
+            )
+
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg gagal: {result.stderr.decode(errors='replace').strip()[:200]}")
+        y = np.frombuffer(result.stdout, dtype='<f4').astype(np.float32)
+        if y.size == 0:
+            raise RuntimeError("ffmpeg tidak menghasilkan sampel audio")
+        return y
+
+
+class LibrosaDecoder:
+    name = 'librosa'
+
+    def available(self):
+        return True
+
+    def decode(self, data, sr, res_type):
+        y, _ = librosa.load(io.BytesIO(data), sr=sr, res_type=res_type)
+        return y
+
+
+DECODERS = {
+    decoder.name: decoder
+    for decoder in (SoundfileDecoder(), FfmpegDecoder(), LibrosaDecoder())
+}
+
+
+def resample_type():
+    """res_type librosa yang dipakai worker (AUDIO_RESAMPLE_TYPE)."""
+    return _setting('AUDIO_RESAMPLE_TYPE', DEFAULT_RESAMPLE_TYPE)
+
+
+def decoder_chain(names=None):
+    names = names or _setting('AUDIO_DECODERS', DEFAULT_DECODERS)
+    if isinstance(names, str):
+        names = [name.strip() for name in names.split(',') if name.strip()]
+    return [DECODERS[name] for name in names if name in DECODERS and DECODERS[name].available()]
+
+
+def decode_audio(audio, sr, decoders=None, res_type=None):
+    """
+    Decode `audio` (bytes atau file-like) menjadi (y, sr) mono float32.
+    Raise error decoder terakhir jika semua decoder gagal.
+    """
+    data = _to_bytes(audio)
+    res_type = res_type or resample_type()
+
+    last_error = None
+    for decoder in decoder_chain(decoders):
+        try:
+            return decoder.decode(data, sr, res_type), sr
+        except Exception as e:
+            last_error = e
+    if last_error is None:
+        raise RuntimeError("Tidak ada decoder audio yang tersedia")
+    raise last_error
@@ -0,0 +1,80 @@
+# FILE: celery_worker/feature_store.py
+import numpy as np
+from sqlalchemy import or_
+from app.extensions import db
+from app.models import AnalysisFeatures, AnalysisHistory
+from .features import FEATURE_NAMES, FEATURE_EXTRACTOR_VERSION
+
+# Vektor disimpan sebagai float32 little-endian (45 fitur = 180 byte per job)
+VECTOR_DTYPE = np.dtype('<f4')
+
+
+def pack_features(features_dict):
+    """Dict fitur -> bytes dengan urutan FEATURE_NAMES (fitur hilang = NaN)."""
+    vector = np.array([features_dict.get(name, np.nan) for name in FEATURE_NAMES], dtype=VECTOR_DTYPE)
+    return vector.tobytes()
+
+
+def unpack_matrix(blobs):
+    """List bytes -> matriks (N, len(FEATURE_NAMES)) float32 dalam satu alokasi."""
+    if not blobs:
+        return np.zeros((0, len(FEATURE_NAMES)), dtype=VECTOR_DTYPE)
+    return np.frombuffer(b''.join(blobs), dtype=VECTOR_DTYPE).reshape(len(blobs), -1)
+
+
+def stage_feature_vector(job, features_dict):
+    """
+    Tambahkan vektor fitur job ke session (ikut commit yang sama dengan hasil job).
+    merge() dipakai agar job yang diproses ulang tidak bentrok primary key.
+    """
+    db.session.merge(AnalysisFeatures(
+        analysis_id=job.analysis_id,
+        audio_hash=job.audio_hash,
+        extractor_version=FEATURE_EXTRACTOR_VERSION,
+        feature_vector=pack_features(features_dict)
+    ))
+
+
+def iter_feature_batches(extractor_version=FEATURE_EXTRACTOR_VERSION, chunk_size=5000):
+    """
+    Iterasi vektor fitur job COMPLETED per chunk (keyset pagination pada analysis_id).
+    Yield: (list analysis_id, list audio_hash, matriks fitur).
+    """
+    last_id = ''
+    while True:
+        rows = db.session.query(
+            AnalysisFeatures.analysis_id,
+            AnalysisFeatures.audio_hash,
+            AnalysisFeatures.feature_vector
+        ).join(AnalysisHistory, AnalysisHistory.analysis_id == AnalysisFeatures.analysis_id)\
+            .filter(AnalysisFeatures.extractor_version == extractor_version)\
+            .filter(AnalysisHistory.status == 'COMPLETED')\
+            .filter(AnalysisFeatures.analysis_id > last_id)\
+            .order_by(AnalysisFeatures.analysis_id)\
+            .limit(chunk_size)\
+            .all()
+        if not rows:
+            return
+
+        analysis_ids = [row[0] for row in rows]
+        yield analysis_ids, [row[1] for row in rows], unpack_matrix([row[2] for row in rows])
+        last_id = analysis_ids[-1]
+
+
+def completed_jobs_for(analysis_ids, audio_hashes):
+    """
+    Job COMPLETED yang memakai vektor ini: job pemilik vektor, ditambah semua job
+    dengan audio_hash yang sama (termasuk yang selesai dari cache hasil, tanpa
+    vektor sendiri). Mengembalikan list (analysis_id, audio_hash, result_summary).
+    """
+    conditions = [AnalysisHistory.analysis_id.in_(analysis_ids)]
+    hashes = [audio_hash for audio_hash in audio_hashes if audio_hash]
+    if hashes:
+        conditions.append(AnalysisHistory.audio_hash.in_(hashes))
+    return db.session.query(
+        AnalysisHistory.analysis_id,
+        AnalysisHistory.audio_hash,
+        AnalysisHistory.result_summary
+    ).filter(AnalysisHistory.status == 'COMPLETED')\
+        .filter(or_(*conditions))\
+        .all()
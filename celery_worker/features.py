@@ -0,0 +1,500 @@
+# FILE: celery_worker/features.py
+import numpy as np
+import librosa
+import scipy.fft
+import soundfile as sf
+import soxr
+
+# =====================================================================
+# 1. KONSTANTA FITUR (Harus sama dengan saat training)
+# =====================================================================
+
+SR = 16000
+N_MFCC = 39          # 13 MFCC dasar + 13 delta + 13 delta-delta
+N_MFCC_BASE = 13
+
+# Naikkan setiap kali output fitur berubah (dipakai sebagai kunci cache hasil)
+FEATURE_EXTRACTOR_VERSION = '1'
+
+# Urutan kanonik fitur (dipakai untuk penyimpanan vektor fitur)
+SPECTRAL_FEATURE_NAMES = [
+    'zcr_mean', 'spectral_centroid_mean', 'spectral_rolloff_mean',
+    'spectral_contrast_mean', 'zcr_std', 'spectral_centroid_std',
+]
+FEATURE_NAMES = [f'mfcc_{i+1}' for i in range(N_MFCC)] + SPECTRAL_FEATURE_NAMES
+
+# Parameter framing default librosa (dipakai semua fitur spektral saat training)
+N_FFT = 2048
+HOP_LENGTH = 512
+
+# Parameter power_to_db default librosa
+TOP_DB = 80.0
+AMIN = 1e-10
+
+# =====================================================================
+# 2. SHARED-STFT FEATURE ENGINE
+# =====================================================================
+
+def compute_magnitude(y):
+    """
+    Hitung satu kali magnitude spectrogram |STFT| dengan parameter yang sama
+    persis seperti yang dipakai librosa.feature.* secara internal.
+    """
+    return np.abs(librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH))
+
+
+def mfcc_from_magnitude(mag, sr=SR):
+    """MFCC (13 x frames) dari magnitude spectrogram yang sudah ada."""
+    mel = librosa.feature.melspectrogram(S=mag ** 2, sr=sr)
+    return librosa.feature.mfcc(S=librosa.power_to_db(mel), n_mfcc=N_MFCC_BASE)
+
+
+def mfcc_stack(mfcc_base):
+    """Gabungkan MFCC dasar dengan delta & delta-delta -> (39 x frames)."""
+    mfcc_delta = librosa.feature.delta(mfcc_base)
+    mfcc_delta2 = librosa.feature.delta(mfcc_delta)
+    return np.concatenate((mfcc_base, mfcc_delta, mfcc_delta2), axis=0)
+
+
+def compute_features(y, sr=SR):
+    """
+    Ekstrak semua fitur dari sinyal yang sudah di-decode.
+
+    STFT hanya dihitung sekali lalu dipakai bersama oleh MFCC, centroid,
+    rolloff dan contrast. ZCR juga dihitung sekali untuk mean & std.
+    Output identik dengan pemanggilan librosa.feature.* satu per satu.
+    """
+    features = {}
+
+    mag = compute_magnitude(y)
+
+    # 1. MFCC + Delta + Delta2 (rata-rata per koefisien)
+    full_mfccs = mfcc_stack(mfcc_from_magnitude(mag, sr))
+    mfcc_means = full_mfccs.mean(axis=1)
+    for i in range(N_MFCC):
+        if i < full_mfccs.shape[0]:
+            features[f'mfcc_{i+1}'] = mfcc_means[i]
+        else:
+            features[f'mfcc_{i+1}'] = 0
+
+    # 2. Fitur Tambahan (Spectral & Temporal) dari buffer yang sama
+    try:
+        zcr = librosa.feature.zero_crossing_rate(y, frame_length=N_FFT, hop_length=HOP_LENGTH)
+        centroid = librosa.feature.spectral_centroid(S=mag, sr=sr)
+
+        features['zcr_mean'] = np.mean(zcr)
+        features['spectral_centroid_mean'] = np.mean(centroid)
+        features['spectral_rolloff_mean'] = np.mean(librosa.feature.spectral_rolloff(S=mag, sr=sr))
+        features['spectral_contrast_mean'] = np.mean(librosa.feature.spectral_contrast(S=mag, sr=sr))
+        features['zcr_std'] = np.std(zcr)
+        features['spectral_centroid_std'] = np.std(centroid)
+    except Exception as e:
+        print(f"[Worker] Warning extracting spectral features: {e}")
+
+    return features
+
+
+# =====================================================================
+# 3. STREAMING FEATURE ENGINE (Memori konstan untuk file panjang)
+# =====================================================================
+#
+# Toleransi terhadap jalur in-memory (compute_features):
+# - ZCR, centroid, rolloff: identik sampai pembulatan float64 (statistik
+#   digabung per blok dengan rumus Welford/Chan).
+# - MFCC, delta & spectral contrast: memakai power_to_db dengan floor top_db
+#   (max global - 80 dB) yang baru diketahui di akhir stream. Nilai di bawah
+#   floor dihitung dari histogram dB (bin 0.25 dB). Galat maksimum per band =
+#   0.25 dB x (porsi frame yang jatuh tepat di bin floor), praktis 0 untuk
+#   audio normal. Selisih lain hanya dari akumulasi float32 vs float64
+#   (< 1e-3 absolut per fitur pada assets/test.mp3).
+# - File lebih pendek dari STREAM_MIN_SECONDS diproses dengan compute_features
+#   (hasil identik), karena bufferingnya tetap kecil.
+
+STREAM_BLOCK_SECONDS = 30
+STREAM_MIN_SECONDS = 60
+
+_DB_MIN = 10.0 * np.log10(AMIN)   # -100 dB, nilai log-mel terkecil
+_DB_BIN_WIDTH = 0.25
+_DB_BINS = 800                    # -100 dB s/d +100 dB
+_EDGE_FRAMES = 13                 # konteks tepi delta-delta (width=9)
+
+
+class RunningStats:
+    """
+    Mean & std populasi (ddof=0) berjalan dengan rumus Welford/Chan.
+    Bisa di-update per blok dan digabung dengan akumulator lain.
+    """
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.size == 0:
+            return
+        block = RunningStats()
+        block.n = values.size
+        block.mean = float(values.mean())
+        block.m2 = float(np.square(values - block.mean).sum())
+        self.merge(block)
+
+    def merge(self, other):
+        if other.n == 0:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+
+    @property
+    def std(self):
+        return float(np.sqrt(self.m2 / self.n)) if self.n else 0.0
+
+
+def stream_audio_blocks(audio_buffer, sr=SR, block_seconds=STREAM_BLOCK_SECONDS, quality='HQ'):
+    """
+    Decode audio per blok (mono float32 pada `sr`) tanpa memuat seluruh file.
+    Resampling memakai soxr (default HQ, sama dengan default librosa.load).
+    """
+    audio_buffer.seek(0)
+    with sf.SoundFile(audio_buffer) as f:
+        native_sr = f.samplerate
+        resampler = None
+        if native_sr != sr:
+            resampler = soxr.ResampleStream(native_sr, sr, 1, dtype='float32', quality=quality)
+
+        blocksize = int(block_seconds * native_sr)
+        for block in f.blocks(blocksize=blocksize, dtype='float32', always_2d=True):
+            mono = block.mean(axis=1)
+            if resampler is not None:
+                mono = resampler.resample_chunk(mono)
+            if mono.size:
+                yield mono
+
+        if resampler is not None:
+            tail = resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+            if tail.size:
+                yield tail
+
+
+class _DbAccumulator:
+    """
+    Jumlah nilai dB per baris + histogram per baris, supaya floor top_db
+    (max global - 80 dB, seperti power_to_db) bisa diterapkan di akhir stream.
+    """
+    def __init__(self, n_rows):
+        self.n_rows = n_rows
+        self.max = -np.inf
+        self._sum = np.zeros(n_rows)
+        self._count = np.zeros(n_rows * _DB_BINS)
+        self._hist_sum = np.zeros(n_rows * _DB_BINS)
+
+    def update(self, db):
+        self._sum += db.sum(axis=1, dtype=np.float64)
+        self.max = max(self.max, float(db.max()))
+
+        bins = np.clip(((db - _DB_MIN) / _DB_BIN_WIDTH).astype(np.int64), 0, _DB_BINS - 1)
+        flat = (bins + np.arange(self.n_rows)[:, None] * _DB_BINS).ravel()
+        self._count += np.bincount(flat, minlength=self.n_rows * _DB_BINS)
+        self._hist_sum += np.bincount(flat, weights=db.ravel(), minlength=self.n_rows * _DB_BINS)
+
+    @property
+    def floor(self):
+        return self.max - TOP_DB
+
+    def clipped_sums(self):
+        """Jumlah per baris dari max(dB, floor)."""
+        floor = self.floor
+        count = self._count.reshape(-1, _DB_BINS)
+        total = self._hist_sum.reshape(-1, _DB_BINS)
+        upper_edges = _DB_MIN + _DB_BIN_WIDTH * np.arange(1, _DB_BINS + 1)
+
+        # Bin yang seluruhnya di bawah floor: semua nilainya naik ke floor
+        below = upper_edges <= floor
+        deficit = (count[:, below] * floor - total[:, below]).sum(axis=1)
+
+        # Bin yang memuat floor: aproksimasi (lihat toleransi di atas)
+        k = int((floor - _DB_MIN) // _DB_BIN_WIDTH)
+        if 0 <= k < _DB_BINS and not below[k]:
+            deficit += np.maximum(0.0, count[:, k] * floor - total[:, k])
+
+        return self._sum + deficit
+
+
+def _contrast_peak_valley(S, sr, n_bands=6, fmin=200.0, quantile=0.02):
+    """
+    Peak & valley per band sebelum konversi dB, mengikuti algoritma
+    librosa.feature.spectral_contrast (parameter default).
+    """
+    freq = librosa.fft_frequencies(sr=sr, n_fft=2 * (S.shape[0] - 1))
+    octa = np.zeros(n_bands + 2)
+    octa[1:] = fmin * (2.0 ** np.arange(0, n_bands + 1))
+
+    valley = np.zeros((n_bands + 1, S.shape[1]))
+    peak = np.zeros_like(valley)
+
+    for k, (f_low, f_high) in enumerate(zip(octa[:-1], octa[1:])):
+        current_band = np.logical_and(freq >= f_low, freq <= f_high)
+        idx = np.flatnonzero(current_band)
+        if k > 0:
+            current_band[idx[0] - 1] = True
+        if k == n_bands:
+            current_band[idx[-1] + 1:] = True
+
+        sub_band = S[current_band, :]
+        if k < n_bands:
+            sub_band = sub_band[:-1, :]
+
+        # Selalu ambil minimal satu bin dari tiap sisi
+        n_pick = int(max(np.rint(quantile * np.sum(current_band)), 1))
+        sortedr = np.sort(sub_band, axis=0)
+        valley[k, :] = np.mean(sortedr[:n_pick, :], axis=0)
+        peak[k, :] = np.mean(sortedr[-n_pick:, :], axis=0)
+
+    return peak, valley
+
+
+class StreamingFeatureExtractor:
+    """
+    Ekstraktor fitur inkremental: push() blok sinyal berurutan, lalu finalize().
+
+    Framing meniru STFT librosa center=True (pad nol n_fft/2 di kedua sisi)
+    dan ZCR center=True (pad 'edge'), sehingga frame yang dihasilkan sama
+    persis dengan jalur in-memory. Memori yang dipakai hanya sebesar satu blok
+    ditambah akumulator berukuran tetap.
+    """
+    def __init__(self, sr=SR):
+        self.sr = sr
+        self.n_samples = 0
+        self.n_frames = 0
+
+        self._warmup = []
+        self._warmup_len = 0
+        self._streaming = False
+        self._pending = None        # sampel ter-pad nol (untuk STFT)
+        self._pending_zcr = None    # sampel ter-pad 'edge' (untuk ZCR)
+        self._last_sample = 0.0
+
+        # Akumulator dB (floor top_db diterapkan saat finalize)
+        self._logmel = None
+        self._peak = None
+        self._valley = None
+        self._head = None
+        self._tail = None
+
+        self.zcr = RunningStats()
+        self.centroid = RunningStats()
+        self.rolloff = RunningStats()
+
+    def push(self, block):
+        block = np.asarray(block, dtype=np.float32)
+        if block.size == 0:
+            return
+        self.n_samples += block.size
+        self._last_sample = block[-1]
+
+        if not self._streaming:
+            # Kumpulkan dulu: file pendek lebih murah & exact via compute_features
+            self._warmup.append(block)
+            self._warmup_len += block.size
+            if self._warmup_len < STREAM_MIN_SECONDS * self.sr:
+                return
+            block = np.concatenate(self._warmup)
+            self._warmup = None
+            self._streaming = True
+            pad = N_FFT // 2
+            self._pending = np.concatenate([np.zeros(pad, dtype=np.float32), block])
+            self._pending_zcr = np.concatenate([np.full(pad, block[0], dtype=np.float32), block])
+        else:
+            self._pending = np.concatenate([self._pending, block])
+            self._pending_zcr = np.concatenate([self._pending_zcr, block])
+
+        self._consume()
+
+    def _consume(self):
+        """Proses semua frame lengkap yang tersedia di buffer pending."""
+        length = self._pending.size
+        if length < N_FFT:
+            return
+        n = 1 + (length - N_FFT) // HOP_LENGTH
+        end = (n - 1) * HOP_LENGTH + N_FFT
+        self._process_frames(self._pending[:end], self._pending_zcr[:end])
+        self._pending = self._pending[n * HOP_LENGTH:]
+        self._pending_zcr = self._pending_zcr[n * HOP_LENGTH:]
+
+    def _process_frames(self, segment, segment_zcr):
+        mag = np.abs(librosa.stft(segment, n_fft=N_FFT, hop_length=HOP_LENGTH, center=False))
+        mel = librosa.feature.melspectrogram(S=mag ** 2, sr=self.sr)
+        log_mel = librosa.power_to_db(mel, top_db=None)
+        peak, valley = _contrast_peak_valley(mag, self.sr)
+
+        if self._logmel is None:
+            self._logmel = _DbAccumulator(log_mel.shape[0])
+            self._peak = _DbAccumulator(peak.shape[0])
+            self._valley = _DbAccumulator(valley.shape[0])
+            self._head = log_mel[:, :0]
+            self._tail = log_mel[:, :0]
+
+        # 1. Log-mel (untuk MFCC) & frame tepi (untuk delta)
+        self._logmel.update(log_mel)
+        if self._head.shape[1] < _EDGE_FRAMES:
+            need = _EDGE_FRAMES - self._head.shape[1]
+            self._head = np.concatenate([self._head, log_mel[:, :need]], axis=1)
+        self._tail = np.concatenate([self._tail, log_mel[:, -_EDGE_FRAMES:]], axis=1)[:, -_EDGE_FRAMES:]
+
+        # 2. Spectral contrast = dB(peak) - dB(valley), floor masing-masing global
+        self._peak.update(librosa.power_to_db(peak, top_db=None))
+        self._valley.update(librosa.power_to_db(valley, top_db=None))
+
+        # 3. Fitur spektral & temporal per frame (digabung via Welford)
+        self.centroid.update(librosa.feature.spectral_centroid(S=mag, sr=self.sr))
+        self.rolloff.update(librosa.feature.spectral_rolloff(S=mag, sr=self.sr))
+        self.zcr.update(librosa.feature.zero_crossing_rate(
+            segment_zcr, frame_length=N_FFT, hop_length=HOP_LENGTH, center=False
+        ))
+
+        self.n_frames += log_mel.shape[1]
+
+    def finalize(self):
+        """Tutup stream dan kembalikan dict fitur (format sama dengan compute_features)."""
+        if not self._streaming:
+            if not self._warmup_len:
+                raise ValueError("Stream audio kosong")
+            return compute_features(np.concatenate(self._warmup), self.sr)
+
+        # Frame terakhir: pad kanan n_fft/2 (nol untuk STFT, 'edge' untuk ZCR)
+        pad = N_FFT // 2
+        self._pending = np.concatenate([self._pending, np.zeros(pad, dtype=np.float32)])
+        self._pending_zcr = np.concatenate([self._pending_zcr, np.full(pad, self._last_sample, dtype=np.float32)])
+        self._consume()
+
+        # 1. MFCC: DCT bersifat linear -> mean(MFCC) = DCT(mean(log-mel))
+        logmel_mean = self._logmel.clipped_sums() / self.n_frames
+        mfcc_mean = scipy.fft.dct(logmel_mean, type=2, norm='ortho')[:N_MFCC_BASE]
+
+        # 2. Delta & delta-delta: jumlahnya hanya bergantung pada frame tepi,
+        #    jadi cukup hitung pada gabungan 13 frame awal + 13 frame akhir
+        edges = np.maximum(np.concatenate([self._head, self._tail], axis=1), self._logmel.floor)
+        edge_mfcc = scipy.fft.dct(edges, axis=0, type=2, norm='ortho')[:N_MFCC_BASE]
+        delta = librosa.feature.delta(edge_mfcc)
+        delta2 = librosa.feature.delta(delta)
+        means = np.concatenate([
+            mfcc_mean,
+            delta.sum(axis=1) / self.n_frames,
+            delta2.sum(axis=1) / self.n_frames,
+        ])
+
+        features = {}
+        for i in range(N_MFCC):
+            features[f'mfcc_{i+1}'] = float(means[i]) if i < means.size else 0
+
+        features['zcr_mean'] = self.zcr.mean
+        features['spectral_centroid_mean'] = self.centroid.mean
+        features['spectral_rolloff_mean'] = self.rolloff.mean
+        contrast_sum = self._peak.clipped_sums().sum() - self._valley.clipped_sums().sum()
+        features['spectral_contrast_mean'] = float(contrast_sum / (self._peak.n_rows * self.n_frames))
+        features['zcr_std'] = self.zcr.std
+        features['spectral_centroid_std'] = self.centroid.std
+        return features
+
+
+def extract_features_streaming(audio_buffer, sr=SR, block_seconds=STREAM_BLOCK_SECONDS, res_type='soxr_hq'):
+    """Decode + ekstraksi fitur per blok dengan memori puncak konstan."""
+    # res_type librosa 'soxr_xx' -> kualitas soxr 'XX'; selain soxr memakai HQ
+    quality = res_type[5:].upper() if res_type.startswith('soxr_') else 'HQ'
+    extractor = StreamingFeatureExtractor(sr)
+    for block in stream_audio_blocks(audio_buffer, sr, block_seconds, quality):
+        extractor.push(block)
+    return extractor.finalize()
+
+
+# =====================================================================
+# 4. PARALLEL FEATURE ENGINE (Satu file panjang dibagi ke banyak core)
+# =====================================================================
+#
+# Sinyal yang sudah di-decode dipotong per rentang frame. Tiap chunk (di
+# proses pool) menghitung STFT, mel power, peak/valley contrast serta
+# centroid/rolloff/ZCR per frame. Semua operasi itu per kolom, jadi chunk
+# cukup diberi potongan sinyal ter-pad beserta overlap n_fft - hop.
+#
+# Operasi yang butuh seluruh file (floor top_db dari max global, DCT, delta
+# dan rata-rata) dijalankan di induk pada hasil gabungan, persis seperti
+# compute_features. Output sama dengan jalur in-memory; selisih hanya dari
+# pembulatan float32 perkalian matriks mel yang lebarnya berbeda (< 1e-6
+# absolut per fitur pada assets/test.mp3 dan rekaman 20 menit).
+
+PARALLEL_CHUNK_SECONDS = 30
+
+
+def frame_partials(segment, segment_zcr, sr=SR):
+    """
+    Hasil per frame untuk satu chunk. `segment` ter-pad nol dan `segment_zcr`
+    ter-pad 'edge' (center=True librosa), keduanya sudah mencakup overlap frame.
+    """
+    mag = np.abs(librosa.stft(segment, n_fft=N_FFT, hop_length=HOP_LENGTH, center=False))
+    peak, valley = _contrast_peak_valley(mag, sr)
+    return {
+        'mel': librosa.feature.melspectrogram(S=mag ** 2, sr=sr),
+        'peak': peak,
+        'valley': valley,
+        'centroid': librosa.feature.spectral_centroid(S=mag, sr=sr),
+        'rolloff': librosa.feature.spectral_rolloff(S=mag, sr=sr),
+        'zcr': librosa.feature.zero_crossing_rate(
+            segment_zcr, frame_length=N_FFT, hop_length=HOP_LENGTH, center=False
+        ),
+    }
+
+
+def split_frames(y, chunk_seconds=PARALLEL_CHUNK_SECONDS, sr=SR):
+    """Potong sinyal menjadi (segment, segment_zcr) per rentang frame, berurutan."""
+    pad = N_FFT // 2
+    n_frames = 1 + (y.size + 2 * pad - N_FFT) // HOP_LENGTH
+    chunk_frames = max(1, int(chunk_seconds * sr) // HOP_LENGTH)
+
+    for start in range(0, n_frames, chunk_frames):
+        stop = min(start + chunk_frames, n_frames)
+        # Rentang di sinyal ter-pad -> indeks di y (pad hanya dibuat di tepi file)
+        begin, end = start * HOP_LENGTH - pad, (stop - 1) * HOP_LENGTH + N_FFT - pad
+        left, right = max(0, -begin), max(0, end - y.size)
+        core = y[max(begin, 0):min(end, y.size)]
+        yield (
+            np.pad(core, (left, right), mode='constant'),
+            np.pad(core, (left, right), mode='edge') if left or right else core,
+        )
+
+
+def merge_partials(partials, sr=SR):
+    """Gabungkan hasil frame_partials (urut) menjadi dict fitur seperti compute_features."""
+    def joined(name):
+        return np.concatenate([part[name] for part in partials], axis=-1)
+
+    features = {}
+
+    # 1. MFCC + Delta + Delta2 dari log-mel gabungan (floor top_db global)
+    full_mfccs = mfcc_stack(librosa.feature.mfcc(S=librosa.power_to_db(joined('mel')), n_mfcc=N_MFCC_BASE))
+    mfcc_means = full_mfccs.mean(axis=1)
+    for i in range(N_MFCC):
+        features[f'mfcc_{i+1}'] = mfcc_means[i] if i < full_mfccs.shape[0] else 0
+
+    # 2. Fitur spektral & temporal
+    zcr = joined('zcr')
+    centroid = joined('centroid')
+    contrast = librosa.power_to_db(joined('peak')) - librosa.power_to_db(joined('valley'))
+    features['zcr_mean'] = np.mean(zcr)
+    features['spectral_centroid_mean'] = np.mean(centroid)
+    features['spectral_rolloff_mean'] = np.mean(joined('rolloff'))
+    features['spectral_contrast_mean'] = np.mean(contrast)
+    features['zcr_std'] = np.std(zcr)
+    features['spectral_centroid_std'] = np.std(centroid)
+    return features
+
+
+def compute_features_parallel(y, executor, sr=SR, chunk_seconds=PARALLEL_CHUNK_SECONDS):
+    """compute_features dengan STFT & fitur per frame dibagi ke `executor` (pool proses/thread)."""
+    futures = [
+        executor.submit(frame_partials, segment, segment_zcr, sr)
+        for segment, segment_zcr in split_frames(y, chunk_seconds, sr)
+    ]
+    return merge_partials([future.result() for future in futures], sr)
@@ -0,0 +1,122 @@
+# FILE: celery_worker/manifest.py
+"""
+Manifest versi model: daftar versi yang bisa dipakai worker + versi aktif.
+Worker memantau file ini dan menukar model tanpa restart (lihat ModelRegistry).
+
+Format (path relatif terhadap folder manifest):
+    {
+      "active": "1.1.0",
+      "previous": "1.0.0",
+      "versions": {
+        "1.0.0": {
+          "models": {
+            "SVM": {"model": "SVM/svm_detektor.pkl", "scaler": "SVM/scaler_svm.pkl", "artifact": "SVM/npy"}
+          }
+        },
+        "1.1.0": {
+          "models": {"SVM": {"artifact": "v1.1.0/SVM/npy"}},
+          "feature_list": "v1.1.0/selected_features.csv",
+          "reference": "v1.1.0/reference.npz"
+        }
+      }
+    }
+
+`reference` (opsional): .npz berisi X (N, n_fitur, urutan kolom training) dan
+prob_fake_<MODEL> hasil model yang sama saat ekspor. Versi baru hanya diaktifkan
+jika outputnya cocok (MODEL_VALIDATION_TOLERANCE).
+
+Ganti versi (file ditulis atomik, worker menukar di poll berikutnya):
+    python -m celery_worker.manifest show
+    python -m celery_worker.manifest activate <versi>
+    python -m celery_worker.manifest rollback
+"""
+import json
+import os
+import sys
+
+DEFAULT_MANIFEST_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'models', 'manifest.json')
+# Versi yang dipakai jika manifest tidak ada (path model lama di tasks.py)
+LEGACY_MODEL_VERSION = '1.0.0'
+
+
+def read_manifest(path):
+    """Baca & validasi manifest. Mengembalikan None jika file tidak ada."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        manifest = json.load(f)
+
+    versions = manifest.get('versions') or {}
+    if manifest.get('active') not in versions:
+        raise ValueError(f"Versi aktif '{manifest.get('active')}' tidak ada di manifest {path}")
+    for version, entry in versions.items():
+        if not entry.get('models'):
+            raise ValueError(f"Versi {version} tidak memiliki model")
+    return manifest
+
+
+def version_spec(manifest, version, base_dir):
+    """Entri satu versi dengan semua path dijadikan absolut."""
+    entry = manifest['versions'][version]
+
+    def resolve(path):
+        return os.path.normpath(os.path.join(base_dir, path)) if path else None
+
+    return {
+        'models': {
+            name: {kind: resolve(paths.get(kind)) for kind in ('model', 'scaler', 'artifact')}
+            for name, paths in entry['models'].items()
+        },
+        'feature_list': resolve(entry.get('feature_list')),
+        'reference': resolve(entry.get('reference')),
+    }
+
+
+def write_manifest(path, manifest):
+    """Tulis atomik (file sementara + rename), worker tidak pernah membaca file setengah jadi."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+        f.write('\n')
+    os.replace(tmp_path, path)
+
+
+def activate(path, version):
+    manifest = read_manifest(path)
+    if manifest is None:
+        raise FileNotFoundError(path)
+    if version not in manifest['versions']:
+        raise ValueError(f"Versi {version} tidak ada di manifest")
+    if manifest['active'] != version:
+        manifest['previous'], manifest['active'] = manifest['active'], version
+        write_manifest(path, manifest)
+    return manifest
+
+
+def rollback(path):
+    manifest = read_manifest(path)
+    if manifest is None:
+        raise FileNotFoundError(path)
+    previous = manifest.get('previous')
+    if not previous:
+        raise ValueError("Tidak ada versi sebelumnya untuk rollback")
+    return activate(path, previous)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if args[:1] == ['activate'] and len(args) in (2, 3):
+        result = activate(args[2] if len(args) == 3 else DEFAULT_MANIFEST_FILE, args[1])
+    elif args[:1] in (['show'], ['rollback']) and len(args) in (1, 2):
+        manifest_path = args[1] if len(args) == 2 else DEFAULT_MANIFEST_FILE
+        result = rollback(manifest_path) if args[0] == 'rollback' else read_manifest(manifest_path)
+    else:
+        print("Usage: python -m celery_worker.manifest show|rollback [manifest.json]")
+        print("       python -m celery_worker.manifest activate <versi> [manifest.json]")
+        sys.exit(1)
+
+    if result is None:
+        print("Manifest tidak ditemukan")
+        sys.exit(1)
+    print(json.dumps({'active': result['active'], 'previous': result.get('previous'),
+                      'versions': sorted(result['versions'])}, indent=2))
@@ -0,0 +1,126 @@
+# FILE: celery_worker/prefetch.py
+"""
+Prefetch audio S3 untuk job berikutnya selama job sekarang masih dihitung.
+
+Celery sudah me-reserve beberapa pesan di depan (prefetch_multiplier). Sebelum
+job aktif mengambil file-nya, prefetcher membaca daftar request yang sudah
+di-reserve, mencari file_location-nya (satu query IN) dan mulai men-download
+di thread pool kecil. Saat giliran job itu tiba, byte audio sudah ada di memori.
+
+Buffer dibatasi jumlah item (AUDIO_PREFETCH_DEPTH) dan total ukuran
+(AUDIO_PREFETCH_MAX_MB, dari kolom file_size). File di atas batas atau yang
+ukurannya tidak diketahui tidak di-prefetch.
+
+Butuh --pool=threads. Hanya di pool ini consumer tetap menerima pesan
+(reserved_requests terisi) selama task berjalan di thread lain:
+- solo: strategy Celery memanggil task_reserved() lalu langsung handle(), dan
+  consumer terblokir selama task berjalan, jadi daftar reserved hanya berisi
+  job yang sedang jalan;
+- prefork: consumer ada di proses induk, child tidak melihat state-nya.
+Pool lain: enable_for_pool() mematikan prefetcher (dipanggil di worker_init).
+
+    celery -A celery_worker.celery_app.celery worker --pool=threads --concurrency=2 -Q audio_queue
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from celery.worker import state as worker_state
+from flask import current_app
+
+from app.models import AnalysisHistory
+
+# Entri yang tidak pernah diambil (misal task di-revoke) dibuang setelah ini
+PREFETCH_TTL_SECONDS = 300
+
+
+class AudioPrefetcher:
+    def __init__(self, task_names):
+        self.task_names = set(task_names)
+        self._pool = None
+        self._entries = OrderedDict()   # file_key -> (future, size_bytes, submitted_at)
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'submitted': 0, 'evicted': 0}
+        # Aktif hanya jika worker memakai pool threads (lihat docstring modul)
+        self.enabled = False
+
+    def enable_for_pool(self, pool_cls):
+        """Aktifkan prefetch hanya untuk --pool=threads; pool lain tidak pernah punya job antre yang terlihat."""
+        self.enabled = 'thread' in str(pool_cls).lower()
+        if not self.enabled:
+            print(f"[Worker] Audio prefetch disabled (pool {pool_cls}, butuh --pool=threads)")
+
+    def _get_pool(self):
+        if self._pool is None:
+            workers = current_app.config.get('AUDIO_PREFETCH_WORKERS', 2)
+            self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='s3-prefetch')
+        return self._pool
+
+    def reset(self):
+        """Dipanggil setelah fork: thread pool induk tidak ikut ke proses anak."""
+        self._pool = None
+        with self._lock:
+            self._entries.clear()
+
+    def _upcoming_ids(self, exclude_id, depth):
+        ids = []
+        for request in list(worker_state.reserved_requests):
+            if request.name not in self.task_names or not request.args:
+                continue
+            analysis_id = request.args[0]
+            if analysis_id != exclude_id and analysis_id not in ids:
+                ids.append(analysis_id)
+            if len(ids) >= depth:
+                break
+        return ids
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        for key in [k for k, (_, _, at) in self._entries.items() if now - at > PREFETCH_TTL_SECONDS]:
+            future, _, _ = self._entries.pop(key)
+            future.cancel()
+            self.stats['evicted'] += 1
+
+    def prefetch_reserved(self, fetch_fn, bucket_name, exclude_id=None):
+        """Mulai download file untuk job yang sudah di-reserve worker (non-blocking)."""
+        depth = current_app.config.get('AUDIO_PREFETCH_DEPTH', 2)
+        if not self.enabled or depth <= 0:
+            return
+        ids = self._upcoming_ids(exclude_id, depth)
+        if not ids:
+            return
+
+        rows = AnalysisHistory.query\
+            .with_entities(AnalysisHistory.file_location, AnalysisHistory.file_size)\
+            .filter(AnalysisHistory.analysis_id.in_(ids), AnalysisHistory.status == 'PENDING')\
+            .all()
+
+        max_bytes = current_app.config.get('AUDIO_PREFETCH_MAX_MB', 64) * 1024 * 1024
+        with self._lock:
+            self._evict_expired()
+            buffered = sum(size for _, size, _ in self._entries.values())
+            for file_key, file_size in rows:
+                if file_key in self._entries or len(self._entries) >= depth:
+                    continue
+                if not file_size or buffered + file_size > max_bytes:
+                    continue
+                future = self._get_pool().submit(fetch_fn, bucket_name, file_key)
+                self._entries[file_key] = (future, file_size, time.monotonic())
+                buffered += file_size
+                self.stats['submitted'] += 1
+
+    def fetch(self, fetch_fn, bucket_name, file_key):
+        """Byte audio dari buffer prefetch jika ada (menunggu jika masih di-download), atau download langsung."""
+        with self._lock:
+            entry = self._entries.pop(file_key, None)
+        if entry is not None:
+            future = entry[0]
+            try:
+                data = future.result()
+                self.stats['hits'] += 1
+                return data
+            except Exception as e:
+                print(f"[Worker] Prefetch failed for {file_key}, retrying directly: {e}")
+        self.stats['misses'] += 1
+        return fetch_fn(bucket_name, file_key)
@@ -0,0 +1,151 @@
+# FILE: celery_worker/sampling.py
+"""
+Analisis tersampel untuk rekaman panjang (latensi terbatas).
+
+Alih-alih memproses seluruh file, worker menilai segmen berdurasi tetap
+(ANALYSIS_SEGMENT_SECONDS) yang tersebar merata di sepanjang file. Tiap segmen
+di-decode langsung dari posisinya (seek soundfile), diekstrak dengan
+compute_features lalu dinilai lewat ModelRegistry. Probabilitas antar segmen
+dirata-rata; analisis berhenti lebih awal jika:
+
+- confidence agregat >= ANALYSIS_EARLY_EXIT_CONFIDENCE (minimal
+  ANALYSIS_MIN_SEGMENTS segmen), atau
+- anggaran waktu per paket (FREE/PREMIUM) habis.
+
+Urutan kunjungan segmen kasar-ke-halus (awal, akhir, tengah, perempatan, ...),
+jadi berapa pun segmen yang sempat dinilai, semuanya tetap tersebar di seluruh
+file. Cakupan yang benar-benar dianalisis dicatat di result_summary['analysis_coverage'].
+"""
+import io
+import math
+import time
+from collections import deque
+
+import librosa
+import soundfile as sf
+
+from .features import SR, compute_features
+
+DEFAULT_SEGMENT_SECONDS = 10.0
+DEFAULT_MIN_SEGMENTS = 3
+DEFAULT_EARLY_EXIT_CONFIDENCE = 0.95
+
+# Anggaran per paket: jumlah segmen maksimum & waktu analisis (detik)
+DEFAULT_BUDGETS = {
+    'FREE': {'max_segments': 12, 'time_budget_seconds': 20.0},
+    'PREMIUM': {'max_segments': 60, 'time_budget_seconds': 120.0},
+}
+
+
+def probe_duration(data):
+    """Durasi audio (detik) dari header, atau None jika format tidak bisa di-seek soundfile."""
+    try:
+        info = sf.info(io.BytesIO(data))
+    except Exception:
+        return None
+    if not info.samplerate or info.frames <= 0:
+        return None
+    return info.frames / info.samplerate
+
+
+def plan_budget(config, plan):
+    """Anggaran analisis tersampel untuk paket user (FREE/PREMIUM) dari config."""
+    plan = getattr(plan, 'value', plan) or 'FREE'
+    defaults = DEFAULT_BUDGETS.get(plan, DEFAULT_BUDGETS['FREE'])
+    return {
+        'max_segments': int(config.get(f'ANALYSIS_MAX_SEGMENTS_{plan}', defaults['max_segments'])),
+        'time_budget_seconds': float(config.get(f'ANALYSIS_TIME_BUDGET_{plan}', defaults['time_budget_seconds'])),
+        'segment_seconds': float(config.get('ANALYSIS_SEGMENT_SECONDS', DEFAULT_SEGMENT_SECONDS)),
+        'min_segments': int(config.get('ANALYSIS_MIN_SEGMENTS', DEFAULT_MIN_SEGMENTS)),
+        'confidence': float(config.get('ANALYSIS_EARLY_EXIT_CONFIDENCE', DEFAULT_EARLY_EXIT_CONFIDENCE)),
+    }
+
+
+def coverage_order(n):
+    """Indeks 0..n-1 urut kasar-ke-halus: 0, n-1, tengah, lalu tengah tiap sub-interval."""
+    if n <= 2:
+        return list(range(n))
+    order = [0, n - 1]
+    intervals = deque([(0, n - 1)])
+    while intervals:
+        lo, hi = intervals.popleft()
+        if hi - lo < 2:
+            continue
+        mid = (lo + hi) // 2
+        order.append(mid)
+        intervals.append((lo, mid))
+        intervals.append((mid, hi))
+    return order
+
+
+def segment_offsets(duration, segment_seconds, max_segments):
+    """Posisi awal (detik) segmen yang tersebar merata, sudah dalam urutan kunjungan."""
+    count = max(1, min(max_segments, math.ceil(duration / segment_seconds)))
+    span = max(duration - segment_seconds, 0.0)
+    starts = [span * i / (count - 1) if count > 1 else 0.0 for i in range(count)]
+    return [starts[i] for i in coverage_order(count)]
+
+
+def read_segment(data, start_seconds, duration_seconds, sr=SR, res_type='soxr_hq'):
+    """Decode satu segmen (seek langsung ke posisinya) -> mono float32 pada `sr`."""
+    with sf.SoundFile(io.BytesIO(data)) as f:
+        native_sr = f.samplerate
+        f.seek(min(int(start_seconds * native_sr), max(f.frames - 1, 0)))
+        y = f.read(int(duration_seconds * native_sr), dtype='float32', always_2d=True)
+    # Downmix & resampling sama seperti SoundfileDecoder (decoders.py)
+    y = librosa.to_mono(y.T) if y.shape[1] > 1 else y[:, 0]
+    if native_sr != sr:
+        y = librosa.resample(y, orig_sr=native_sr, target_sr=sr, res_type=res_type)
+    return y
+
+
+def analyze_segments(data, duration, budget, score_fn, timer, sr=SR, res_type='soxr_hq'):
+    """
+    Nilai segmen satu per satu sampai yakin, anggaran habis, atau semua segmen selesai.
+
+    `score_fn(features_list)` mengembalikan list hasil registry (format predict()).
+    Mengembalikan (hasil segmen terakhir, prob_fake rata-rata, coverage), atau
+    (None, None, coverage) jika tidak ada segmen yang bisa diekstrak.
+    """
+    segment_seconds = budget['segment_seconds']
+    offsets = segment_offsets(duration, segment_seconds, budget['max_segments'])
+    started = time.perf_counter()
+
+    probabilities = []
+    seconds_analyzed = 0.0
+    last_result = None
+    stop_reason = 'completed'
+    for start in offsets:
+        with timer.span('decode'):
+            y = read_segment(data, start, segment_seconds, sr, res_type)
+        if y.size == 0:
+            continue
+        with timer.span('feature_extraction'):
+            features_dict = compute_features(y, sr)
+        with timer.span('inference'):
+            last_result = score_fn([features_dict])[0]
+
+        probabilities.append(last_result['probability_fake'])
+        seconds_analyzed += y.size / sr
+
+        prob_fake = sum(probabilities) / len(probabilities)
+        if len(probabilities) >= budget['min_segments'] and max(prob_fake, 1.0 - prob_fake) >= budget['confidence']:
+            stop_reason = 'confident'
+            break
+        if time.perf_counter() - started >= budget['time_budget_seconds']:
+            stop_reason = 'time_budget'
+            break
+
+    coverage = {
+        'mode': 'sampled',
+        'duration_seconds': round(duration, 2),
+        'seconds_analyzed': round(seconds_analyzed, 2),
+        'coverage_ratio': round(min(seconds_analyzed / duration, 1.0), 4) if duration else 0.0,
+        'segments_analyzed': len(probabilities),
+        'segments_planned': len(offsets),
+        'segment_seconds': segment_seconds,
+        'stop_reason': stop_reason,
+    }
+    if not probabilities:
+        return None, None, coverage
+    return last_result, sum(probabilities) / len(probabilities), coverage
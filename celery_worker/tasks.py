@@ -1,14 +1,35 @@
 import os
+import gc
+import hashlib
+import time
+from datetime import datetime
 import joblib
 import pandas as pd
 import numpy as np
-import librosa
 import io
 import json
+import multiprocessing
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from .celery_app import celery
+from .features import SR, N_MFCC, FEATURE_EXTRACTOR_VERSION, compute_features, extract_features_streaming, compute_features_parallel
 from app.models import AnalysisHistory
 from app.extensions import db, s3_client
-from flask import current_app
+from app.analysis.cache import result_cache
+from app.analysis.events import publish_status
+from app.analysis.cleanup import s3_cleanup
+from app.analysis.scheduler import job_scheduler
+from app.metrics import StageTimer, stage_metrics
+from .feature_store import stage_feature_vector, iter_feature_batches, completed_jobs_for
+from .prefetch import AudioPrefetcher
+from .features import FEATURE_NAMES
+from .artifacts import has_artifact, load_artifact
+from .manifest import DEFAULT_MANIFEST_FILE, LEGACY_MODEL_VERSION, read_manifest, version_spec
+from .decoders import decode_audio, resample_type
+from .sampling import probe_duration, plan_budget, analyze_segments
+from flask import current_app, has_app_context
+from sqlalchemy import update
 
 # =====================================================================
 # 1. KONFIGURASI PATH & KONSTANTA
@@ -18,131 +39,467 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 ASSETS_DIR = os.path.join(BASE_DIR, 'assets')
 MODEL_DIR = os.path.join(ASSETS_DIR, 'models')
 FEATURE_LIST_FILE = os.path.join(ASSETS_DIR, 'selected_features.csv') 
-
-SR = 16000
-N_MFCC = 39 
+WARMUP_AUDIO_FILE = os.path.join(ASSETS_DIR, 'test.mp3')
 
 # Daftar Path Model (Bisa ditambah tanpa merusak logic utama)
 MODELS_PATHS = {
     'SVM': os.path.join(MODEL_DIR, 'SVM', 'svm_detektor.pkl'),
+    'LogReg': os.path.join(MODEL_DIR, 'LogReg', 'logreg_detektor.pkl'),
+    'GNB': os.path.join(MODEL_DIR, 'GNB', 'gnb_detektor.pkl'),
     # 'XGBoost': os.path.join(MODEL_DIR, 'XGBoost', 'xgboost_detektor.pkl'),
     # 'RandomForest': os.path.join(MODEL_DIR, 'RandomForest', 'rf_detektor.pkl'), # Contoh extensi
 }
 
+# Model yang dipakai task produksi
+ACTIVE_MODEL = 'SVM'
+
+# Urutan cascade (MODEL_CASCADE_ENABLED): model murah menilai dulu, model
+# berikutnya hanya dipanggil jika confidence < MODEL_CASCADE_THRESHOLD.
+# Tahap terakhir selalu memutuskan.
+CASCADE_STAGES = ['LogReg', 'SVM']
+
 SCALERS_PATHS = {
     'SVM': os.path.join(MODEL_DIR, 'SVM', 'scaler_svm.pkl'),
+    'LogReg': os.path.join(MODEL_DIR, 'LogReg', 'scaler_logreg.pkl'),
+    'GNB': os.path.join(MODEL_DIR, 'GNB', 'scaler_gnb.pkl'),
 }
 
+# Artefak .npy (tanpa pickle) per model, hasil `python -m celery_worker.artifacts`.
+# Jika ada, dipakai menggantikan pasangan pickle model + scaler di atas.
+ARTIFACT_DIRS = {
+    name: os.path.join(MODEL_DIR, name, 'npy') for name in MODELS_PATHS
+}
+
+# Versi model dibaca dari manifest (MODEL_MANIFEST_PATH, lihat manifest.py).
+# Tanpa manifest, path di atas dipakai sebagai satu versi LEGACY_MODEL_VERSION.
+
 # =====================================================================
 # 2. MODEL REGISTRY (Strategy Pattern Implementation)
 # =====================================================================
 
+class ModelBundle:
+    """Satu versi model yang sudah dimuat. Tidak diubah lagi setelah diaktifkan."""
+    def __init__(self, version):
+        self.version = version
+        self.models = {}
+        self.scalers = {}
+        self.feature_cols = []
+        self.feature_index = {}
+        self.scaler_params = {}
+
+
 class ModelRegistry:
     """
     Kelas tunggal untuk mengelola pemuatan aset ML dan prediksi.
     Menerapkan Lazy Loading agar hemat memori saat idle.
+
+    Hot-swap: setiap versi di manifest dimuat menjadi satu ModelBundle. Prediksi
+    membaca referensi bundle aktif sekali di awal panggilan, jadi penukaran versi
+    tidak pernah memblokir prediksi atau mencampur dua versi dalam satu
+    batch/cascade. Versi baru dimuat, di-warm-up & divalidasi di thread watcher
+    sebelum referensinya ditukar. Versi lama tetap di memori
+    (MODEL_RETAINED_VERSIONS), sehingga rollback tidak perlu memuat ulang.
     """
     def __init__(self):
-        self.models = {}
-        self.scalers = {}
-        self.feature_cols = None
-        self._is_loaded = False
+        self._active = None
+        self._retained = OrderedDict()
+        # Hanya dipakai loader/watcher; jalur prediksi tidak pernah mengambil lock ini
+        self._swap_lock = threading.Lock()
+        self._watcher = None
+        self._watcher_pid = None
+        self._reference_features = None
+        # cascade_stats diperbarui dari banyak thread (--pool=threads)
+        self._stats_lock = threading.Lock()
+        self.cascade_stats = Counter()
 
-    def load_assets(self):
-        """Memuat semua model dan scaler ke memori hanya jika belum dimuat."""
-        if self._is_loaded:
-            return
-        
-        print("[Worker] Loading ML Models into Memory...")
-        try:
-            # 1. Load Feature Columns
-            if os.path.exists(FEATURE_LIST_FILE):
-                self.feature_cols = pd.read_csv(FEATURE_LIST_FILE).drop(columns=['file_name', 'label'], errors='ignore').columns.tolist()
+    @staticmethod
+    def _setting(name, default):
+        if has_app_context():
+            return current_app.config.get(name, default)
+        return type(default)(os.getenv(name, default))
+
+    @staticmethod
+    def _artifact_format():
+        """MODEL_ARTIFACT_FORMAT: 'auto' (npy jika ada), 'npy' (wajib) atau 'pickle'."""
+        if has_app_context():
+            return current_app.config.get('MODEL_ARTIFACT_FORMAT', 'auto')
+        return os.getenv('MODEL_ARTIFACT_FORMAT', 'auto').lower()
+
+    def _manifest_path(self):
+        return self._setting('MODEL_MANIFEST_PATH', '') or DEFAULT_MANIFEST_FILE
+
+    def _target(self):
+        """(versi, spec path) yang seharusnya aktif menurut manifest."""
+        path = self._manifest_path()
+        manifest = read_manifest(path)
+        if manifest is None:
+            return LEGACY_MODEL_VERSION, {
+                'models': {
+                    name: {'model': path, 'scaler': SCALERS_PATHS.get(name), 'artifact': ARTIFACT_DIRS.get(name)}
+                    for name, path in MODELS_PATHS.items()
+                },
+                'feature_list': None,
+                'reference': None,
+            }
+        version = manifest['active']
+        return version, version_spec(manifest, version, os.path.dirname(path))
+
+    def _load_bundle(self, version, spec):
+        """Memuat semua model dan scaler satu versi (belum diaktifkan)."""
+        bundle = ModelBundle(version)
+
+        # 1. Load Feature Columns
+        feature_list_file = spec.get('feature_list') or FEATURE_LIST_FILE
+        if os.path.exists(feature_list_file):
+            bundle.feature_cols = pd.read_csv(feature_list_file).drop(columns=['file_name', 'label'], errors='ignore').columns.tolist()
+        else:
+            print(f"[Worker] Warning: Feature list file not found at {feature_list_file}")
+
+        # 2. Load Models (artefak .npy jika tersedia, selain itu pickle)
+        artifact_format = self._artifact_format()
+        for name, paths in spec['models'].items():
+            artifact_dir, path = paths.get('artifact'), paths.get('model')
+            if artifact_format != 'pickle' and artifact_dir and has_artifact(artifact_dir):
+                model, scaler = load_artifact(artifact_dir)
+                bundle.models[name] = model
+                if scaler is not None:
+                    bundle.scalers[name] = scaler
+                print(f"[Worker] Model {name} ({version}) loaded from NumPy artifact")
+            elif artifact_format == 'npy':
+                print(f"[Worker] Warning: NumPy artifact for {name} not found at {artifact_dir}")
+            elif path and os.path.exists(path):
+                bundle.models[name] = joblib.load(path)
             else:
-                print(f"[Worker] Warning: Feature list file not found at {FEATURE_LIST_FILE}")
-                self.feature_cols = []
+                print(f"[Worker] Warning: Model {name} not found at {path}")
 
-            # 2. Load Models
-            for name, path in MODELS_PATHS.items():
-                if os.path.exists(path):
-                    self.models[name] = joblib.load(path)
-                else:
-                    print(f"[Worker] Warning: Model {name} not found at {path}")
-
-            # 3. Load Scalers
-            for name, path in SCALERS_PATHS.items():
-                if os.path.exists(path):
-                    self.scalers[name] = joblib.load(path)
-            
-            self._is_loaded = True
-            print("[Worker] Assets Loaded Successfully.")
-            
-        except Exception as e:
-            print(f"[Worker] FATAL ERROR loading assets: {e}")
-            raise RuntimeError("Gagal memuat aset Machine Learning")
+        # 3. Load Scalers (yang belum ikut artefak .npy)
+        for name, paths in spec['models'].items():
+            path = paths.get('scaler')
+            if name not in bundle.scalers and path and os.path.exists(path):
+                bundle.scalers[name] = joblib.load(path)
 
-    def predict(self, model_name, features_dict):
+        # 4. Cache urutan kolom & parameter scaler untuk jalur NumPy
+        if not bundle.feature_cols:
+            # Fallback: scaler sklearn menyimpan urutan kolom saat training
+            for scaler in bundle.scalers.values():
+                if hasattr(scaler, 'feature_names_in_'):
+                    bundle.feature_cols = list(scaler.feature_names_in_)
+                    break
+        bundle.feature_index = {col: i for i, col in enumerate(bundle.feature_cols)}
+
+        for name, scaler in bundle.scalers.items():
+            if hasattr(scaler, 'mean_') and hasattr(scaler, 'scale_'):
+                # StandardScaler: (X - mean) / scale, tanpa overhead validasi sklearn
+                bundle.scaler_params[name] = (scaler.mean_, scaler.scale_)
+        return bundle
+
+    def _activate(self, bundle):
+        # Penukaran referensi atomik: panggilan prediksi berikutnya memakai bundle ini
+        self._active = bundle
+        self._retained[bundle.version] = bundle
+        self._retained.move_to_end(bundle.version)
+        keep = max(int(self._setting('MODEL_RETAINED_VERSIONS', 2)), 1)
+        while len(self._retained) > keep:
+            self._retained.popitem(last=False)
+
+        if has_app_context():
+            # API berhenti menyajikan cache hasil versi lama
+            result_cache.publish_version(result_cache.pipeline_version(FEATURE_EXTRACTOR_VERSION, bundle.version))
+
+    def _reference_batch(self, bundle):
+        """Batch referensi default: fitur test.mp3 (dihitung sekali per proses)."""
+        if self._reference_features is None and os.path.exists(WARMUP_AUDIO_FILE):
+            with open(WARMUP_AUDIO_FILE, 'rb') as f:
+                self._reference_features = extract_single_feature(io.BytesIO(f.read()))
+        if self._reference_features is None:
+            return np.zeros((1, len(bundle.feature_cols)), dtype=np.float64)
+        return self.vectorize([self._reference_features], bundle)
+
+    def _validate(self, bundle, reference_path):
         """
-        Melakukan prediksi menggunakan model spesifik.
-        Otomatis menangani scaling dan formatting output.
+        Warm-up + validasi versi baru sebelum ditukar: setiap model harus memberi
+        probabilitas valid pada batch referensi dan, jika manifest menyertakan
+        reference .npz, cocok dengan prob_fake_<MODEL> saat ekspor.
         """
-        # Pastikan aset termuat
-        if not self._is_loaded:
+        if not bundle.models:
+            raise ValueError(f"Versi {bundle.version} tidak memiliki model yang termuat")
+
+        expected = {}
+        if reference_path:
+            with np.load(reference_path) as reference:
+                X = reference['X']
+                expected = {
+                    key[len('prob_fake_'):]: reference[key]
+                    for key in reference.files if key.startswith('prob_fake_')
+                }
+        else:
+            X = self._reference_batch(bundle)
+
+        tolerance = float(self._setting('MODEL_VALIDATION_TOLERANCE', 1e-3))
+        for name in bundle.models:
+            prob_fake = np.array([r['probability_fake'] for r in self.predict_batch(name, X, bundle=bundle)])
+            if not np.all(np.isfinite(prob_fake)) or prob_fake.min() < 0 or prob_fake.max() > 1:
+                raise ValueError(f"Model {name} versi {bundle.version} menghasilkan probabilitas tidak valid")
+            if name in expected:
+                diff = float(np.max(np.abs(prob_fake - expected[name])))
+                if diff > tolerance:
+                    raise ValueError(f"Model {name} versi {bundle.version} tidak cocok dengan batch referensi (selisih {diff:.4f})")
+
+    # --- Pemuatan & hot-swap ---
+
+    def load_assets(self):
+        """Memuat versi aktif di manifest ke memori hanya jika belum dimuat."""
+        if self._active is not None:
+            return
+
+        with self._swap_lock:
+            if self._active is not None:
+                return
+            print("[Worker] Loading ML Models into Memory...")
+            try:
+                version, spec = self._target()
+                self._activate(self._load_bundle(version, spec))
+                print(f"[Worker] Assets Loaded Successfully (model version {version}).")
+            except Exception as e:
+                print(f"[Worker] FATAL ERROR loading assets: {e}")
+                raise RuntimeError("Gagal memuat aset Machine Learning")
+
+    def current(self):
+        """Bundle versi aktif. Ambil sekali per panggilan prediksi, lalu pakai terus."""
+        bundle = self._active
+        if bundle is None:
             self.load_assets()
+            bundle = self._active
+        return bundle
+
+    def refresh(self):
+        """
+        Samakan versi aktif dengan manifest. Versi yang belum di memori dimuat &
+        divalidasi dulu; selama itu prediksi tetap memakai versi lama.
+        Mengembalikan versi yang aktif.
+        """
+        with self._swap_lock:
+            version, spec = self._target()
+            previous = self._active
+            if previous is not None and previous.version == version:
+                return version
+
+            bundle = self._retained.get(version)
+            if bundle is None:
+                started = time.perf_counter()
+                bundle = self._load_bundle(version, spec)
+                self._validate(bundle, spec.get('reference'))
+                print(f"[Worker] Model version {version} loaded & validated in {time.perf_counter() - started:.2f}s")
+
+            self._activate(bundle)
+            print(f"[Worker] Model swapped: {previous.version if previous else None} -> {version}")
+            return version
 
-        # Fallback: Jika model yang diminta tidak ada, pakai yang tersedia pertama
-        if model_name not in self.models:
-            if not self.models:
+    def start_watcher(self, app):
+        """Thread latar yang memantau manifest (per proses yang melayani job)."""
+        interval = app.config.get('MODEL_MANIFEST_POLL_SECONDS', 10)
+        if interval <= 0 or (self._watcher is not None and self._watcher_pid == os.getpid()):
+            return
+
+        def watch():
+            last_mtime = None
+            while True:
+                with app.app_context():
+                    path = self._manifest_path()
+                    mtime = os.path.getmtime(path) if os.path.exists(path) else None
+                    if mtime != last_mtime:
+                        last_mtime = mtime
+                        try:
+                            self.refresh()
+                        except Exception as e:
+                            # Versi lama tetap melayani; dicoba lagi saat manifest berubah
+                            active = self._active.version if self._active else None
+                            print(f"[Worker] Model swap failed, keeping version {active}: {e}")
+                time.sleep(interval)
+
+        self._watcher = threading.Thread(target=watch, name='model-manifest-watcher', daemon=True)
+        self._watcher_pid = os.getpid()
+        self._watcher.start()
+
+    # --- Prediksi ---
+
+    @staticmethod
+    def _resolve_model_name(bundle, model_name):
+        """Fallback: Jika model yang diminta tidak ada, pakai yang tersedia pertama."""
+        if model_name not in bundle.models:
+            if not bundle.models:
                 raise RuntimeError("Tidak ada model ML yang tersedia di registry.")
-            model_name = list(self.models.keys())[0]
+            model_name = list(bundle.models.keys())[0]
+        return model_name
 
-        model = self.models[model_name]
-        
-        # Persiapan DataFrame
-        df_input = pd.DataFrame([features_dict])
-        
-        # Safety: Pastikan kolom fitur lengkap (isi 0 jika hilang)
-        if self.feature_cols:
-            for col in self.feature_cols:
-                if col not in df_input.columns:
-                    df_input[col] = 0
-            # Reorder kolom sesuai training
-            X = df_input[self.feature_cols]
-        else:
-            X = df_input # Fallback jika feature list gagal load
+    def vectorize(self, features_list, bundle=None):
+        """
+        Ubah list dict fitur menjadi matriks (N, n_features) sesuai urutan training.
+        Kolom yang hilang diisi 0.
+
+        Posisi kolom diambil dari bundle.feature_index dan di-cache per susunan
+        key dict (biasanya satu untuk seluruh batch), sehingga tiap baris diisi
+        dengan satu assignment numpy, bukan lookup per kolom.
+        """
+        bundle = bundle or self.current()
+        index = bundle.feature_index or {col: i for i, col in enumerate(features_list[0])}
+        X = np.zeros((len(features_list), len(index)), dtype=np.float64)
+        positions = {}
+        for i, features_dict in enumerate(features_list):
+            keys = tuple(features_dict)
+            if keys not in positions:
+                pairs = [(k, index[key]) for k, key in enumerate(keys) if key in index]
+                positions[keys] = (
+                    np.array([k for k, _ in pairs], dtype=np.intp),
+                    np.array([j for _, j in pairs], dtype=np.intp),
+                )
+            source, target = positions[keys]
+            values = np.fromiter(features_dict.values(), dtype=np.float64, count=len(keys))
+            X[i, target] = values[source]
+        return X
+
+    def align_matrix(self, X, column_names, bundle=None):
+        """
+        Susun ulang matriks fitur berurutan `column_names` ke urutan kolom training.
+        Kolom yang hilang atau bernilai NaN diisi 0 (sama seperti vectorize).
+        """
+        bundle = bundle or self.current()
+        if not bundle.feature_cols:
+            return np.nan_to_num(np.asarray(X, dtype=np.float64), nan=0.0)
+
+        source_index = {name: i for i, name in enumerate(column_names)}
+        aligned = np.zeros((X.shape[0], len(bundle.feature_cols)), dtype=np.float64)
+        for j, col in enumerate(bundle.feature_cols):
+            i = source_index.get(col)
+            if i is not None:
+                aligned[:, j] = X[:, i]
+        return np.nan_to_num(aligned, nan=0.0)
+
+    @staticmethod
+    def _scale(bundle, model_name, X):
+        if model_name in bundle.scaler_params:
+            mean, scale = bundle.scaler_params[model_name]
+            if mean is not None:
+                X = X - mean
+            if scale is not None:
+                X = X / scale
+            return X
+        if model_name in bundle.scalers:
+            return bundle.scalers[model_name].transform(X)
+        return X
+
+    @staticmethod
+    def _format_result(model_name, label, prob_fake, prob_real, version=LEGACY_MODEL_VERSION):
+        display_name = "Detectify_Audio_v1"
+        return {
+            "model_used": display_name,       # Frontend melihat ini (Konsisten)
+            "model_version": version,         # Versi bundle yang benar-benar menilai
+            "internal_algo": model_name,      # Opsional: Untuk debug developer saja (bisa dihapus kalau mau rahasia total)
+            "prediction": 'FAKE' if label == 1 else 'REAL',
+            "probability_fake": prob_fake,
+            "probability_real": prob_real,
+            "confidence_score": float(max(prob_fake, prob_real))
+        }
+
+    def predict_batch(self, model_name, features, bundle=None):
+        """
+        Prediksi banyak sampel sekaligus.
+
+        `features` boleh berupa array float (N, n_features) dengan urutan kolom
+        training, atau list dict fitur. Scaling dilakukan sekali untuk seluruh
+        batch dan label diturunkan dari hasil predict_proba (satu kali jalan).
+        Mengembalikan list dict hasil dengan format yang sama seperti predict().
+        """
+        # Pastikan aset termuat; satu versi untuk seluruh batch
+        bundle = bundle or self.current()
 
-        # Scaling
-        if model_name in self.scalers:
-            X = self.scalers[model_name].transform(X)
+        model_name = self._resolve_model_name(bundle, model_name)
+        model = bundle.models[model_name]
+
+        if isinstance(features, np.ndarray):
+            X = np.atleast_2d(features).astype(np.float64, copy=False)
         else:
-            X = X.values
+            X = self.vectorize(list(features), bundle)
+
+        if X.shape[0] == 0:
+            return []
+
+        # Scaling (satu kali untuk seluruh batch)
+        X = self._scale(bundle, model_name, X)
 
         # Inference
         try:
-            prediction = model.predict(X)[0]
             # Cek apakah model support probabilitas
             if hasattr(model, "predict_proba"):
-                proba = model.predict_proba(X)[0]
-                prob_fake = float(proba[1])
-                prob_real = float(proba[0])
+                proba = model.predict_proba(X)
+                labels = model.classes_[np.argmax(proba, axis=1)]
+                prob_fake = proba[:, 1]
+                prob_real = proba[:, 0]
             else:
                 # Fallback untuk model tanpa proba (misal SVM linear tertentu)
-                prob_fake = 1.0 if prediction == 1 else 0.0
+                labels = model.predict(X)
+                prob_fake = (labels == 1).astype(np.float64)
                 prob_real = 1.0 - prob_fake
 
-            display_name = "Detectify_Audio_v1"
-            return {
-                "model_used": display_name,       # Frontend melihat ini (Konsisten)
-                "model_version": "1.0.0",         # Versioning
-                "internal_algo": model_name,      # Opsional: Untuk debug developer saja (bisa dihapus kalau mau rahasia total)
-                "prediction": 'FAKE' if prediction == 1 else 'REAL',
-                "probability_fake": prob_fake,
-                "probability_real": prob_real,
-                "confidence_score": float(max(prob_fake, prob_real))
-            }
+            return [
+                self._format_result(model_name, labels[i], float(prob_fake[i]), float(prob_real[i]), bundle.version)
+                for i in range(X.shape[0])
+            ]
         except Exception as e:
             raise RuntimeError(f"Error saat inferensi model {model_name}: {e}")
 
+    def predict(self, model_name, features_dict):
+        """
+        Melakukan prediksi menggunakan model spesifik.
+        Otomatis menangani scaling dan formatting output.
+        """
+        return self.predict_batch(model_name, [features_dict])[0]
+
+    def predict_cascade_batch(self, stages, features, threshold):
+        """
+        Prediksi bertingkat: setiap tahap hanya menilai sampel yang belum
+        diputuskan tahap sebelumnya (confidence < threshold). Tahap terakhir
+        yang tersedia selalu memutuskan. Tahap yang memutuskan dicatat di
+        hasil ('cascade_stage') dan di self.cascade_stats.
+        """
+        bundle = self.current()
+
+        available = [name for name in stages if name in bundle.models]
+        if not available:
+            return self.predict_batch(stages[-1] if stages else None, features, bundle=bundle)
+
+        if isinstance(features, np.ndarray):
+            X = np.atleast_2d(features).astype(np.float64, copy=False)
+        else:
+            X = self.vectorize(list(features), bundle)
+
+        results = [None] * X.shape[0]
+        remaining = np.arange(X.shape[0])
+        for stage_index, model_name in enumerate(available):
+            is_last = stage_index == len(available) - 1
+            stage_results = self.predict_batch(model_name, X[remaining], bundle=bundle)
+
+            undecided = []
+            for row, result in zip(remaining, stage_results):
+                if is_last or result['confidence_score'] >= threshold:
+                    result['cascade_stage'] = stage_index
+                    results[row] = result
+                else:
+                    undecided.append(row)
+            decided = len(stage_results) - len(undecided)
+            if decided:
+                with self._stats_lock:
+                    self.cascade_stats[model_name] += decided
+
+            remaining = np.asarray(undecided, dtype=np.int64)
+            if remaining.size == 0:
+                break
+
+        return results
+
+    def predict_cascade(self, stages, features_dict, threshold):
+        return self.predict_cascade_batch(stages, [features_dict], threshold)[0]
+
 # Inisialisasi Global Registry
 ml_registry = ModelRegistry()
 
@@ -150,101 +507,248 @@ ml_registry = ModelRegistry()
 # 3. FUNGSI EKSTRAKSI FITUR (Librosa Helper)
 # =====================================================================
 
-def extract_single_feature(audio_buffer):
+_parallel_pool = None
+
+
+def _get_parallel_pool():
+    """
+    Pool untuk membagi SATU file panjang ke banyak core (AUDIO_PARALLEL_WORKERS).
+    Seperti pool micro-batching: thread di child prefork (daemon), proses di luar itu.
+    """
+    global _parallel_pool
+    if _parallel_pool is None:
+        workers = current_app.config.get('AUDIO_PARALLEL_WORKERS') or os.cpu_count() or 1
+        if multiprocessing.current_process().daemon:
+            _parallel_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='feature-chunk')
+        else:
+            _parallel_pool = ProcessPoolExecutor(max_workers=workers)
+    return _parallel_pool
+
+
+def _use_parallel(job):
+    """Ekstraksi paralel intra-job untuk paket di AUDIO_PARALLEL_PLANS (default PREMIUM)."""
+    plans = current_app.config.get('AUDIO_PARALLEL_PLANS', 'PREMIUM')
+    plans = {plan.strip().upper() for plan in plans.split(',') if plan.strip()}
+    plan = job.user.plan if job.user else None
+    return getattr(plan, 'value', plan) in plans
+
+
+def extract_single_feature(audio_buffer, streaming=False, timer=None, parallel=False):
     """
     Ekstrak fitur MFCC dan statistik spektral dari buffer audio.
+    Jika `streaming=True`, audio di-decode per blok dengan memori konstan
+    (untuk rekaman panjang, lihat toleransi di features.py).
+    Jika `parallel=True` dan audio >= AUDIO_PARALLEL_MIN_SECONDS, fitur per
+    frame dihitung per chunk di pool multi-core lalu digabung (hasil setara).
+    `timer` (StageTimer, opsional) mencatat span 'decode' & 'feature_extraction';
+    pada mode streaming keduanya menyatu di 'feature_extraction'.
     """
+    timer = timer or StageTimer('worker')
+    res_type = resample_type()
+
+    if streaming:
+        try:
+            with timer.span('feature_extraction'):
+                return extract_features_streaming(audio_buffer, res_type=res_type)
+        except Exception as e:
+            # Misal format yang tidak bisa dibaca soundfile per blok (m4a)
+            print(f"[Worker] Streaming extraction unavailable, falling back to in-memory: {e}")
+
     try:
-        audio_buffer.seek(0)
-        y, sr = librosa.load(audio_buffer, sr=SR)
+        # Decoder berurutan sesuai AUDIO_DECODERS (lihat decoders.py)
+        with timer.span('decode'):
+            y, sr = decode_audio(audio_buffer, SR, res_type=res_type)
     except Exception as e:
         print(f"[Worker] Error decoding audio: {e}")
         return None
 
-    features = {}
-    
-    # 1. MFCC Extraction
-    mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13) 
-    mfcc_base = mfccs[:13, :]
-    mfcc_delta = librosa.feature.delta(mfcc_base)
-    mfcc_delta2 = librosa.feature.delta(mfcc_delta)
-    full_mfccs = np.concatenate((mfcc_base, mfcc_delta, mfcc_delta2), axis=0) 
-    
-    # Rata-rata setiap koefisien MFCC
-    for i in range(N_MFCC):
-        if i < full_mfccs.shape[0]:
-            features[f'mfcc_{i+1}'] = np.mean(full_mfccs[i])
-        else:
-             features[f'mfcc_{i+1}'] = 0
+    # Semua fitur diturunkan dari satu STFT bersama (lihat features.py)
+    with timer.span('feature_extraction'):
+        if parallel and y.size >= current_app.config.get('AUDIO_PARALLEL_MIN_SECONDS', 120) * sr:
+            chunk_seconds = current_app.config.get('AUDIO_PARALLEL_CHUNK_SECONDS', 30)
+            return compute_features_parallel(y, _get_parallel_pool(), sr, chunk_seconds)
+        return compute_features(y, sr)
+
+
+def _fetch_audio_bytes(bucket_name, file_key):
+    s3_response = s3_client.get_object(Bucket=bucket_name, Key=file_key)
+    return s3_response['Body'].read()
+
+
+# Download audio untuk job yang sudah di-reserve worker (lihat prefetch.py)
+audio_prefetcher = AudioPrefetcher(['process_audio_task'])
 
-    # 2. Fitur Tambahan (Spectral & Temporal)
+
+def _use_streaming(num_bytes):
+    """File di atas AUDIO_STREAMING_MIN_MB diekstrak dengan mode streaming."""
+    threshold_mb = current_app.config.get('AUDIO_STREAMING_MIN_MB', 20)
+    return threshold_mb >= 0 and num_bytes >= threshold_mb * 1024 * 1024
+
+
+def _run_inference(features_list):
+    """Inferensi produksi: model tunggal, atau cascade jika MODEL_CASCADE_ENABLED."""
+    if current_app.config.get('MODEL_CASCADE_ENABLED'):
+        threshold = current_app.config.get('MODEL_CASCADE_THRESHOLD', 0.9)
+        return ml_registry.predict_cascade_batch(CASCADE_STAGES, features_list, threshold)
+    return ml_registry.predict_batch(ACTIVE_MODEL, features_list)
+
+
+def _sampling_duration(audio_data_bytes):
+    """
+    Durasi audio (detik) jika job ini memakai analisis tersampel
+    (SAMPLED_ANALYSIS_ENABLED dan durasi >= SAMPLED_ANALYSIS_MIN_SECONDS), selain itu None.
+    """
+    if not current_app.config.get('SAMPLED_ANALYSIS_ENABLED'):
+        return None
+    duration = probe_duration(audio_data_bytes)
+    if duration is None or duration < current_app.config.get('SAMPLED_ANALYSIS_MIN_SECONDS', 300):
+        return None
+    return duration
+
+
+def _run_sampled_analysis(job, audio_data_bytes, duration, timer):
+    """Nilai segmen tersampel dengan anggaran paket pemilik job, lalu gabungkan hasilnya."""
+    budget = plan_budget(current_app.config, job.user.plan if job.user else None)
+    last_result, prob_fake, coverage = analyze_segments(
+        audio_data_bytes, duration, budget, _run_inference, timer, SR, resample_type()
+    )
+    if last_result is None:
+        raise ValueError("Gagal mengekstrak fitur audio (File corrupt atau format tidak didukung librosa)")
+
+    label = 1 if prob_fake > 0.5 else 0
+    result_data = ModelRegistry._format_result(
+        last_result['internal_algo'], label, prob_fake, 1.0 - prob_fake, last_result['model_version']
+    )
+    result_data['analysis_coverage'] = coverage
+    return result_data
+
+
+def _with_timing(result_data, timer):
+    """Salin hasil + rincian waktu per tahap jika RESULT_TIMING_BREAKDOWN aktif."""
+    if not current_app.config.get('RESULT_TIMING_BREAKDOWN'):
+        return result_data
+    return dict(result_data, timing_ms=timer.breakdown_ms())
+
+
+def _record_lane_latency(job, lane, stage):
+    """
+    Histogram latensi per lane (komponen 'lane_<plan>' di /metrics) untuk SLO per paket:
+    'queue_wait' = upload -> mulai diproses, 'end_to_end' = upload -> selesai.
+    """
+    if not lane or job.created_at is None:
+        return
+    seconds = max((datetime.utcnow() - job.created_at).total_seconds(), 0.0)
+    stage_metrics.observe(f'lane_{lane}', {stage: seconds})
+    slo = job_scheduler.slo_seconds(lane)
+    if stage == 'end_to_end' and slo and seconds > slo:
+        print(f"[Worker] SLO breach ({lane}): job {job.analysis_id} took {seconds:.1f}s > {slo:.0f}s")
+
+
+def _store_result_cache(audio_hash, result_data):
+    """Simpan hasil ke cache konten agar upload ulang audio identik langsung selesai."""
     try:
-        features['zcr_mean'] = np.mean(librosa.feature.zero_crossing_rate(y))
-        features['spectral_centroid_mean'] = np.mean(librosa.feature.spectral_centroid(y=y, sr=sr))
-        features['spectral_rolloff_mean'] = np.mean(librosa.feature.spectral_rolloff(y=y, sr=sr))
-        features['spectral_contrast_mean'] = np.mean(librosa.feature.spectral_contrast(y=y, sr=sr))
-        features['zcr_std'] = np.std(librosa.feature.zero_crossing_rate(y))
-        features['spectral_centroid_std'] = np.std(librosa.feature.spectral_centroid(y=y, sr=sr))
+        version = result_cache.pipeline_version(FEATURE_EXTRACTOR_VERSION, result_data['model_version'])
+        result_cache.set(audio_hash, version, result_data)
     except Exception as e:
-        print(f"[Worker] Warning extracting spectral features: {e}")
-
-    return features
+        print(f"[Worker] Warning result cache: {e}")
 
 # =====================================================================
 # 4. CELERY TASKS (Business Logic Execution)
 # =====================================================================
 
 @celery.task(name='process_audio_task')
-def process_audio_task(analysis_id):
+def process_audio_task(analysis_id, lane=None):
     """
     Worker utama. Menerima ID, mengambil data, memproses via Registry, simpan hasil.
+    `lane` diisi jika job dikirim lewat lane prioritas (AUDIO_PRIORITY_LANES).
     """
+    timer = StageTimer('worker')
+    try:
+        _process_audio_job(analysis_id, timer, lane)
+    finally:
+        timer.flush()
+        # Slot lane kosong: job berikutnya (giliran user lain) dikirim
+        job_scheduler.release(lane, analysis_id)
+
+
+def _process_audio_job(analysis_id, timer, lane=None):
     print(f"[Worker] Starting Job: {analysis_id}")
     
     # 1. Ambil Job Record dari DB
-    job = AnalysisHistory.query.filter_by(analysis_id=analysis_id).first()
+    with timer.span('db_fetch'):
+        job = AnalysisHistory.query.filter_by(analysis_id=analysis_id).first()
     if not job:
         print(f"[Worker] Error: Job ID {analysis_id} not found in DB.")
         return
+    _record_lane_latency(job, lane, 'queue_wait')
 
     try:
         # Update Status -> PROCESSING
-        job.status = 'PROCESSING'
-        db.session.commit()
+        with timer.span('db_fetch'):
+            job.status = 'PROCESSING'
+            db.session.commit()
+        publish_status(job)
 
         # 2. Ambil File dari S3
         bucket_name = current_app.config['AWS_S3_BUCKET_NAME']
         file_key = job.file_location
         
         print(f"[Worker] Fetching from S3: {file_key}")
-        s3_response = s3_client.get_object(Bucket=bucket_name, Key=file_key)
-        audio_data_bytes = s3_response['Body'].read()
+        with timer.span('s3_get'):
+            # Mulai download job berikutnya dulu, agar berjalan selama job ini dihitung
+            try:
+                audio_prefetcher.prefetch_reserved(_fetch_audio_bytes, bucket_name, exclude_id=analysis_id)
+            except Exception as prefetch_error:
+                print(f"[Worker] Warning prefetch: {prefetch_error}")
+            audio_data_bytes = audio_prefetcher.fetch(_fetch_audio_bytes, bucket_name, file_key)
         audio_buffer = io.BytesIO(audio_data_bytes)
+        if not job.audio_hash:
+            # Upload presigned multipart: hash baru bisa dihitung di sini
+            job.audio_hash = hashlib.sha256(audio_data_bytes).hexdigest()
 
-        # 3. Ekstrak Fitur
-        print("[Worker] Extracting features...")
-        features_dict = extract_single_feature(audio_buffer)
-        if features_dict is None:
-            raise ValueError("Gagal mengekstrak fitur audio (File corrupt atau format tidak didukung librosa)")
+        sampled_duration = _sampling_duration(audio_data_bytes)
+        if sampled_duration is not None:
+            # 3-4. Rekaman panjang: nilai segmen tersampel, berhenti saat sudah yakin
+            print(f"[Worker] Sampled analysis ({sampled_duration:.0f}s audio)...")
+            features_dict = None
+            result_data = _run_sampled_analysis(job, audio_data_bytes, sampled_duration, timer)
+        else:
+            # 3. Ekstrak Fitur (file besar diproses per blok agar memori tetap,
+            #    atau dibagi ke banyak core untuk paket AUDIO_PARALLEL_PLANS)
+            print("[Worker] Extracting features...")
+            parallel = _use_parallel(job)
+            features_dict = extract_single_feature(
+                audio_buffer, streaming=not parallel and _use_streaming(len(audio_data_bytes)),
+                timer=timer, parallel=parallel
+            )
+            if features_dict is None:
+                raise ValueError("Gagal mengekstrak fitur audio (File corrupt atau format tidak didukung librosa)")
 
-        # 4. Prediksi (Menggunakan Registry)
-        # Di sini kita bisa pilih model secara dinamis.
-        # Untuk sekarang default ke XGBoost, tapi logic ini 'closed' dari perubahan internal registry.
-        print("[Worker] Running Inference...")
-        result_data = ml_registry.predict('SVM', features_dict)
+            # 4. Prediksi (Menggunakan Registry)
+            # Di sini kita bisa pilih model secara dinamis.
+            # Untuk sekarang default ke XGBoost, tapi logic ini 'closed' dari perubahan internal registry.
+            print("[Worker] Running Inference...")
+            with timer.span('inference'):
+                result_data = _run_inference([features_dict])[0]
 
-        # 5. Simpan Hasil
-        job.status = 'COMPLETED'
-        job.result_summary = result_data
-        db.session.commit()
+        # 5. Simpan Hasil (+ vektor fitur untuk re-scoring, satu commit)
+        with timer.span('db_commit'):
+            job.status = 'COMPLETED'
+            job.result_summary = _with_timing(result_data, timer)
+            # Hasil tersampel tidak punya satu vektor fitur untuk seluruh file
+            if features_dict is not None and current_app.config.get('FEATURE_STORE_ENABLED', True):
+                stage_feature_vector(job, features_dict)
+            db.session.commit()
+        publish_status(job)
+        _record_lane_latency(job, lane, 'end_to_end')
         print(f"[Worker] Job {analysis_id} COMPLETED. Result: {result_data['prediction']}")
+        if features_dict is not None:
+            # Hasil tersampel bergantung anggaran paket, jadi tidak dibagi lewat cache konten
+            _store_result_cache(job.audio_hash, result_data)
 
-        # 6. Cleanup (Opsional: Hapus file dari S3 untuk hemat biaya)
-        try:
-            s3_client.delete_object(Bucket=bucket_name, Key=file_key)
-            print("[Worker] S3 Cleanup done.")
-        except Exception as cleanup_error:
-            print(f"[Worker] Warning S3 Cleanup: {cleanup_error}")
+        # 6. Cleanup: file dihapus belakangan oleh s3_cleanup_task (DeleteObjects per 1000 key)
+        with timer.span('cleanup_enqueue'):
+            s3_cleanup.enqueue(file_key)
 
     except Exception as e:
         print(f"[Worker] Job Failed: {e}")
@@ -253,4 +757,329 @@ def process_audio_task(analysis_id):
         # Update Status -> FAILED
         job.status = 'FAILED'
         job.error_message = str(e)
-        db.session.commit()
\ No newline at end of file
+        db.session.commit()
+        publish_status(job)
+        # Job gagal tidak bisa diulang, jadi file-nya ikut dibersihkan
+        s3_cleanup.enqueue(job.file_location)
+
+# =====================================================================
+# 5. MICRO-BATCHING (Banyak job sekaligus, butuh celery-batches)
+# =====================================================================
+
+_extraction_pool = None
+
+
+def _get_extraction_pool():
+    """
+    Pool untuk ekstraksi fitur paralel (dibuat sekali per proses worker).
+    Child prefork Celery adalah proses daemon dan tidak boleh membuat proses
+    baru, jadi di sana dipakai thread (FFT & BLAS numpy melepas GIL).
+    """
+    global _extraction_pool
+    if _extraction_pool is None:
+        workers = current_app.config.get('AUDIO_BATCH_WORKERS', 4)
+        if multiprocessing.current_process().daemon:
+            _extraction_pool = ThreadPoolExecutor(max_workers=workers)
+        else:
+            _extraction_pool = ProcessPoolExecutor(max_workers=workers)
+    return _extraction_pool
+
+
+def _extract_from_bytes(audio_data_bytes, streaming=False):
+    """Wrapper picklable untuk dijalankan di pool ekstraksi."""
+    return extract_single_feature(io.BytesIO(audio_data_bytes), streaming=streaming)
+
+
+def process_audio_batch(analysis_ids, lanes=None):
+    """
+    Proses sekelompok job dengan biaya tetap yang dibagi:
+    1 query IN, download S3 paralel, ekstraksi paralel,
+    1 panggilan inferensi ter-vektorisasi dan 1 commit hasil.
+    `lanes` ({analysis_id: lane}) untuk job yang dikirim lewat lane prioritas.
+    """
+    lanes = lanes or {}
+    timer = StageTimer('worker_batch')
+    try:
+        _process_audio_batch(analysis_ids, timer, lanes)
+    finally:
+        timer.flush()
+        for analysis_id, lane in lanes.items():
+            job_scheduler.release(lane, analysis_id)
+
+
+def _process_audio_batch(analysis_ids, timer, lanes):
+    print(f"[Worker] Starting Batch: {len(analysis_ids)} jobs")
+
+    # 1. Ambil semua Job Record dengan satu query
+    with timer.span('db_fetch'):
+        jobs = AnalysisHistory.query.filter(AnalysisHistory.analysis_id.in_(analysis_ids)).all()
+    found_ids = {job.analysis_id for job in jobs}
+    for analysis_id in analysis_ids:
+        if analysis_id not in found_ids:
+            print(f"[Worker] Error: Job ID {analysis_id} not found in DB.")
+    if not jobs:
+        return
+    for job in jobs:
+        _record_lane_latency(job, lanes.get(job.analysis_id), 'queue_wait')
+
+    try:
+        # Update Status -> PROCESSING (satu commit)
+        with timer.span('db_fetch'):
+            for job in jobs:
+                job.status = 'PROCESSING'
+            db.session.commit()
+        publish_status(jobs)
+
+        bucket_name = current_app.config['AWS_S3_BUCKET_NAME']
+        workers = current_app.config.get('AUDIO_BATCH_WORKERS', 4)
+        errors = {}
+
+        # 2. Ambil semua file dari S3 secara konkuren
+        print(f"[Worker] Fetching {len(jobs)} objects from S3...")
+        with timer.span('s3_get'), ThreadPoolExecutor(max_workers=workers) as io_pool:
+            fetch_futures = {
+                job.analysis_id: io_pool.submit(_fetch_audio_bytes, bucket_name, job.file_location)
+                for job in jobs
+            }
+        audio_bytes = {}
+        for analysis_id, future in fetch_futures.items():
+            try:
+                audio_bytes[analysis_id] = future.result()
+            except Exception as e:
+                errors[analysis_id] = f"Gagal mengambil file dari storage: {e}"
+        for job in jobs:
+            if not job.audio_hash and job.analysis_id in audio_bytes:
+                job.audio_hash = hashlib.sha256(audio_bytes[job.analysis_id]).hexdigest()
+
+        # 3. Ekstrak Fitur secara paralel
+        print("[Worker] Extracting features...")
+        # Decode & fitur berjalan paralel di pool, jadi dicatat sebagai satu span
+        with timer.span('feature_extraction'):
+            pool = _get_extraction_pool()
+            extract_futures = {
+                analysis_id: pool.submit(_extract_from_bytes, data, _use_streaming(len(data)))
+                for analysis_id, data in audio_bytes.items()
+            }
+            del audio_bytes
+            features = {}
+            for analysis_id, future in extract_futures.items():
+                try:
+                    features_dict = future.result()
+                except Exception as e:
+                    features_dict = None
+                    print(f"[Worker] Extraction error for {analysis_id}: {e}")
+                if features_dict is None:
+                    errors[analysis_id] = "Gagal mengekstrak fitur audio (File corrupt atau format tidak didukung librosa)"
+                else:
+                    features[analysis_id] = features_dict
+
+        # 4. Prediksi seluruh batch dalam satu panggilan Registry
+        print("[Worker] Running Inference...")
+        ready_ids = list(features.keys())
+        results = {}
+        if ready_ids:
+            with timer.span('inference'):
+                batch_results = _run_inference([features[i] for i in ready_ids])
+            results = dict(zip(ready_ids, batch_results))
+
+        # 5. Simpan Hasil (satu transaksi)
+        store_features = current_app.config.get('FEATURE_STORE_ENABLED', True)
+        with timer.span('db_commit'):
+            for job in jobs:
+                if job.analysis_id in results:
+                    job.status = 'COMPLETED'
+                    job.result_summary = _with_timing(results[job.analysis_id], timer)
+                    if store_features:
+                        stage_feature_vector(job, features[job.analysis_id])
+                else:
+                    job.status = 'FAILED'
+                    job.error_message = errors.get(job.analysis_id, "Job tidak selesai diproses")
+            db.session.commit()
+        publish_status(jobs)
+        for job in jobs:
+            if job.status == 'COMPLETED':
+                _record_lane_latency(job, lanes.get(job.analysis_id), 'end_to_end')
+        print(f"[Worker] Batch done. COMPLETED: {len(results)}, FAILED: {len(jobs) - len(results)}")
+        for job in jobs:
+            if job.analysis_id in results:
+                _store_result_cache(job.audio_hash, results[job.analysis_id])
+
+        # 6. Cleanup: semua file batch (selesai maupun gagal) masuk antrean penghapusan
+        with timer.span('cleanup_enqueue'):
+            s3_cleanup.enqueue([job.file_location for job in jobs])
+
+    except Exception as e:
+        print(f"[Worker] Batch Failed: {e}")
+        db.session.rollback()
+
+        # Update Status -> FAILED untuk job yang belum selesai
+        for job in jobs:
+            if job.status != 'COMPLETED':
+                job.status = 'FAILED'
+                job.error_message = str(e)
+        db.session.commit()
+        publish_status(jobs)
+        s3_cleanup.enqueue([job.file_location for job in jobs])
+
+
+try:
+    from celery_batches import Batches
+except ImportError:
+    Batches = None
+
+if Batches is not None:
+    @celery.task(
+        name='process_audio_batch_task',
+        base=Batches,
+        flush_every=celery.conf.get('AUDIO_BATCH_SIZE', 32),
+        flush_interval=celery.conf.get('AUDIO_BATCH_INTERVAL_MS', 500) / 1000.0,
+    )
+    def process_audio_batch_task(requests):
+        """
+        Menerima kumpulan request (maks AUDIO_BATCH_SIZE atau tiap AUDIO_BATCH_INTERVAL_MS)
+        dari audio_queue, lalu memprosesnya sebagai satu batch.
+        """
+        analysis_ids = list(dict.fromkeys(request.args[0] for request in requests))
+        lanes = {
+            request.args[0]: request.kwargs['lane']
+            for request in requests if (request.kwargs or {}).get('lane')
+        }
+        # Batches tidak mewarisi ContextTask, jadi app context dibuat manual
+        with celery.flask_app.app_context():
+            process_audio_batch(analysis_ids, lanes)
+else:
+    # Fallback: tanpa celery-batches, setiap job tetap diproses satu per satu
+    process_audio_batch_task = process_audio_task
+
+# =====================================================================
+# 6. RE-SCORING RIWAYAT (Dari feature store, tanpa S3 & decode audio)
+# =====================================================================
+
+def rescore_history(model_name=ACTIVE_MODEL, chunk_size=5000, dry_run=False):
+    """
+    Nilai ulang semua job COMPLETED memakai vektor fitur tersimpan.
+    Vektor berlaku untuk semua job dengan audio_hash yang sama, jadi job yang
+    selesai dari cache hasil ikut dinilai ulang. Setiap chunk: satu query vektor,
+    satu predict_batch, satu query job, satu bulk UPDATE. Field prediksi baru
+    digabung ke result_summary lama (metadata cascade / coverage tetap ada),
+    lalu cache hasil untuk audio tersebut di-invalidate.
+    Mengembalikan ringkasan jumlah job & prediksi yang berubah.
+    """
+    bundle = ml_registry.current()
+    version = result_cache.pipeline_version(FEATURE_EXTRACTOR_VERSION, bundle.version)
+    summary = {"model": model_name, "model_version": bundle.version, "rescored": 0, "changed": 0, "dry_run": dry_run}
+    # Satu vektor per audio_hash: job lain dengan hash sama sudah dinilai lewat vektor pertama
+    seen_hashes = set()
+
+    for analysis_ids, audio_hashes, X in iter_feature_batches(chunk_size=chunk_size):
+        keep = [
+            i for i, audio_hash in enumerate(audio_hashes)
+            if audio_hash is None or audio_hash not in seen_hashes
+        ]
+        analysis_ids = [analysis_ids[i] for i in keep]
+        audio_hashes = [audio_hashes[i] for i in keep]
+        seen_hashes.update(audio_hash for audio_hash in audio_hashes if audio_hash)
+        if not analysis_ids:
+            continue
+
+        X = ml_registry.align_matrix(X[keep], FEATURE_NAMES, bundle)
+        predictions = ml_registry.predict_batch(model_name, X, bundle=bundle)
+        by_id = dict(zip(analysis_ids, predictions))
+        by_hash = {audio_hash: prediction for audio_hash, prediction in zip(audio_hashes, predictions) if audio_hash}
+
+        updates = []
+        for analysis_id, audio_hash, old in completed_jobs_for(analysis_ids, audio_hashes):
+            prediction = by_id.get(analysis_id) or by_hash.get(audio_hash)
+            if prediction is None:
+                continue
+            if not old or old.get('prediction') != prediction['prediction']:
+                summary["changed"] += 1
+            updates.append({"analysis_id": analysis_id, "result_summary": {**(old or {}), **prediction}})
+        summary["rescored"] += len(updates)
+
+        if not dry_run:
+            db.session.execute(update(AnalysisHistory), updates)
+            db.session.commit()
+            # Upload berikutnya untuk audio ini dinilai ulang, bukan skor lama dari cache
+            result_cache.invalidate(by_hash, version)
+        print(f"[Worker] Rescored {summary['rescored']} jobs ({summary['changed']} changed)")
+
+    return summary
+
+
+@celery.task(name='rescore_history_task')
+def rescore_history_task(model_name=ACTIVE_MODEL, chunk_size=5000, dry_run=False):
+    """Task admin: re-scoring riwayat setelah versi model di manifest / model aktif diganti."""
+    return rescore_history(model_name, chunk_size, dry_run)
+
+# =====================================================================
+# 7. PEMBERSIHAN S3 (Dijadwalkan Celery beat, lihat celery_app.py)
+# =====================================================================
+
+@celery.task(name='s3_cleanup_task')
+def s3_cleanup_task():
+    """Hapus file yang mengantre di s3_cleanup dengan DeleteObjects (maks 1000 key/request)."""
+    summary = s3_cleanup.drain()
+    if summary["requests"]:
+        print(f"[Worker] S3 Cleanup: {summary}")
+    return summary
+
+
+@celery.task(name='s3_orphan_sweep_task')
+def s3_orphan_sweep_task(min_age_hours=None):
+    """Rekonsiliasi: upload yang ditinggal & file yatim yang tidak pernah masuk antrean."""
+    summary = s3_cleanup.sweep(min_age_hours)
+    print(f"[Worker] S3 Orphan Sweep: {summary}")
+    return summary
+
+@celery.task(name='audio_lane_reconcile_task')
+def audio_lane_reconcile_task():
+    """Lepas slot lane yang kedaluwarsa (worker mati) lalu kirim job yang menunggu."""
+    summary = job_scheduler.reconcile()
+    if summary["expired"] or summary["dispatched"]:
+        print(f"[Worker] Lane reconcile: {summary}")
+    return summary
+
+# =====================================================================
+# 8. WARM-UP & LIFECYCLE WORKER (Dipanggil dari signal di celery_app.py)
+# =====================================================================
+
+def warm_up_worker():
+    """
+    Muat model lalu jalankan pipeline fitur + inferensi sekali pada test.mp3,
+    supaya unpickling joblib, JIT numba dan cache librosa sudah terjadi di
+    proses induk sebelum fork.
+    """
+    started = time.perf_counter()
+    try:
+        ml_registry.load_assets()
+        if os.path.exists(WARMUP_AUDIO_FILE):
+            with open(WARMUP_AUDIO_FILE, 'rb') as f:
+                features_dict = extract_single_feature(io.BytesIO(f.read()))
+            if features_dict is not None:
+                ml_registry.predict(ACTIVE_MODEL, features_dict)
+    except Exception as e:
+        # Jangan gagalkan boot worker: registry tetap bisa lazy-load per job
+        print(f"[Worker] Warning warm-up failed: {e}")
+        return
+
+    # Pindahkan objek yang sudah ada ke generasi permanen GC, supaya GC di
+    # child tidak menyentuh (dan menyalin) halaman memori model yang dibagi
+    gc.collect()
+    gc.freeze()
+    print(f"[Worker] Warm-up done in {time.perf_counter() - started:.2f}s")
+
+
+def start_model_watcher():
+    """Mulai pemantau manifest model (hot-swap) di proses yang melayani job."""
+    ml_registry.start_watcher(current_app._get_current_object())
+
+
+def reset_after_fork():
+    """Resource yang tidak aman diwarisi lewat fork dibuat ulang di child."""
+    global _extraction_pool, _parallel_pool
+    _extraction_pool = None
+    _parallel_pool = None
+    audio_prefetcher.reset()
+    # Koneksi DB milik induk tidak boleh dipakai bersama oleh child
+    db.engine.dispose(close=False)
@@ -0,0 +1,36 @@
+# FILE: gunicorn.conf.py
+"""
+Konfigurasi gunicorn: gunicorn -c gunicorn.conf.py run:app
+
+SERVING_MODE
+- sync  (default): satu request per worker, perilaku lama.
+- async : worker gevent. Semua I/O (PyMySQL, boto3/urllib3, redis-py, socket
+          client) di-monkeypatch menjadi non-blocking, jadi satu proses bisa
+          memegang ribuan request terbuka (upload lambat, status, SSE/long-poll).
+          Pool koneksi DB (DB_POOL_SIZE), S3 (S3_MAX_POOL_CONNECTIONS) dan Redis
+          dibagi oleh semua greenlet di proses yang sama. Route, JWT dan format
+          response tidak berubah; SSE /events hanya streaming di mode ini.
+"""
+import multiprocessing
+import os
+
+SERVING_MODE = os.getenv('SERVING_MODE', 'sync').lower()
+
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('PORT', '5000')}")
+
+if SERVING_MODE == 'async':
+    worker_class = 'gevent'
+    # Request terbuka maksimum per proses
+    worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 2000))
+    # I/O tidak lagi memblokir worker: cukup satu proses per core
+    workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+else:
+    worker_class = 'sync'
+    workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+# Worker sync dibunuh jika satu request lebih lama dari ini; karena itu pada mode
+# sync SSE tidak di-stream dan long-poll dibatasi GUNICORN_TIMEOUT / 2 (lihat
+# routes.py). Worker gevent tetap mengirim heartbeat selama request terbuka,
+# jadi stream SSE (JOB_EVENTS_MAX_SECONDS) aman pada mode async.
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
@@ -0,0 +1,137 @@
+# FILE: tests/test_features_parity.py
+"""
+Paritas fitur antar jalur decode & ekstraksi di worker:
+
+- STFT bersama (compute_features) vs librosa.feature.* satu per satu
+- decoder soundfile / ffmpeg / librosa (celery_worker/decoders.py)
+- ekstraksi streaming per blok (extract_features_streaming)
+- ekstraksi paralel per chunk frame (compute_features_parallel)
+
+semuanya dibandingkan dengan sinyal librosa.load (sr=16000, soxr_hq).
+Toleransi per jalur mengikuti galat yang didokumentasikan di features.py.
+"""
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import librosa
+import numpy as np
+import pytest
+import soundfile as sf
+
+from celery_worker.decoders import DECODERS
+from celery_worker.features import (
+    SR, N_MFCC, FEATURE_NAMES, compute_features, compute_features_parallel, extract_features_streaming,
+)
+
+# ffmpeg: decoder mp3 & implementasi soxr sendiri, toleransi benchmark (pipeline_bench.py)
+PARITY_ATOL = 1e-2
+PARITY_RTOL = 1e-2
+
+# STFT bersama: identik dengan librosa.feature.*, sisa hanya pembulatan float
+SHARED_STFT_ATOL = 1e-6
+# Streaming: floor top_db dari histogram dB + akumulasi float32 (features.py: < 1e-3)
+STREAMING_ATOL = 1e-3
+# Paralel: hanya pembulatan float32 mel per chunk (features.py: < 1e-6)
+PARALLEL_ATOL = 1e-6
+
+TEST_MP3 = os.path.join(os.path.dirname(__file__), '..', 'celery_worker', 'assets', 'test.mp3')
+
+
+def _synthetic_wav(seconds=20, native_sr=44100):
+    """Stereo 44.1 kHz (menguji downmix & resampling): nada bergeser + derau + jeda hening."""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * native_sr)) / native_sr
+    tone = 0.4 * np.sin(2 * np.pi * (220 + 30 * t) * t)
+    left = tone + 0.05 * rng.standard_normal(t.size)
+    right = 0.6 * tone + 0.05 * rng.standard_normal(t.size)
+    left[native_sr * 5:native_sr * 6] = 0.0
+    buffer = io.BytesIO()
+    sf.write(buffer, np.stack([left, right], axis=1).astype(np.float32), native_sr, format='WAV', subtype='PCM_16')
+    return buffer.getvalue()
+
+
+@pytest.fixture(scope='module', params=['synthetic.wav', 'test.mp3'])
+def audio_bytes(request):
+    if request.param == 'test.mp3':
+        if 'MP3' not in sf.available_formats():
+            pytest.skip("libsndfile di server ini tidak mendukung mp3")
+        with open(TEST_MP3, 'rb') as f:
+            return f.read()
+    return _synthetic_wav()
+
+
+@pytest.fixture(scope='module')
+def reference(audio_bytes):
+    """(sinyal, fitur) jalur referensi: librosa.load(sr=16000, soxr_hq) + compute_features."""
+    y, _ = librosa.load(io.BytesIO(audio_bytes), sr=SR, res_type='soxr_hq')
+    return y, compute_features(y, SR)
+
+
+def per_call_features(y, sr=SR):
+    """Ekstraksi lama: setiap librosa.feature.* menghitung STFT-nya sendiri."""
+    mfcc_base = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
+    mfcc_delta = librosa.feature.delta(mfcc_base)
+    full_mfccs = np.concatenate((mfcc_base, mfcc_delta, librosa.feature.delta(mfcc_delta)), axis=0)
+    features = {f'mfcc_{i+1}': np.mean(full_mfccs[i]) for i in range(N_MFCC)}
+    features['zcr_mean'] = np.mean(librosa.feature.zero_crossing_rate(y))
+    features['spectral_centroid_mean'] = np.mean(librosa.feature.spectral_centroid(y=y, sr=sr))
+    features['spectral_rolloff_mean'] = np.mean(librosa.feature.spectral_rolloff(y=y, sr=sr))
+    features['spectral_contrast_mean'] = np.mean(librosa.feature.spectral_contrast(y=y, sr=sr))
+    features['zcr_std'] = np.std(librosa.feature.zero_crossing_rate(y))
+    features['spectral_centroid_std'] = np.std(librosa.feature.spectral_centroid(y=y, sr=sr))
+    return features
+
+
+def assert_features_close(features, expected, atol=PARITY_ATOL, rtol=PARITY_RTOL):
+    """|a - b| <= atol + rtol * |b| untuk setiap fitur."""
+    assert set(FEATURE_NAMES) <= set(features)
+    names = sorted(expected)
+    actual = np.array([features[name] for name in names], dtype=np.float64)
+    wanted = np.array([expected[name] for name in names], dtype=np.float64)
+    diff = np.abs(actual - wanted)
+    limit = atol + rtol * np.abs(wanted)
+    worst = int(np.argmax(diff - limit))
+    assert np.all(diff <= limit), f"{names[worst]}: {actual[worst]} vs {wanted[worst]}"
+
+
+def test_shared_stft_matches_per_call_librosa(reference):
+    y, features = reference
+    assert_features_close(features, per_call_features(y), atol=SHARED_STFT_ATOL, rtol=0.0)
+
+
+@pytest.mark.parametrize('decoder_name', ['soundfile', 'librosa'])
+def test_libsndfile_decoders_match_librosa_load(decoder_name, audio_bytes, reference):
+    # soundfile + librosa.resample(soxr_hq) = jalur librosa.load, sinyal identik
+    y = DECODERS[decoder_name].decode(audio_bytes, SR, 'soxr_hq')
+    y_ref, features_ref = reference
+    assert y.dtype == np.float32
+    np.testing.assert_array_equal(y, y_ref)
+    assert_features_close(compute_features(y, SR), features_ref, atol=SHARED_STFT_ATOL, rtol=0.0)
+
+
+def test_ffmpeg_decoder_parity(audio_bytes, reference):
+    decoder = DECODERS['ffmpeg']
+    if not decoder.available():
+        pytest.skip("binary ffmpeg tidak ada di PATH")
+
+    y = decoder.decode(audio_bytes, SR, 'soxr_hq')
+    y_ref, features_ref = reference
+    assert y.dtype == np.float32
+    # Panjang bisa berbeda beberapa sampel (padding encoder/resampler)
+    assert abs(y.size - y_ref.size) <= SR // 10
+    assert_features_close(compute_features(y, SR), features_ref)
+
+
+def test_streaming_matches_compute_features(audio_bytes, reference):
+    # Blok kecil supaya file uji dipotong menjadi beberapa blok
+    features = extract_features_streaming(io.BytesIO(audio_bytes), SR, block_seconds=3)
+    assert_features_close(features, reference[1], atol=STREAMING_ATOL, rtol=0.0)
+
+
+@pytest.mark.parametrize('chunk_seconds', [1, 4])
+def test_parallel_merge_matches_compute_features(chunk_seconds, reference):
+    y, features_ref = reference
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        features = compute_features_parallel(y, executor, SR, chunk_seconds=chunk_seconds)
+    assert_features_close(features, features_ref, atol=PARALLEL_ATOL, rtol=0.0)
@@ -0,0 +1,91 @@
+# FILE: tests/test_job_events.py
+"""
+Endpoint status push GET /api/analysis/<id>/events (SSE).
+
+Body response di-iterasi lewat WSGI mentah (run_wsgi_app), sama seperti
+gunicorn: generator berjalan setelah app context request dilepas.
+"""
+import json
+
+import pytest
+from flask_jwt_extended import create_access_token
+from werkzeug.test import EnvironBuilder, run_wsgi_app
+
+from app import create_app
+from app.analysis import events, routes
+
+ANALYSIS_ID = 'job-1'
+
+
+class StubSubscription:
+    """Pengganti langganan Redis pub/sub: mengembalikan event yang disiapkan, lalu None."""
+    def __init__(self, queued):
+        self.queued = list(queued)
+        self.closed = False
+
+    def next_event(self, timeout):
+        return self.queued.pop(0) if self.queued else None
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config.update(JWT_SECRET_KEY='test-secret-key-for-sse-stream-0123', JOB_EVENTS_MAX_SECONDS=1,
+                      JOB_EVENTS_HEARTBEAT_SECONDS=0.01)
+    return app
+
+
+@pytest.fixture
+def subscription(monkeypatch):
+    subscription = StubSubscription([
+        {"analysis_id": ANALYSIS_ID, "status": "PROCESSING"},
+        {"analysis_id": ANALYSIS_ID, "status": "COMPLETED", "result": {"prediction": "REAL"}},
+    ])
+    monkeypatch.setattr(events, 'subscribe', lambda analysis_id: subscription)
+    monkeypatch.setattr(routes.AnalysisService, 'get_job_status', staticmethod(
+        lambda user_id, analysis_id: {"analysis_id": analysis_id, "status": "PENDING"}
+    ))
+    return subscription
+
+
+def _stream_events(app):
+    with app.app_context():
+        token = create_access_token(identity='user-1')
+    environ = EnvironBuilder(
+        path=f'/api/analysis/{ANALYSIS_ID}/events', headers={'Authorization': f'Bearer {token}'}
+    ).get_environ()
+    app_iter, status, headers = run_wsgi_app(app, environ)
+    try:
+        body = b''.join(app_iter).decode()
+    finally:
+        getattr(app_iter, 'close', lambda: None)()
+    return status, body
+
+
+def _status_events(body):
+    return [
+        json.loads(chunk.split('data: ', 1)[1])['status']
+        for chunk in body.split('\n\n') if chunk.startswith('event: status')
+    ]
+
+
+def test_async_mode_streams_pushed_events(app, subscription):
+    app.config['SERVING_MODE'] = 'async'
+    status, body = _stream_events(app)
+
+    assert status.startswith('200')
+    assert _status_events(body) == ['PENDING', 'PROCESSING', 'COMPLETED']
+    assert subscription.closed
+
+
+def test_sync_mode_sends_initial_status_and_retry(app, subscription):
+    app.config['SERVING_MODE'] = 'sync'
+    status, body = _stream_events(app)
+
+    assert status.startswith('200')
+    assert _status_events(body) == ['PENDING']
+    assert 'retry: 3000' in body
+    assert subscription.closed